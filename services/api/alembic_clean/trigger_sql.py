@@ -0,0 +1,71 @@
+"""SQL builders for statement-level AFTER triggers over transition tables.
+
+Shared by the migrations that keep derived tables in sync with
+INSERT/UPDATE/DELETE statements (class_daily_stats, attendance_month,
+attendance_sync, attendance_board)::
+
+    from alembic_clean.trigger_sql import changes, function_sql, trigger_ddl
+
+    fn_sql = function_sql('attendance_month_attendance_student',
+                          {op: APPLY.format(changes=changes(op, 'student_id, date')) for op in OPS})
+    ddl = trigger_ddl('attendance_student', 'attendance_month_attendance_student', 'am')
+
+A trigger's REFERENCING clause can only name the transition tables its event
+has (INSERT: new_rows, DELETE: old_rows, UPDATE: both), so each event gets its
+own trigger and the shared function branches on TG_OP. alembic_clean/env.py
+puts services/api on sys.path, which makes this importable from versions/.
+"""
+from __future__ import annotations
+
+from typing import Mapping
+
+OPS = ('INSERT', 'UPDATE', 'DELETE')
+
+REFERENCING = {
+    'INSERT': 'NEW TABLE AS new_rows',
+    'UPDATE': 'NEW TABLE AS new_rows OLD TABLE AS old_rows',
+    'DELETE': 'OLD TABLE AS old_rows',
+}
+
+
+def changes(op_name: str, cols: str, signed: bool = False) -> str:
+    """Rows a statement touched: new_rows, old_rows, or both for UPDATE.
+
+    With ``signed`` each row carries ``sign`` (+1 new, -1 old) so callers can sum deltas.
+    """
+    new = f"SELECT {cols}, 1 AS sign FROM new_rows" if signed else f"SELECT {cols} FROM new_rows"
+    old = f"SELECT {cols}, -1 AS sign FROM old_rows" if signed else f"SELECT {cols} FROM old_rows"
+    return {'INSERT': new, 'DELETE': old, 'UPDATE': f"{new} UNION ALL {old}"}[op_name]
+
+
+def function_sql(fn: str, branches: Mapping[str, str]) -> str:
+    """``CREATE FUNCTION fn()`` with one ``TG_OP`` branch per event, in ``branches`` order."""
+    body = "".join(
+        f"    {'IF' if i == 0 else 'ELSIF'} TG_OP = '{op_name}' THEN\n{sql}"
+        for i, (op_name, sql) in enumerate(branches.items())
+    )
+    return (
+        f"CREATE OR REPLACE FUNCTION {fn}() RETURNS trigger LANGUAGE plpgsql AS $$\nBEGIN\n"
+        + body
+        + "    END IF;\n    RETURN NULL;\nEND $$;"
+    )
+
+
+def trigger_names(table: str, tag: str) -> dict[str, str]:
+    """Event -> trigger name (``trg_<table>_<tag>_<event>``)."""
+    return {op_name: f"trg_{table}_{tag}_{op_name.lower()}" for op_name in OPS}
+
+
+def trigger_ddl(table: str, fn: str, tag: str) -> str:
+    """(Re)create one FOR EACH STATEMENT trigger per event on ``table``, all calling ``fn()``."""
+    stmts = []
+    for op_name, name in trigger_names(table, tag).items():
+        stmts.append(f"DROP TRIGGER IF EXISTS {name} ON {table};")
+        stmts.append(f"CREATE TRIGGER {name} AFTER {op_name} ON {table} REFERENCING {REFERENCING[op_name]} "
+                     f"FOR EACH STATEMENT EXECUTE FUNCTION {fn}();")
+    return "\n".join(stmts)
+
+
+def drop_triggers_sql(table: str, tag: str) -> list[str]:
+    """Statements dropping the triggers ``trigger_ddl(table, ..., tag)`` created."""
+    return [f"DROP TRIGGER IF EXISTS {name} ON {table}" for name in trigger_names(table, tag).values()]
@@ -0,0 +1,126 @@
+"""Monthly range partitioning for core.audit_log + filter indexes.
+
+Revision ID: 20251018_0100_audit_log_partitioning
+Revises: 20251003_0105_staff_substitutions_and_permission
+Create Date: 2025-10-18
+
+* core.audit_log becomes PARTITION BY RANGE (created_at) with one partition per
+  month (core.audit_log_yYYYYmMM) plus a DEFAULT partition as a safety net.
+* Primary key is (id, created_at) as required for partitioned tables; ids keep
+  coming from a bigint sequence so ``id desc`` keyset paging still works.
+* core.audit_log_ensure_partitions(from, to) creates missing monthly partitions;
+  the retention worker (app/workers/audit_retention.py) calls it to stay ahead
+  and detaches expired months into the audit_archive schema.
+* Existing rows are copied over; idempotent if the table is already partitioned.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+revision = '20251018_0100_audit_log_partitioning'
+down_revision = '20251003_0105_staff_substitutions_and_permission'
+branch_labels = None
+depends_on = None
+
+ENSURE_FN = """
+CREATE OR REPLACE FUNCTION core.audit_log_ensure_partitions(p_from date, p_to date)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    m date := date_trunc('month', p_from)::date;
+    created integer := 0;
+    part text;
+BEGIN
+    WHILE m <= p_to LOOP
+        part := format('audit_log_y%sm%s', to_char(m, 'YYYY'), to_char(m, 'MM'));
+        IF to_regclass(format('core.%I', part)) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE core.%I PARTITION OF core.audit_log FOR VALUES FROM (%L) TO (%L)',
+                part, m, (m + interval '1 month')::date);
+            created := created + 1;
+        END IF;
+        m := (m + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END $$;
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_audit_log_created ON core.audit_log (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_audit_log_action ON core.audit_log (action, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_audit_log_object ON core.audit_log (object_type, object_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS ix_audit_log_user ON core.audit_log (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_audit_log_request ON core.audit_log (request_id) WHERE request_id IS NOT NULL;
+"""
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text("CREATE SCHEMA IF NOT EXISTS core"))
+    conn.execute(sa.text("CREATE SCHEMA IF NOT EXISTS audit_archive"))
+    relkind = conn.execute(sa.text(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid=c.relnamespace "
+        "WHERE n.nspname='core' AND c.relname='audit_log'"
+    )).scalar()
+    if relkind == 'p':
+        conn.execute(sa.text(ENSURE_FN))
+        conn.execute(sa.text(INDEXES))
+        return
+    if relkind is not None:
+        conn.execute(sa.text(
+            """
+            ALTER TABLE core.audit_log RENAME TO audit_log_unpartitioned;
+            DO $$ BEGIN
+                IF EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'audit_log_pkey'
+                           AND conrelid = 'core.audit_log_unpartitioned'::regclass) THEN
+                    ALTER TABLE core.audit_log_unpartitioned RENAME CONSTRAINT audit_log_pkey TO audit_log_unpartitioned_pkey;
+                END IF;
+            END $$;
+            """
+        ))
+    conn.execute(sa.text(
+        """
+        CREATE SEQUENCE IF NOT EXISTS core.audit_log_id_seq_p AS bigint;
+        CREATE TABLE core.audit_log (
+            id bigint NOT NULL DEFAULT nextval('core.audit_log_id_seq_p'),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            user_id bigint,
+            school_id bigint,
+            action text NOT NULL,
+            object_type text,
+            object_id text,
+            verb text,
+            before json,
+            after json,
+            request_id text,
+            ip text,
+            user_agent text,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        ALTER SEQUENCE core.audit_log_id_seq_p OWNED BY core.audit_log.id;
+        CREATE TABLE IF NOT EXISTS core.audit_log_default PARTITION OF core.audit_log DEFAULT;
+        """
+    ))
+    conn.execute(sa.text(ENSURE_FN))
+    start = None
+    if relkind is not None:
+        start = conn.execute(sa.text("SELECT min(created_at)::date FROM core.audit_log_unpartitioned")).scalar()
+    conn.execute(
+        sa.text("SELECT core.audit_log_ensure_partitions(coalesce(:f, current_date), (current_date + interval '3 months')::date)"),
+        {'f': start},
+    )
+    conn.execute(sa.text(INDEXES))
+    if relkind is not None:
+        conn.execute(sa.text(
+            """
+            INSERT INTO core.audit_log (id, created_at, user_id, school_id, action, object_type, object_id,
+                                        verb, before, after, request_id, ip, user_agent)
+            SELECT id, coalesce(created_at, now()), user_id, school_id, action, object_type, object_id,
+                   verb, before, after, request_id, ip, user_agent
+            FROM core.audit_log_unpartitioned;
+            SELECT setval('core.audit_log_id_seq_p', greatest((SELECT coalesce(max(id), 0) FROM core.audit_log), 1));
+            DROP TABLE core.audit_log_unpartitioned;
+            """
+        ))
+
+
+def downgrade():
+    raise RuntimeError("Downgrade not supported for audit_log partitioning")
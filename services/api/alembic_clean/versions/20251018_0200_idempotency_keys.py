@@ -0,0 +1,39 @@
+"""idempotency_keys table (durable fallback for app/core/idempotency.py)
+
+Revision ID: 20251018_0200_idempotency_keys
+Revises: 20251018_0100_audit_log_partitioning
+Create Date: 2025-10-18
+
+Idempotent creation; safe to re-run. A row with NULL response_json is an
+in-flight claim; ``key`` is namespaced as ``<scope>:<Idempotency-Key>``.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+revision = '20251018_0200_idempotency_keys'
+down_revision = '20251018_0100_audit_log_partitioning'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text(
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            id SERIAL PRIMARY KEY,
+            key VARCHAR NOT NULL UNIQUE,
+            route VARCHAR NOT NULL,
+            method VARCHAR NOT NULL,
+            request_hash VARCHAR NOT NULL,
+            response_json JSONB,
+            created_at TIMESTAMPTZ DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys(created_at);
+        """
+    ))
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP TABLE IF EXISTS idempotency_keys"))
@@ -0,0 +1,38 @@
+"""staff.employee_id + emergency contact columns (staff CSV/XLSX import)
+
+Revision ID: 20251018_0400_staff_import_fields
+Revises: 20251018_0300_class_daily_stats
+Create Date: 2025-10-18
+
+``employee_id`` is the external HR identifier the import keys rows on
+(unique, nullable so existing staff remain valid). Idempotent; safe to re-run.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+revision = '20251018_0400_staff_import_fields'
+down_revision = '20251018_0300_class_daily_stats'
+branch_labels = None
+depends_on = None
+
+ADD_COLS = [
+    ("employee_id", "VARCHAR(20)"),
+    ("emergency_contact_name", "VARCHAR(120)"),
+    ("emergency_contact_relation", "VARCHAR(40)"),
+    ("emergency_contact_phone", "VARCHAR(40)"),
+    ("emergency_contact_address", "VARCHAR(255)"),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    for col, ddl_type in ADD_COLS:
+        conn.execute(sa.text(f"ALTER TABLE staff ADD COLUMN IF NOT EXISTS {col} {ddl_type}"))
+    conn.execute(sa.text("CREATE UNIQUE INDEX IF NOT EXISTS uq_staff_employee_id ON staff (employee_id)"))
+
+
+def downgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text("DROP INDEX IF EXISTS uq_staff_employee_id"))
+    for col, _ in reversed(ADD_COLS):
+        conn.execute(sa.text(f"ALTER TABLE staff DROP COLUMN IF EXISTS {col}"))
@@ -0,0 +1,184 @@
+"""attendance_month: per-student monthly attendance bitmaps maintained by triggers
+
+Revision ID: 20251018_0500_attendance_month
+Revises: 20251018_0400_staff_import_fields
+Create Date: 2025-10-18
+
+One row per (student, month) with four INTEGER bitmaps; bit ``d - 1`` is day
+``d`` of the month (31 days fit in a signed int4). A day's status is the
+``attendance_student`` mark when there is one, else the 0/1
+``attendance_events`` row (same precedence as /attendance/export).
+
+Statement-level AFTER triggers on both daily tables collect the distinct
+(student, day) pairs a statement touched and call ``attendance_month_apply``
+once, which re-resolves just those days and rewrites their bits.
+``attendance_month_rebuild(from, to)`` recomputes whole months from the base
+tables; app/workers/attendance_month_reconcile.py runs it nightly. Idempotent;
+safe to re-run.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+from alembic_clean import trigger_sql
+
+revision = '20251018_0500_attendance_month'
+down_revision = '20251018_0400_staff_import_fields'
+branch_labels = None
+depends_on = None
+
+TABLE = """
+CREATE TABLE IF NOT EXISTS attendance_month (
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    present INTEGER NOT NULL DEFAULT 0,
+    absent INTEGER NOT NULL DEFAULT 0,
+    late INTEGER NOT NULL DEFAULT 0,
+    excused INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (student_id, month),
+    CHECK (month = date_trunc('month', month)::date)
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_month_month ON attendance_month(month);
+"""
+
+# (student_id, day, month, bit, status) for the given pairs, resolved across both daily tables.
+_RESOLVED = """
+    SELECT DISTINCT k.student_id, k.day, date_trunc('month', k.day)::date AS month,
+           1 << (extract(day FROM k.day)::int - 1) AS bit,
+           coalesce(st.status, CASE ev.present WHEN 1 THEN 'present' WHEN 0 THEN 'absent' END) AS status
+    FROM unnest(p_students, p_days) AS k(student_id, day)
+    LEFT JOIN attendance_student st ON st.student_id = k.student_id AND st.date = k.day
+    LEFT JOIN attendance_events ev ON ev.student_id = k.student_id AND ev.date = k.day
+"""
+
+APPLY_FN = f"""
+CREATE OR REPLACE FUNCTION attendance_month_apply(p_students integer[], p_days date[])
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    -- Make sure the month rows exist first so the UPDATE below serialises concurrent writers on the row lock.
+    INSERT INTO attendance_month (student_id, month)
+    SELECT DISTINCT k.student_id, date_trunc('month', k.day)::date
+    FROM unnest(p_students, p_days) AS k(student_id, day)
+    WHERE EXISTS (SELECT 1 FROM students s WHERE s.id = k.student_id)
+    ON CONFLICT (student_id, month) DO NOTHING;
+
+    UPDATE attendance_month m SET
+        present = (m.present & ~r.touched) | r.present,
+        absent = (m.absent & ~r.touched) | r.absent,
+        late = (m.late & ~r.touched) | r.late,
+        excused = (m.excused & ~r.touched) | r.excused,
+        updated_at = now()
+    FROM (
+        SELECT d.student_id, d.month,
+               bit_or(d.bit) AS touched,
+               coalesce(bit_or(d.bit) FILTER (WHERE d.status = 'present'), 0) AS present,
+               coalesce(bit_or(d.bit) FILTER (WHERE d.status = 'absent'), 0) AS absent,
+               coalesce(bit_or(d.bit) FILTER (WHERE d.status = 'late'), 0) AS late,
+               coalesce(bit_or(d.bit) FILTER (WHERE d.status = 'excused'), 0) AS excused
+        FROM ({_RESOLVED}) d
+        GROUP BY d.student_id, d.month
+    ) r
+    WHERE m.student_id = r.student_id AND m.month = r.month
+      AND (m.present & r.touched, m.absent & r.touched, m.late & r.touched, m.excused & r.touched)
+          IS DISTINCT FROM (r.present, r.absent, r.late, r.excused);
+END $$;
+"""
+
+REBUILD_FN = """
+CREATE OR REPLACE FUNCTION attendance_month_rebuild(p_from date, p_to date)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    m_from date := date_trunc('month', p_from)::date;
+    m_to date := (date_trunc('month', p_to) + interval '1 month')::date;
+    n integer := 0;
+BEGIN
+    -- Block trigger writers for the (short) duration so rebuilt months and per-day bit updates do not interleave.
+    LOCK TABLE attendance_month IN SHARE ROW EXCLUSIVE MODE;
+    WITH days AS (
+        SELECT coalesce(ev.student_id, st.student_id) AS student_id,
+               coalesce(ev.date, st.date) AS day,
+               coalesce(st.status, CASE ev.present WHEN 1 THEN 'present' WHEN 0 THEN 'absent' END) AS status
+        FROM (SELECT student_id, date, present FROM attendance_events WHERE date >= m_from AND date < m_to) ev
+        FULL JOIN (SELECT student_id, date, status FROM attendance_student WHERE date >= m_from AND date < m_to) st
+            ON st.student_id = ev.student_id AND st.date = ev.date
+    ), agg AS (
+        SELECT student_id, date_trunc('month', day)::date AS month,
+               coalesce(bit_or(1 << (extract(day FROM day)::int - 1)) FILTER (WHERE status = 'present'), 0) AS present,
+               coalesce(bit_or(1 << (extract(day FROM day)::int - 1)) FILTER (WHERE status = 'absent'), 0) AS absent,
+               coalesce(bit_or(1 << (extract(day FROM day)::int - 1)) FILTER (WHERE status = 'late'), 0) AS late,
+               coalesce(bit_or(1 << (extract(day FROM day)::int - 1)) FILTER (WHERE status = 'excused'), 0) AS excused
+        FROM days
+        GROUP BY 1, 2
+    ), kept AS (
+        SELECT * FROM agg WHERE present <> 0 OR absent <> 0 OR late <> 0 OR excused <> 0
+    ), upserted AS (
+        INSERT INTO attendance_month AS a (student_id, month, present, absent, late, excused)
+        SELECT student_id, month, present, absent, late, excused FROM kept
+        ON CONFLICT (student_id, month) DO UPDATE SET
+            present = EXCLUDED.present, absent = EXCLUDED.absent,
+            late = EXCLUDED.late, excused = EXCLUDED.excused, updated_at = now()
+        WHERE (a.present, a.absent, a.late, a.excused)
+              IS DISTINCT FROM (EXCLUDED.present, EXCLUDED.absent, EXCLUDED.late, EXCLUDED.excused)
+        RETURNING 1
+    ), emptied AS (
+        DELETE FROM attendance_month a
+        WHERE a.month >= m_from AND a.month < m_to
+          AND NOT EXISTS (SELECT 1 FROM kept k WHERE k.student_id = a.student_id AND k.month = a.month)
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM upserted) + (SELECT count(*) FROM emptied) INTO n;
+    RETURN n;
+END $$;
+"""
+
+# Same body for every event: re-resolve the (student, day) pairs the statement touched.
+APPLY = """
+    PERFORM attendance_month_apply(array_agg(c.student_id), array_agg(c.date))
+    FROM (SELECT DISTINCT student_id, date FROM ({changes}) x) c;
+"""
+
+
+SOURCES = {
+    # table: trigger function name
+    'attendance_events': 'attendance_month_attendance_events',
+    'attendance_student': 'attendance_month_attendance_student',
+}
+
+
+def trigger_function_sql(table: str) -> str:
+    return trigger_sql.function_sql(SOURCES[table], {
+        op_name: APPLY.format(changes=trigger_sql.changes(op_name, 'student_id, date')) for op_name in trigger_sql.OPS
+    })
+
+
+def trigger_ddl(table: str) -> str:
+    return trigger_sql.trigger_ddl(table, SOURCES[table], 'am')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if any(conn.execute(sa.text("SELECT to_regclass(:t)"), {'t': t}).scalar() is None for t in ('students', *SOURCES)):
+        print("[attendance_month] students/attendance tables missing; skipped")
+        return
+    conn.execute(sa.text(TABLE))
+    conn.execute(sa.text(APPLY_FN))
+    conn.execute(sa.text(REBUILD_FN))
+    for table in SOURCES:
+        conn.execute(sa.text(trigger_function_sql(table)))
+        conn.execute(sa.text(trigger_ddl(table)))
+    conn.execute(sa.text(
+        "SELECT attendance_month_rebuild(least((SELECT min(date) FROM attendance_events), "
+        "(SELECT min(date) FROM attendance_student), current_date), current_date)"
+    ))
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table, fn in SOURCES.items():
+        if conn.execute(sa.text("SELECT to_regclass(:t)"), {'t': table}).scalar() is not None:
+            for stmt in trigger_sql.drop_triggers_sql(table, 'am'):
+                conn.execute(sa.text(stmt))
+        conn.execute(sa.text(f"DROP FUNCTION IF EXISTS {fn}()"))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS attendance_month_rebuild(date, date)"))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS attendance_month_apply(integer[], date[])"))
+    conn.execute(sa.text("DROP TABLE IF EXISTS attendance_month"))
@@ -0,0 +1,187 @@
+"""Range-partition attendance_events / attendance_student by academic year.
+
+Revision ID: 20251018_0600_attendance_partitioning
+Revises: 20251018_0500_attendance_month
+Create Date: 2025-10-18
+
+* Both tables become PARTITION BY RANGE (date) with one partition per academic
+  year (``<table>_ayYYYY`` covers YYYY-MM-01 .. YYYY+1-MM-01, MM =
+  ACADEMIC_YEAR_START_MONTH, default April) plus a DEFAULT partition as a
+  safety net.
+* Primary keys become (id, date) as required for partitioned tables; ids keep
+  coming from a sequence. ``UNIQUE (student_id, date)`` contains the partition
+  key, so ``ON CONFLICT (student_id, date)`` upserts keep working unchanged.
+* attendance_ensure_partitions(table, from, to, start_month) creates missing
+  yearly partitions, moving any rows that landed in DEFAULT into them first;
+  app/workers/attendance_partitions.py calls it to stay a year ahead and
+  detaches closed years into the attendance_archive schema.
+* Existing rows are copied over and the statement-level triggers on the old
+  tables (class_daily_stats, attendance_month) are re-created on the new ones.
+  Idempotent if the tables are already partitioned.
+"""
+import os
+
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+revision = '20251018_0600_attendance_partitioning'
+down_revision = '20251018_0500_attendance_month'
+branch_labels = None
+depends_on = None
+
+START_MONTH = int(os.getenv("ACADEMIC_YEAR_START_MONTH", "4"))
+ARCHIVE_SCHEMA = 'attendance_archive'
+
+ENSURE_FN = """
+CREATE OR REPLACE FUNCTION attendance_ensure_partitions(p_table text, p_from date, p_to date, p_start_month integer DEFAULT 4)
+RETURNS integer LANGUAGE plpgsql AS $$
+DECLARE
+    y integer := extract(year FROM p_from)::int - CASE WHEN extract(month FROM p_from) < p_start_month THEN 1 ELSE 0 END;
+    lo date;
+    hi date;
+    part text;
+    created integer := 0;
+BEGIN
+    LOOP
+        lo := make_date(y, p_start_month, 1);
+        EXIT WHEN lo > p_to;
+        hi := make_date(y + 1, p_start_month, 1);
+        part := format('%s_ay%s', p_table, y);
+        IF to_regclass(format('public.%I', part)) IS NULL
+           AND to_regclass(format('attendance_archive.%I', part)) IS NULL THEN
+            -- Build it detached, move that year's rows out of DEFAULT (if any), then attach:
+            -- ATTACH refuses while DEFAULT still holds rows of the new range.
+            EXECUTE format('CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS)', part, p_table);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM public.%I WHERE date >= %L AND date < %L RETURNING *) '
+                'INSERT INTO public.%I SELECT * FROM moved',
+                p_table || '_default', lo, hi, part);
+            EXECUTE format('ALTER TABLE public.%I ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+                           p_table, part, lo, hi);
+            created := created + 1;
+        END IF;
+        y := y + 1;
+    END LOOP;
+    RETURN created;
+END $$;
+"""
+
+TABLES = {
+    'attendance_events': {
+        'ddl': """
+            CREATE SEQUENCE IF NOT EXISTS attendance_events_id_seq_p AS integer;
+            CREATE TABLE attendance_events (
+                id integer NOT NULL DEFAULT nextval('attendance_events_id_seq_p'),
+                student_id integer NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                date date NOT NULL,
+                present integer NOT NULL,
+                created_at timestamptz NOT NULL DEFAULT now(),
+                updated_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, date),
+                CONSTRAINT uq_attendance_event_student_date UNIQUE (student_id, date)
+            ) PARTITION BY RANGE (date);
+            ALTER SEQUENCE attendance_events_id_seq_p OWNED BY attendance_events.id;
+            CREATE TABLE IF NOT EXISTS attendance_events_default PARTITION OF attendance_events DEFAULT;
+        """,
+        # student_id lookups use the (student_id, date) unique index; date ranges within a year use this one.
+        'indexes': "CREATE INDEX IF NOT EXISTS ix_attendance_events_date ON attendance_events (date);",
+        'columns': {'student_id': None, 'date': None, 'present': None, 'id': None,
+                    'created_at': 'now()', 'updated_at': 'now()'},
+    },
+    'attendance_student': {
+        'ddl': """
+            CREATE SEQUENCE IF NOT EXISTS attendance_student_id_seq_p AS integer;
+            CREATE TABLE attendance_student (
+                id integer NOT NULL DEFAULT nextval('attendance_student_id_seq_p'),
+                student_id integer NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                date date NOT NULL,
+                status varchar NOT NULL,
+                created_at timestamptz DEFAULT now(),
+                PRIMARY KEY (id, date),
+                CONSTRAINT uq_attendance_student_date UNIQUE (student_id, date)
+            ) PARTITION BY RANGE (date);
+            ALTER SEQUENCE attendance_student_id_seq_p OWNED BY attendance_student.id;
+            CREATE TABLE IF NOT EXISTS attendance_student_default PARTITION OF attendance_student DEFAULT;
+        """,
+        'indexes': "CREATE INDEX IF NOT EXISTS ix_attendance_student_date ON attendance_student (date);",
+        'columns': {'student_id': None, 'date': None, 'status': None, 'id': None, 'created_at': 'now()'},
+    },
+}
+
+# Free the old table's index (and so constraint) names for the partitioned table.
+_RENAME_INDEXES = """
+DO $$
+DECLARE r record;
+BEGIN
+    FOR r IN SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+             WHERE x.indrelid = 'public.{old}'::regclass LOOP
+        EXECUTE format('ALTER INDEX public.%I RENAME TO %I', r.relname, left(r.relname, 50) || '_unpartitioned');
+    END LOOP;
+END $$;
+"""
+
+
+def _relkind(conn, table: str):
+    return conn.execute(sa.text(
+        "SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid=c.relnamespace "
+        "WHERE n.nspname='public' AND c.relname=:t"
+    ), {'t': table}).scalar()
+
+
+def _partition(conn, table: str, spec: dict) -> None:
+    old = f"{table}_unpartitioned"
+    # User triggers (class_daily_stats / attendance_month rollups) go with the old table; re-create them afterwards.
+    triggers = [r[0] for r in conn.execute(sa.text(
+        "SELECT pg_get_triggerdef(t.oid) FROM pg_trigger t WHERE t.tgrelid = to_regclass(:t) AND NOT t.tgisinternal"
+    ), {'t': f"public.{table}"}).all()]
+    present = {r[0] for r in conn.execute(sa.text(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name=:t"
+    ), {'t': table}).all()}
+    conn.execute(sa.text(f"ALTER TABLE public.{table} RENAME TO {old}"))
+    conn.execute(sa.text(_RENAME_INDEXES.format(old=old)))
+    conn.execute(sa.text(spec['ddl']))
+    start = conn.execute(sa.text(f"SELECT min(date) FROM public.{old}")).scalar()
+    conn.execute(
+        sa.text("SELECT attendance_ensure_partitions(:t, coalesce(:f, current_date), (current_date + interval '1 year')::date, :m)"),
+        {'t': table, 'f': start, 'm': START_MONTH},
+    )
+    conn.execute(sa.text(spec['indexes']))
+    # Older seeded attendance_student tables lack id / created_at; those take the new defaults.
+    cols, exprs = [], []
+    for col, fallback in spec['columns'].items():
+        if col in present:
+            cols.append(col)
+            exprs.append(col if fallback is None else f"coalesce({col}, {fallback})")
+        elif fallback is not None:
+            cols.append(col)
+            exprs.append(fallback)
+    conn.execute(sa.text(f"INSERT INTO public.{table} ({', '.join(cols)}) SELECT {', '.join(exprs)} FROM public.{old}"))
+    conn.execute(sa.text(
+        f"SELECT setval('{table}_id_seq_p', greatest((SELECT coalesce(max(id), 0) FROM public.{table}), 1))"
+    ))
+    conn.execute(sa.text(f"DROP TABLE public.{old}"))
+    for ddl in triggers:
+        conn.execute(sa.text(ddl))
+
+
+def upgrade():
+    conn = op.get_bind()
+    conn.execute(sa.text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    conn.execute(sa.text(ENSURE_FN))
+    for table, spec in TABLES.items():
+        relkind = _relkind(conn, table)
+        if relkind is None:
+            print(f"[attendance_partitioning] {table} missing; skipped")
+            continue
+        if relkind == 'p':
+            conn.execute(
+                sa.text("SELECT attendance_ensure_partitions(:t, current_date, (current_date + interval '1 year')::date, :m)"),
+                {'t': table, 'm': START_MONTH},
+            )
+            conn.execute(sa.text(spec['indexes']))
+            continue
+        _partition(conn, table, spec)
+
+
+def downgrade():
+    raise RuntimeError("Downgrade not supported for attendance partitioning")
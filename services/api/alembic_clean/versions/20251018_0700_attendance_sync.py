@@ -0,0 +1,124 @@
+"""attendance_sync: per-class change log for teacher delta sync
+
+Revision ID: 20251018_0700_attendance_sync
+Revises: 20251018_0600_attendance_partitioning
+Create Date: 2025-10-18
+
+* attendance_sync_class holds one monotonic ``last_seq`` counter per class section.
+* attendance_sync keeps the latest state of every (class, student, day) mark
+  with the ``seq`` of its last change; ``status`` NULL means the mark was deleted.
+  Clients ask for ``seq > token``; rows older than ATTENDANCE_SYNC_DAYS are
+  pruned by app/workers/attendance_partitions.py.
+
+A statement-level AFTER trigger on attendance_student maps the touched
+(student, day) pairs to classes through academics.enrollment and calls
+``attendance_sync_record`` once. Class counters are locked in id order and held
+until commit, so per class the seq order is the commit order and a reader that
+takes ``last_seq`` before reading changes never skips one. Idempotent; safe to
+re-run.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+from alembic_clean import trigger_sql
+
+revision = '20251018_0700_attendance_sync'
+down_revision = '20251018_0600_attendance_partitioning'
+branch_labels = None
+depends_on = None
+
+TABLES = """
+CREATE TABLE IF NOT EXISTS attendance_sync_class (
+    class_section_id BIGINT PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS attendance_sync (
+    class_section_id BIGINT NOT NULL,
+    student_id INTEGER NOT NULL,
+    date DATE NOT NULL,
+    status TEXT,
+    seq BIGINT NOT NULL,
+    PRIMARY KEY (class_section_id, student_id, date)
+);
+CREATE INDEX IF NOT EXISTS ix_attendance_sync_class_seq ON attendance_sync (class_section_id, seq);
+CREATE INDEX IF NOT EXISTS ix_attendance_sync_date ON attendance_sync (date);
+"""
+
+# (class_section_id, student_id, day) for the given pairs: enrolments active on that day.
+_CLASSES = """
+    SELECT DISTINCT e.class_section_id, k.student_id, k.day
+    FROM unnest(p_students, p_days) AS k(student_id, day)
+    JOIN academics.enrollment e ON e.student_id = k.student_id
+     AND (e.joined_on IS NULL OR e.joined_on <= k.day)
+     AND (e.left_on IS NULL OR e.left_on >= k.day)
+"""
+
+RECORD_FN = f"""
+CREATE OR REPLACE FUNCTION attendance_sync_record(p_students integer[], p_days date[])
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO attendance_sync_class (class_section_id)
+    SELECT DISTINCT class_section_id FROM ({_CLASSES}) c
+    ON CONFLICT (class_section_id) DO NOTHING;
+
+    -- Lock counters in a fixed order so concurrent multi-class writers cannot deadlock.
+    PERFORM 1 FROM attendance_sync_class
+    WHERE class_section_id IN (SELECT class_section_id FROM ({_CLASSES}) c)
+    ORDER BY class_section_id FOR UPDATE;
+
+    WITH c AS (
+        SELECT c.class_section_id, c.student_id, c.day, st.status,
+               row_number() OVER (PARTITION BY c.class_section_id ORDER BY c.student_id, c.day) AS n,
+               count(*) OVER (PARTITION BY c.class_section_id) AS total
+        FROM ({_CLASSES}) c
+        LEFT JOIN attendance_student st ON st.student_id = c.student_id AND st.date = c.day
+    ), bumped AS (
+        UPDATE attendance_sync_class s SET last_seq = s.last_seq + t.total
+        FROM (SELECT DISTINCT class_section_id, total FROM c) t
+        WHERE s.class_section_id = t.class_section_id
+        RETURNING s.class_section_id, s.last_seq - t.total AS base
+    )
+    INSERT INTO attendance_sync AS a (class_section_id, student_id, date, status, seq)
+    SELECT c.class_section_id, c.student_id, c.day, c.status, b.base + c.n
+    FROM c JOIN bumped b ON b.class_section_id = c.class_section_id
+    ON CONFLICT (class_section_id, student_id, date) DO UPDATE SET status = EXCLUDED.status, seq = EXCLUDED.seq;
+END $$;
+"""
+
+APPLY = """
+    PERFORM attendance_sync_record(array_agg(c.student_id), array_agg(c.date))
+    FROM (SELECT DISTINCT student_id, date FROM ({changes}) x) c;
+"""
+
+
+def trigger_function_sql() -> str:
+    return trigger_sql.function_sql('attendance_sync_attendance_student', {
+        op_name: APPLY.format(changes=trigger_sql.changes(op_name, 'student_id, date')) for op_name in trigger_sql.OPS
+    })
+
+
+def trigger_ddl() -> str:
+    return trigger_sql.trigger_ddl('attendance_student', 'attendance_sync_attendance_student', 'sync')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if any(conn.execute(sa.text("SELECT to_regclass(:t)"), {'t': t}).scalar() is None
+           for t in ('attendance_student', 'academics.enrollment')):
+        print("[attendance_sync] attendance_student / academics.enrollment missing; skipped")
+        return
+    conn.execute(sa.text(TABLES))
+    conn.execute(sa.text(RECORD_FN))
+    conn.execute(sa.text(trigger_function_sql()))
+    conn.execute(sa.text(trigger_ddl()))
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.execute(sa.text("SELECT to_regclass('attendance_student')")).scalar() is not None:
+        for stmt in trigger_sql.drop_triggers_sql('attendance_student', 'sync'):
+            conn.execute(sa.text(stmt))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS attendance_sync_attendance_student()"))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS attendance_sync_record(integer[], date[])"))
+    conn.execute(sa.text("DROP TABLE IF EXISTS attendance_sync"))
+    conn.execute(sa.text("DROP TABLE IF EXISTS attendance_sync_class"))
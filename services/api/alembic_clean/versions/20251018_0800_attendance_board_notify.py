@@ -0,0 +1,60 @@
+"""NOTIFY attendance_board when today's attendance marks change
+
+Revision ID: 20251018_0800_attendance_board_notify
+Revises: 20251018_0700_attendance_sync
+Create Date: 2025-10-18
+
+A statement-level AFTER trigger on attendance_student sends one
+``pg_notify('attendance_board', <date>)`` per statement that touched today's
+rows (Postgres folds identical notifications within a transaction and delivers
+them on commit). Each API worker LISTENs on one connection and recomputes the
+completion board once per burst (app/modules/attendance/board.py). Idempotent;
+safe to re-run.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+from alembic_clean import trigger_sql
+
+revision = '20251018_0800_attendance_board_notify'
+down_revision = '20251018_0700_attendance_sync'
+branch_labels = None
+depends_on = None
+
+CHANNEL = 'attendance_board'
+
+NOTIFY = """
+    IF EXISTS (SELECT 1 FROM {rows} WHERE date = current_date) THEN
+        PERFORM pg_notify('{channel}', current_date::text);
+    END IF;
+"""
+
+# Only the date column matters, so UPDATE checks both transition tables in one scan.
+ROWS = {'INSERT': 'new_rows', 'UPDATE': '(SELECT date FROM new_rows UNION ALL SELECT date FROM old_rows) r', 'DELETE': 'old_rows'}
+
+
+def trigger_function_sql() -> str:
+    return trigger_sql.function_sql('attendance_board_notify', {
+        op_name: NOTIFY.format(rows=rows, channel=CHANNEL) for op_name, rows in ROWS.items()
+    })
+
+
+def trigger_ddl() -> str:
+    return trigger_sql.trigger_ddl('attendance_student', 'attendance_board_notify', 'board')
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.execute(sa.text("SELECT to_regclass('attendance_student')")).scalar() is None:
+        print("[attendance_board] attendance_student missing; skipped")
+        return
+    conn.execute(sa.text(trigger_function_sql()))
+    conn.execute(sa.text(trigger_ddl()))
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.execute(sa.text("SELECT to_regclass('attendance_student')")).scalar() is not None:
+        for stmt in trigger_sql.drop_triggers_sql('attendance_student', 'board'):
+            conn.execute(sa.text(stmt))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS attendance_board_notify()"))
@@ -0,0 +1,90 @@
+"""core.rbac_version: bump and NOTIFY on every RBAC table change; seed ops:manage
+
+Revision ID: 20251018_0900_rbac_version
+Revises: 20251018_0800_attendance_board_notify
+Create Date: 2025-10-18
+
+The permission cache (app/core/perm_cache.py) used to learn about RBAC changes
+only through ``invalidate()`` / the Redis ``rbac:version`` key, so direct edits
+to core.role_permission or core.user_permission_override went unnoticed.
+
+A statement-level AFTER trigger on both tables now increments the single row of
+``core.rbac_version`` and sends ``pg_notify('rbac_invalidate', <version>)``
+(delivered on commit). Workers LISTEN for it and also compare the stored
+version on their periodic check, so a missed notification only costs
+RBAC_CACHE_TTL of staleness.
+
+Also seeds ``ops:manage`` (mapped to ADMIN) for the privileged /ops actions.
+Idempotent; safe to re-run.
+"""
+from alembic import op  # type: ignore
+import sqlalchemy as sa  # type: ignore
+
+revision = '20251018_0900_rbac_version'
+down_revision = '20251018_0800_attendance_board_notify'
+branch_labels = None
+depends_on = None
+
+CHANNEL = 'rbac_invalidate'
+SOURCES = ('core.role_permission', 'core.user_permission_override')
+
+TABLE = """
+CREATE TABLE IF NOT EXISTS core.rbac_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO core.rbac_version (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+"""
+
+BUMP_FN = f"""
+CREATE OR REPLACE FUNCTION core.rbac_version_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    v BIGINT;
+BEGIN
+    UPDATE core.rbac_version SET version = version + 1 RETURNING version INTO v;
+    PERFORM pg_notify('{CHANNEL}', v::text);
+    RETURN NULL;
+END $$;
+"""
+
+
+def _trigger_name(table: str) -> str:
+    return f"trg_{table.split('.')[-1]}_rbac_version"
+
+
+def trigger_ddl(table: str) -> str:
+    name = _trigger_name(table)
+    return (
+        f"DROP TRIGGER IF EXISTS {name} ON {table};\n"
+        f"CREATE TRIGGER {name} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+        "FOR EACH STATEMENT EXECUTE FUNCTION core.rbac_version_bump();"
+    )
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.execute(sa.text("SELECT to_regclass('core.role_permission')")).scalar() is None:
+        print("[rbac_version] core.role_permission missing; skipped")
+        return
+    conn.execute(sa.text(TABLE))
+    conn.execute(sa.text(BUMP_FN))
+    for table in SOURCES:
+        if conn.execute(sa.text("SELECT to_regclass(:t)"), {'t': table}).scalar() is not None:
+            conn.execute(sa.text(trigger_ddl(table)))
+    conn.execute(sa.text(
+        "INSERT INTO core.permission(code, description) VALUES (:c,:d) ON CONFLICT (code) DO NOTHING"),
+        {"c": "ops:manage", "d": "Trigger cluster-wide operational actions under /ops"},
+    )
+    conn.execute(sa.text(
+        "INSERT INTO core.role_permission(role, permission_code) VALUES ('ADMIN', :c) ON CONFLICT DO NOTHING"),
+        {"c": "ops:manage"},
+    )
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table in SOURCES:
+        if conn.execute(sa.text("SELECT to_regclass(:t)"), {'t': table}).scalar() is not None:
+            conn.execute(sa.text(f"DROP TRIGGER IF EXISTS {_trigger_name(table)} ON {table}"))
+    conn.execute(sa.text("DROP FUNCTION IF EXISTS core.rbac_version_bump()"))
+    conn.execute(sa.text("DROP TABLE IF EXISTS core.rbac_version"))
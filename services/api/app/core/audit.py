@@ -0,0 +1,362 @@
+"""Asynchronous, batched audit-log pipeline.
+
+Audited handlers no longer commit an ``AuditLog`` row inline. ``audit_writer.submit``
+puts a plain dict on a bounded in-process queue and returns immediately; a
+background task (started in lifespan) drains it in batches of up to
+AUDIT_BATCH_SIZE rows with one multi-row INSERT into ``core.audit_log``.
+
+Durability:
+  * AUDIT_DURABLE=1: records are RPUSHed to the Redis list ``audit:spill`` first
+    and the flusher drains that list, so a crash or restart loses nothing.
+    Every worker drains the same list, so a batch is first claimed atomically
+    (moved to this writer's ``audit:spill:claim:<id>`` list by a Lua script) and
+    the claim is deleted only after the insert commits. A failed insert keeps
+    the claim for the next attempt; claims whose writer stopped renewing its
+    lease are pushed back onto the spill list by whichever writer notices.
+  * Otherwise records live in memory; on shutdown whatever cannot be flushed to
+    Postgres is spilled to Redis, and the next process drains it on start.
+  * When the queue is full records spill to Redis; without Redis they are
+    dropped and counted (``audit_dropped_total``) rather than blocking requests.
+
+Before/after snapshots come from SQLAlchemy change tracking: ``track_changes``
+marks a session and an ``after_flush`` hook reads attribute history of the
+new/dirty/deleted objects, so no extra SELECT is issued.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Optional
+from uuid import UUID
+
+from prometheus_client import Counter, Gauge, Histogram
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .redis import get_redis, mark_redis_down
+
+LOG = logging.getLogger("audit")
+
+SPILL_KEY = "audit:spill"
+_CLAIM_PREFIX = "audit:spill:claim:"
+_LEASE_PREFIX = "audit:spill:lease:"
+_LEASE_SEC = 60
+_RECOVER_EVERY_SEC = 30
+_TRACK_KEY = "audit_changes"
+
+AUDIT_QUEUE_DEPTH = Gauge('audit_queue_depth', 'Audit records waiting in the in-process queue')
+AUDIT_ENQUEUED = Counter('audit_enqueued_total', 'Audit records accepted', ['path'])
+AUDIT_DROPPED = Counter('audit_dropped_total', 'Audit records dropped', ['reason'])
+AUDIT_SPILLED = Counter('audit_spilled_total', 'Audit records spilled to Redis', ['reason'])
+AUDIT_FLUSHED = Counter('audit_flushed_total', 'Audit records written to Postgres')
+AUDIT_FLUSH_ERRORS = Counter('audit_flush_errors_total', 'Failed audit batch inserts')
+AUDIT_BATCH_SIZE = Histogram('audit_flush_batch_size', 'Rows per audit insert', buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+AUDIT_FLUSH_SECONDS = Histogram('audit_flush_seconds', 'Audit batch insert latency')
+AUDIT_LAG_SECONDS = Histogram('audit_enqueue_to_write_seconds', 'Delay between submit and insert',
+                              buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60))
+
+_COLUMNS = ('created_at', 'user_id', 'school_id', 'action', 'object_type', 'object_id', 'verb',
+            'before', 'after', 'request_id', 'ip', 'user_agent')
+
+
+# ---- ORM change tracking ----
+def _jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    return str(value)
+
+
+def _loaded_columns(state) -> dict:
+    return {a.key: _jsonable(state.dict[a.key]) for a in state.mapper.column_attrs if a.key in state.dict}
+
+
+def _snapshot(obj, kind: str) -> dict:
+    state = inspect(obj)
+    before: Optional[dict] = None
+    after: Optional[dict] = None
+    if kind == 'create':
+        after = _loaded_columns(state)
+    elif kind == 'delete':
+        before = _loaded_columns(state)
+    else:
+        before, after = {}, {}
+        for attr in state.mapper.column_attrs:
+            hist = state.attrs[attr.key].history
+            if not hist.has_changes():
+                continue
+            before[attr.key] = _jsonable(hist.deleted[0]) if hist.deleted else None
+            after[attr.key] = _jsonable(hist.added[0]) if hist.added else None
+        if not after:
+            return {}
+    identity = state.identity or state.mapper.primary_key_from_instance(obj)
+    return {
+        'object_type': state.mapper.persist_selectable.name,
+        'object_id': ','.join(str(v) for v in identity if v is not None) or None,
+        'verb': kind.upper(),
+        'before': before,
+        'after': after,
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session: Session, flush_context):
+    # Pre-flush new/dirty/deleted sets and attribute history are still visible here.
+    changes = session.info.get(_TRACK_KEY)
+    if changes is None:
+        return
+    for kind, objs in (('create', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objs:
+            snap = _snapshot(obj, kind)
+            if snap:
+                changes.append(snap)
+
+
+def track_changes(session) -> list[dict]:
+    """Start collecting ORM change snapshots for ``session`` (sync or async)."""
+    sync = getattr(session, 'sync_session', session)
+    changes: list[dict] = []
+    sync.info[_TRACK_KEY] = changes
+    return changes
+
+
+def stop_tracking(session) -> None:
+    getattr(session, 'sync_session', session).info.pop(_TRACK_KEY, None)
+
+
+# KEYS[1] spill list, KEYS[2] claim list, KEYS[3] lease; ARGV batch size, lease seconds.
+# Renews the lease, then returns the pending claim (a failed insert is retried
+# first) or moves up to ARGV[1] records from the head of the spill list into it.
+_CLAIM_LUA = """
+redis.call('SET', KEYS[3], '1', 'EX', tonumber(ARGV[2]))
+local held = redis.call('LRANGE', KEYS[2], 0, -1)
+if #held > 0 then
+  return held
+end
+local n = tonumber(ARGV[1])
+local items = redis.call('LRANGE', KEYS[1], 0, n - 1)
+if #items == 0 then
+  return items
+end
+redis.call('LTRIM', KEYS[1], #items, -1)
+redis.call('RPUSH', KEYS[2], unpack(items))
+return items
+"""
+
+# KEYS[1] spill list, KEYS[2] claim list, KEYS[3] lease. Requeues an abandoned claim
+# at the head of the spill list (original order); returns records moved.
+_RECOVER_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+  return 0
+end
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = #items, 1, -1 do
+  redis.call('LPUSH', KEYS[1], items[i])
+end
+redis.call('DEL', KEYS[2])
+return #items
+"""
+
+
+# ---- writer ----
+class AuditWriter:
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._claim_id = uuid.uuid4().hex
+        self._recovered_at = 0.0
+        AUDIT_QUEUE_DEPTH.set_function(lambda: self._queue.qsize() if self._queue is not None else 0)
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=settings.audit_queue_max)
+        return self._queue
+
+    @staticmethod
+    def build_record(**fields: Any) -> dict:
+        rec = {k: fields.get(k) for k in _COLUMNS}
+        rec['created_at'] = rec['created_at'] or datetime.now(timezone.utc).isoformat()
+        rec['_ts'] = time.time()
+        return rec
+
+    async def submit(self, record: dict) -> None:
+        """Hand a record to the pipeline; never raises, never waits on Postgres."""
+        if settings.audit_durable and await self._spill([record], 'durable'):
+            AUDIT_ENQUEUED.labels('redis').inc()
+            return
+        try:
+            self.queue.put_nowait(record)
+            AUDIT_ENQUEUED.labels('memory').inc()
+        except asyncio.QueueFull:
+            if not await self._spill([record], 'queue_full'):
+                AUDIT_DROPPED.labels('queue_full').inc()
+
+    async def _spill(self, records: list[dict], reason: str) -> bool:
+        r = await get_redis()
+        if r is None:
+            return False
+        try:
+            await r.rpush(SPILL_KEY, *[json.dumps(rec, default=str) for rec in records])
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+            return False
+        AUDIT_SPILLED.labels(reason).inc(len(records))
+        return True
+
+    # ---- background flushing ----
+    def start(self):
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="audit-flusher")
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        # Final drain; anything Postgres will not take goes to Redis for the next process.
+        pending = self._take(self._queue.qsize()) if self._queue is not None else []
+        if pending and not await self._write(pending):
+            if not await self._spill(pending, 'shutdown'):
+                AUDIT_DROPPED.labels('shutdown').inc(len(pending))
+                LOG.error("dropping %d audit records at shutdown (db and redis unavailable)", len(pending))
+
+    def _take(self, limit: int) -> list[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await self.flush_once(wait=settings.audit_flush_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # keep the flusher alive
+                LOG.warning("audit flush loop error: %s", e)
+                await asyncio.sleep(settings.audit_flush_interval)
+
+    async def flush_once(self, wait: float = 0.0) -> int:
+        """Write one batch from Redis spill (first) or the local queue. Returns rows written."""
+        written = await self._flush_spill()
+        if written:
+            return written
+        if wait and self.queue.empty():
+            try:
+                first = await asyncio.wait_for(self.queue.get(), timeout=wait)
+            except asyncio.TimeoutError:
+                return 0
+            batch = [first] + self._take(settings.audit_batch_size - 1)
+        else:
+            batch = self._take(settings.audit_batch_size)
+        if not batch:
+            return 0
+        if await self._write(batch):
+            return len(batch)
+        # Keep them: Redis if possible, otherwise back into the queue (bounded).
+        if not await self._spill(batch, 'db_error'):
+            for rec in batch:
+                try:
+                    self.queue.put_nowait(rec)
+                except asyncio.QueueFull:
+                    AUDIT_DROPPED.labels('db_error').inc()
+        await asyncio.sleep(settings.audit_flush_interval)
+        return 0
+
+    async def _flush_spill(self) -> int:
+        r = await get_redis()
+        if r is None:
+            return 0
+        claim, lease = _CLAIM_PREFIX + self._claim_id, _LEASE_PREFIX + self._claim_id
+        try:
+            if time.monotonic() - self._recovered_at >= _RECOVER_EVERY_SEC:
+                await self._recover_claims(r)
+            raw = await r.eval(_CLAIM_LUA, 3, SPILL_KEY, claim, lease, settings.audit_batch_size, _LEASE_SEC)
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+            return 0
+        if not raw:
+            return 0
+        batch = []
+        for item in raw:
+            try:
+                batch.append(json.loads(item))
+            except ValueError:
+                AUDIT_DROPPED.labels('corrupt').inc()
+        if batch and not await self._write(batch):
+            # The claim stays with this writer and is retried on the next flush.
+            return 0
+        try:
+            # Release only after the insert committed (at-least-once delivery).
+            await r.delete(claim)
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+        return len(batch)
+
+    async def _recover_claims(self, r) -> None:
+        """Push claims of writers whose lease expired (crashed mid-flush) back onto the spill list."""
+        self._recovered_at = time.monotonic()
+        async for key in r.scan_iter(match=_CLAIM_PREFIX + '*', count=100):
+            owner = key[len(_CLAIM_PREFIX):]
+            if owner == self._claim_id:
+                continue
+            moved = await r.eval(_RECOVER_LUA, 3, SPILL_KEY, key, _LEASE_PREFIX + owner)
+            if moved:
+                LOG.warning("requeued %d audit records abandoned by writer %s", moved, owner)
+
+    async def _write(self, batch: list[dict]) -> bool:
+        from .db import engine
+        from .tenant import AuditLog
+        now = time.time()
+        rows = []
+        for rec in batch:
+            row = {k: rec.get(k) for k in _COLUMNS}
+            if isinstance(row['created_at'], str):
+                row['created_at'] = datetime.fromisoformat(row['created_at'])
+            rows.append(row)
+        start = time.perf_counter()
+        try:
+            async with engine.begin() as conn:
+                # executemany -> insertmanyvalues: multi-row VALUES batches
+                await conn.execute(AuditLog.__table__.insert(), rows)
+        except Exception as e:
+            AUDIT_FLUSH_ERRORS.inc()
+            LOG.warning("audit batch insert failed (%d rows): %s", len(rows), e)
+            return False
+        AUDIT_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        AUDIT_BATCH_SIZE.observe(len(rows))
+        AUDIT_FLUSHED.inc(len(rows))
+        for rec in batch:
+            ts = rec.get('_ts')
+            if ts:
+                AUDIT_LAG_SECONDS.observe(max(0.0, now - ts))
+        return True
+
+
+audit_writer = AuditWriter()
@@ -0,0 +1,121 @@
+"""Set-based bulk writes: one statement per operation, however many rows.
+
+Rows are shipped as one array parameter per column and expanded server-side
+with ``unnest`` (a VALUES list whose size does not change the statement text,
+so the plan is cached and the bind count stays constant):
+
+* ``upsert_rows``     INSERT ... SELECT FROM unnest(...) ON CONFLICT DO UPDATE
+* ``update_rows``     UPDATE ... FROM unnest(...) AS v  (NULL = leave unchanged),
+                      returning the keys that actually changed
+* ``insert_missing``  set-difference insert of (fixed, value) pairs
+* ``delete_except``   delete (fixed, value) pairs not in the given set
+
+``types`` maps each column to its Postgres type (``int``, ``text``, ...), used
+for the array casts. Table and column names come from code, never from
+requests; they are still checked to be plain identifiers. Callers commit.
+"""
+from __future__ import annotations
+import re
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_IDENT = re.compile(r'^[a-z_][a-z0-9_]*(\.[a-z_][a-z0-9_]*)?$')
+
+
+def _ident(name: str) -> str:
+    if not _IDENT.match(name):
+        raise ValueError(f"invalid identifier: {name!r}")
+    return name
+
+
+def _arrays(rows: Sequence[Mapping[str, Any]], columns: Sequence[str]) -> dict[str, list]:
+    return {f"a_{c}": [r.get(c) for r in rows] for c in columns}
+
+
+def _unnest(columns: Sequence[str], types: Mapping[str, str]) -> str:
+    return "unnest(" + ", ".join(f"CAST(:a_{c} AS {types[c]}[])" for c in columns) + ")"
+
+
+async def upsert_rows(session: AsyncSession, table: str, rows: Sequence[Mapping[str, Any]], types: Mapping[str, str],
+                      conflict: Sequence[str], update: Sequence[str], set_now: Sequence[str] = ()) -> int:
+    """Insert ``rows`` or update ``update`` columns on ``conflict``; returns rows inserted or updated.
+
+    Rows must be unique on the conflict key (Postgres cannot update one row twice per statement).
+    ``set_now`` columns are set to now() on update (e.g. ``updated_at``).
+    """
+    if not rows:
+        return 0
+    cols = list(types)
+    for c in [table, *cols, *conflict, *update, *set_now]:
+        _ident(c)
+    assignments = [f"{c} = EXCLUDED.{c}" for c in update] + [f"{c} = now()" for c in set_now]
+    sql = (
+        f"INSERT INTO {table} ({', '.join(cols)}) "
+        f"SELECT * FROM {_unnest(cols, types)} "
+        f"ON CONFLICT ({', '.join(conflict)}) DO "
+        + (f"UPDATE SET {', '.join(assignments)}" if assignments else "NOTHING")
+    )
+    res = await session.execute(text(sql), _arrays(rows, cols))
+    return res.rowcount or 0
+
+
+async def update_rows(session: AsyncSession, table: str, key: str, rows: Sequence[Mapping[str, Any]],
+                      types: Mapping[str, str], set_now: Sequence[str] = ()) -> list:
+    """Apply per-row partial updates keyed by ``key``; a None value keeps the current column value.
+
+    Rows whose values are all unchanged are skipped. Returns the keys of updated rows.
+    """
+    if not rows:
+        return []
+    cols = [c for c in types if c != key]
+    for c in [table, key, *cols, *set_now]:
+        _ident(c)
+    new = {c: f"coalesce(v.{c}, t.{c})" for c in cols}
+    assignments = [f"{c} = {new[c]}" for c in cols] + [f"{c} = now()" for c in set_now]
+    changed = " OR ".join(f"t.{c} IS DISTINCT FROM {new[c]}" for c in cols)
+    order = [key, *cols]
+    sql = (
+        f"UPDATE {table} AS t SET {', '.join(assignments)} "
+        f"FROM {_unnest(order, types)} AS v({', '.join(order)}) "
+        f"WHERE t.{key} = v.{key} AND ({changed}) "
+        f"RETURNING t.{key}"
+    )
+    res = await session.execute(text(sql), _arrays(rows, order))
+    return [r[0] for r in res.all()]
+
+
+async def insert_missing(session: AsyncSession, table: str, fixed: Mapping[str, Any], column: str,
+                         values: Iterable[Any], types: Mapping[str, str]) -> int:
+    """Insert ``fixed`` + each of ``values`` not already present (set difference); returns rows inserted."""
+    values = list(dict.fromkeys(values))
+    if not values:
+        return 0
+    for c in [table, column, *fixed]:
+        _ident(c)
+    where = " AND ".join(f"{c} = CAST(:f_{c} AS {types[c]})" for c in fixed)
+    sql = (
+        f"INSERT INTO {table} ({', '.join([*fixed, column])}) "
+        f"SELECT {', '.join(f'CAST(:f_{c} AS {types[c]})' for c in fixed)}, v FROM ("
+        f"SELECT unnest(CAST(:vals AS {types[column]}[])) AS v "
+        f"EXCEPT SELECT {column} FROM {table} WHERE {where}"
+        f") missing ON CONFLICT DO NOTHING"
+    )
+    params = {f"f_{c}": v for c, v in fixed.items()}
+    params['vals'] = values
+    res = await session.execute(text(sql), params)
+    return res.rowcount or 0
+
+
+async def delete_except(session: AsyncSession, table: str, fixed: Mapping[str, Any], column: str,
+                        keep: Iterable[Any], types: Mapping[str, str]) -> int:
+    """Delete rows matching ``fixed`` whose ``column`` is not in ``keep``; returns rows deleted."""
+    for c in [table, column, *fixed]:
+        _ident(c)
+    where = " AND ".join(f"{c} = CAST(:f_{c} AS {types[c]})" for c in fixed)
+    sql = f"DELETE FROM {table} WHERE {where} AND NOT ({column} = ANY(CAST(:keep AS {types[column]}[])))"
+    params: dict[str, Optional[Any]] = {f"f_{c}": v for c, v in fixed.items()}
+    params['keep'] = list(keep)
+    res = await session.execute(text(sql), params)
+    return res.rowcount or 0
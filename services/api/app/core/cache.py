@@ -0,0 +1,351 @@
+"""Two-tier read cache: bounded in-process LRU in front of Redis, with tag invalidation.
+
+Keys are built from the endpoint name and its parameters (``cache_key``).
+``get_or_load`` serves from the local LRU, then Redis (promoting the value into
+the LRU), and only calls the loader on a miss in both tiers.
+
+Every entry carries tags such as ``class:{id}``, ``ay:{year}`` or
+``attendance:{date}``. ``invalidate(*tags)`` deletes the tagged Redis keys
+(tracked in ``cache:tag:{tag}`` sets) and publishes the tags on
+``cache:invalidate`` so every worker drops its local copies. A value whose
+load overlapped any invalidation is returned but not stored, so a slow loader
+cannot resurrect pre-write data. Without Redis both tiers collapse to the
+local LRU and invalidation is per process.
+
+Expensive loads are single-flight (one per key per process, one per key across
+workers via a Redis lock) and entries may outlive their TTL by ``stale_ttl`` so
+callers get the last good value (STALE) while one background refresh runs.
+
+Local values are kept as Python objects; the Redis tier stores an orjson
+envelope and an optional ``decode`` rebuilds objects on a Redis hit.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional, Union
+
+import orjson
+from prometheus_client import Counter, Gauge
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+
+from .config import settings
+from .redis import get_redis, mark_redis_down, release_lock
+
+LOG = logging.getLogger("cache")
+
+CACHE_CHANNEL = "cache:invalidate"
+_PREFIX = "cache:"
+
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups', ['name', 'tier', 'result'])
+CACHE_EVICTIONS = Counter('cache_evictions_total', 'Local LRU evictions', ['name'])
+CACHE_INVALIDATIONS = Counter('cache_invalidations_total', 'Tag invalidations', ['source'])
+CACHE_LOCAL_ENTRIES = Gauge('cache_local_entries', 'Entries in the in-process LRU')
+CACHE_SINGLEFLIGHT = Counter('cache_singleflight_total', 'Cache loads by coalescing role', ['name', 'role'])
+
+# Cross-worker load lock lifetime and how long other workers wait on it before loading themselves.
+_LOCK_MS = 30_000
+_REMOTE_WAIT_SEC = 10.0
+
+
+def cache_key(name: str, **params: Any) -> str:
+    """``name:<digest of sorted params>``; ``name`` doubles as the metrics label."""
+    raw = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{name}:{hashlib.sha1(raw.encode()).hexdigest()[:16]}"
+
+
+def _name(key: str) -> str:
+    return key.split(':', 1)[0]
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError
+
+
+class _Entry:
+    __slots__ = ('value', 'fresh_until', 'expires', 'tags')
+
+    def __init__(self, value: Any, fresh_until: float, expires: float, tags: tuple[str, ...]):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.expires = expires
+        self.tags = tags
+
+
+class TieredCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._local: OrderedDict[str, _Entry] = OrderedDict()
+        self._by_tag: dict[str, set[str]] = {}
+        # Bumped on every invalidation; a load that overlapped one is not stored.
+        self._generation = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._listener: Optional[asyncio.Task] = None
+        CACHE_LOCAL_ENTRIES.set_function(lambda: len(self._local))
+
+    # ---- local tier ----
+    def _local_get(self, key: str) -> Optional[_Entry]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry.expires <= time.monotonic():
+            self._local_drop(key)
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _local_put(self, key: str, value: Any, fresh_for: float, expires_for: float, tags: Iterable[str]):
+        tags = tuple(tags)
+        now = time.monotonic()
+        self._local_drop(key)
+        self._local[key] = _Entry(value, now + fresh_for, now + expires_for, tags)
+        for t in tags:
+            self._by_tag.setdefault(t, set()).add(key)
+        while len(self._local) > self.max_entries:
+            old_key = next(iter(self._local))
+            self._local_drop(old_key)
+            CACHE_EVICTIONS.labels(_name(old_key)).inc()
+
+    def _local_drop(self, key: str):
+        entry = self._local.pop(key, None)
+        if entry is None:
+            return
+        for t in entry.tags:
+            keys = self._by_tag.get(t)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[t]
+
+    def _local_invalidate(self, tags: Iterable[str]):
+        self._generation += 1
+        for t in tags:
+            for key in list(self._by_tag.get(t, ())):
+                self._local_drop(key)
+
+    def clear_local(self):
+        self._generation += 1
+        self._local.clear()
+        self._by_tag.clear()
+
+    # ---- redis tier ----
+    async def _redis_fetch(self, r, key: str, decode: Optional[Callable[[Any], Any]]) -> tuple[Optional[str], Any]:
+        raw = await r.get(_PREFIX + key)
+        if raw is None:
+            return None, None
+        env = orjson.loads(raw)
+        now = time.time()
+        if env['e'] <= now:
+            return None, None
+        value = decode(env['v']) if decode is not None else env['v']
+        self._local_put(key, value, env['f'] - now, env['e'] - now, env.get('t') or ())
+        return ('fresh' if env['f'] > now else 'stale'), value
+
+    # ---- public API ----
+    async def get(self, key: str, decode: Optional[Callable[[Any], Any]] = None) -> tuple[Optional[str], Any]:
+        """Return ``(state, value)``; state is 'fresh', 'stale' or None on a miss."""
+        name = _name(key)
+        entry = self._local_get(key)
+        if entry is not None:
+            state = 'fresh' if entry.fresh_until > time.monotonic() else 'stale'
+            CACHE_REQUESTS.labels(name, 'local', 'hit' if state == 'fresh' else 'stale').inc()
+            return state, entry.value
+        CACHE_REQUESTS.labels(name, 'local', 'miss').inc()
+        r = await get_redis()
+        if r is None:
+            return None, None
+        try:
+            state, value = await self._redis_fetch(r, key, decode)
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+            return None, None
+        CACHE_REQUESTS.labels(name, 'redis', {'fresh': 'hit', 'stale': 'stale', None: 'miss'}[state]).inc()
+        return state, value
+
+    async def set(self, key: str, value: Any, ttl: float, tags: Iterable[str] = (), stale_ttl: float = 0):
+        """Store ``value`` fresh for ``ttl`` seconds, then servable as stale for ``stale_ttl`` more."""
+        tags = tuple(tags)
+        self._local_put(key, value, ttl, ttl + stale_ttl, tags)
+        r = await get_redis()
+        if r is None:
+            return
+        try:
+            now = time.time()
+            keep_ms = max(1, int((ttl + stale_ttl) * 1000))
+            env = {'v': value, 'f': now + ttl, 'e': now + ttl + stale_ttl, 't': tags}
+            pipe = r.pipeline(transaction=True)
+            pipe.set(_PREFIX + key, orjson.dumps(env, default=_default), px=keep_ms)
+            for t in tags:
+                pipe.sadd(f"{_PREFIX}tag:{t}", key)
+                pipe.pexpire(f"{_PREFIX}tag:{t}", keep_ms + 60_000)
+            await pipe.execute()
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: float,
+                          tags: Union[Iterable[str], Callable[[Any], Iterable[str]]] = (),
+                          decode: Optional[Callable[[Any], Any]] = None,
+                          stale_ttl: float = 0,
+                          refresh: Optional[Callable[[], Awaitable[Any]]] = None) -> tuple[Any, str]:
+        """Return ``(value, 'HIT'|'STALE'|'MISS')``.
+
+        Misses are coalesced: one load per key per process, and across workers
+        the holder of a short Redis lock loads while the others wait for its
+        result. The first caller's ``loader`` runs shielded and its result is
+        shared with every concurrent caller of the key, so it keeps running if
+        that request is cancelled: like ``refresh`` it must open its own DB
+        session rather than reuse the caller's. ``tags`` may be a callable taking the loaded value, for tags
+        that depend on the result (e.g. the ids it contains).
+
+        With ``stale_ttl`` and a ``refresh`` callable, an expired-but-recent
+        entry is returned immediately as STALE and ``refresh`` recomputes it in
+        the background. ``refresh`` outlives the request, so it must open its
+        own DB session too.
+        """
+        state, value = await self.get(key, decode)
+        if state == 'fresh':
+            return value, 'HIT'
+        if state == 'stale' and refresh is not None:
+            self._flight(key, refresh, ttl, tags, decode, stale_ttl)
+            return value, 'STALE'
+        return await asyncio.shield(self._flight(key, loader, ttl, tags, decode, stale_ttl)), 'MISS'
+
+    # ---- single-flight ----
+    def _flight(self, key: str, loader, ttl, tags, decode, stale_ttl) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            CACHE_SINGLEFLIGHT.labels(_name(key), 'follower').inc()
+            return task
+        CACHE_SINGLEFLIGHT.labels(_name(key), 'leader').inc()
+        task = asyncio.ensure_future(self._load(key, loader, ttl, tags, decode, stale_ttl))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t, k=key: self._flight_done(k, t))
+        return task
+
+    def _flight_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here so background refresh failures are logged, not lost.
+            LOG.warning("cache load failed for %s: %s", key, task.exception())
+
+    async def _load(self, key: str, loader, ttl, tags, decode, stale_ttl) -> Any:
+        generation = self._generation
+        r = await get_redis()
+        token: Optional[str] = None
+        if r is not None:
+            token = uuid.uuid4().hex
+            try:
+                if not await r.set(f"{_PREFIX}{key}:lock", token, nx=True, px=_LOCK_MS):
+                    token = None
+                    state, value = await self._await_remote(r, key, decode)
+                    if state == 'fresh':
+                        return value
+            except (RedisError, OSError) as e:
+                mark_redis_down(e)
+                token = None
+        try:
+            value = await loader()
+            if self._generation == generation:
+                await self.set(key, value, ttl, tags(value) if callable(tags) else tags, stale_ttl=stale_ttl)
+            return value
+        finally:
+            if token is not None:
+                await release_lock(f"{_PREFIX}{key}:lock", token)
+
+    async def _await_remote(self, r, key: str, decode) -> tuple[Optional[str], Any]:
+        """Another worker holds the load lock: poll for its result, give up if it dies or stalls."""
+        CACHE_SINGLEFLIGHT.labels(_name(key), 'remote_wait').inc()
+        deadline = time.monotonic() + _REMOTE_WAIT_SEC
+        delay = 0.02
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+            state, value = await self._redis_fetch(r, key, decode)
+            if state == 'fresh':
+                return state, value
+            if not await r.exists(f"{_PREFIX}{key}:lock"):
+                break
+        CACHE_SINGLEFLIGHT.labels(_name(key), 'remote_giveup').inc()
+        return None, None
+
+    async def invalidate(self, *tags: str):
+        """Drop every entry carrying any of ``tags`` in this worker, Redis and (via pub/sub) all workers."""
+        if not tags:
+            return
+        CACHE_INVALIDATIONS.labels('local').inc()
+        self._local_invalidate(tags)
+        r = await get_redis()
+        if r is None:
+            return
+        try:
+            pipe = r.pipeline(transaction=False)
+            for t in tags:
+                pipe.smembers(f"{_PREFIX}tag:{t}")
+            members = await pipe.execute()
+            doomed = {f"{_PREFIX}tag:{t}" for t in tags}
+            for keys in members:
+                for k in keys:
+                    doomed.add(_PREFIX + k)
+            pipe = r.pipeline(transaction=False)
+            pipe.delete(*doomed)
+            pipe.publish(CACHE_CHANNEL, json.dumps(list(tags)))
+            await pipe.execute()
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+
+    # ---- pub/sub listener ----
+    def start_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen_forever(), name="cache-invalidation-listener")
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+    async def _listen_forever(self):
+        while True:
+            r = await get_redis()
+            if r is None:
+                await asyncio.sleep(30)
+                continue
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe(CACHE_CHANNEL)
+                # Invalidations missed while disconnected cannot be replayed; start clean.
+                self.clear_local()
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    try:
+                        tags = json.loads(msg["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    CACHE_INVALIDATIONS.labels('pubsub').inc()
+                    self._local_invalidate(tags)
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as e:
+                LOG.warning("cache invalidation listener disconnected: %s", e)
+                self.clear_local()
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+cache = TieredCache(max_entries=settings.cache_local_max)
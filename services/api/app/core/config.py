@@ -34,5 +34,56 @@ class Settings(BaseModel):
     rbac_enforce: bool = os.getenv("RBAC_ENFORCE", "false").lower() == "true"
     storage_driver: str = os.getenv("STORAGE_DRIVER", "local")
     local_storage_path: str = os.getenv("LOCAL_STORAGE_PATH", "var/storage")
+    # Connection pool sizing (per worker process)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # Flag statement shapes repeated >= threshold times within one request (N+1 hunting)
+    sql_nplus1_debug: bool = os.getenv("SQL_NPLUS1_DEBUG", "").lower() in ("1", "true", "yes", "on")
+    sql_nplus1_threshold: int = int(os.getenv("SQL_NPLUS1_THRESHOLD", "5"))
+    # Optional streaming replica for read-heavy endpoints (empty = primary only)
+    read_replica_dsn: str = os.getenv("READ_REPLICA_DSN", "")
+    replica_max_lag_sec: float = float(os.getenv("REPLICA_MAX_LAG_SEC", "5"))
+    replica_sticky_sec: int = int(os.getenv("REPLICA_STICKY_SEC", "10"))
+    # Shared Redis (optional in dev/test; features fall back to per-process state when unreachable)
+    redis_url: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
+    # Safety re-check interval for the RBAC cache when pub/sub invalidation is unavailable
+    rbac_cache_ttl: int = int(os.getenv("RBAC_CACHE_TTL", "60"))
+    # Async audit pipeline (core/audit.py)
+    audit_queue_max: int = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))
+    audit_batch_size: int = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+    audit_flush_interval: float = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+    # Durable mode: records are written to a Redis list first so a restart loses nothing
+    audit_durable: bool = os.getenv("AUDIT_DURABLE", "").lower() in ("1", "true", "yes", "on")
+    # Retention (docs/functional-spec.md: logs 365d). Expired monthly partitions are detached
+    # into the audit_archive schema; archived partitions are dropped after the extra window (0 = keep).
+    audit_retention_days: int = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+    audit_archive_drop_days: int = int(os.getenv("AUDIT_ARCHIVE_DROP_DAYS", "0"))
+    # class_daily_stats: days of attendance counters the nightly reconcile recomputes (late edits, moved students)
+    class_stats_reconcile_days: int = int(os.getenv("CLASS_STATS_RECONCILE_DAYS", "14"))
+    # attendance_month bitmaps: days back the nightly rebuild recomputes (whole months are rebuilt)
+    attendance_month_reconcile_days: int = int(os.getenv("ATTENDANCE_MONTH_RECONCILE_DAYS", "45"))
+    # Attendance tables are partitioned per academic year starting this month; closed years beyond
+    # ATTENDANCE_KEEP_CLOSED_YEARS are detached into the attendance_archive schema (0 = keep all attached).
+    academic_year_start_month: int = int(os.getenv("ACADEMIC_YEAR_START_MONTH", "4"))
+    attendance_keep_closed_years: int = int(os.getenv("ATTENDANCE_KEEP_CLOSED_YEARS", "0"))
+    # Teacher delta sync: days of marks a client caches (reset window); older change-log rows are pruned
+    attendance_sync_days: int = int(os.getenv("ATTENDANCE_SYNC_DAYS", "7"))
+    # Attendance completion board: NOTIFY bursts are coalesced for this long before one recompute;
+    # the board is also refreshed at least this often (safety net for missed notifications / day rollover)
+    attendance_board_debounce_sec: float = float(os.getenv("ATTENDANCE_BOARD_DEBOUNCE_SEC", "0.5"))
+    attendance_board_refresh_sec: int = int(os.getenv("ATTENDANCE_BOARD_REFRESH_SEC", "60"))
+    # CSV/XLSX imports: rows parsed + COPYed per chunk, and how many row errors a response lists
+    import_chunk_rows: int = int(os.getenv("IMPORT_CHUNK_ROWS", "5000"))
+    import_max_errors: int = int(os.getenv("IMPORT_MAX_ERRORS", "500"))
+    # Idempotency-Key replay window, in-flight lock lifetime and how long retries wait for the original
+    idempotency_ttl_sec: int = int(os.getenv("IDEMPOTENCY_TTL_SEC", "86400"))
+    idempotency_lock_sec: int = int(os.getenv("IDEMPOTENCY_LOCK_SEC", "60"))
+    idempotency_wait_sec: float = float(os.getenv("IDEMPOTENCY_WAIT_SEC", "10"))
+    # Rate limit overrides "policy=limit/window_sec,..." (defaults live next to each RateLimiter)
+    rate_limits: str = os.getenv("RATE_LIMITS", "")
+    # Entries kept in each worker's in-process LRU in front of the Redis cache tier
+    cache_local_max: int = int(os.getenv("CACHE_LOCAL_MAX", "1000"))
 
 settings = Settings()
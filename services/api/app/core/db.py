@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 from .config import settings
+from .db_metrics import InstrumentedAsyncQueuePool, instrument_engine
+from .sql_metrics import instrument_sql
 
 # Convert sync DSN to asyncpg variant if needed
 def _to_async_dsn(dsn: str) -> str:
@@ -14,13 +16,44 @@ def _current_async_dsn() -> str:
     return _to_async_dsn(settings.postgres_dsn)
 
 # Engine created once; for test reconfiguration, user must ensure env vars set before first import
-engine = create_async_engine(_current_async_dsn(), echo=False, pool_pre_ping=True)
+engine = create_async_engine(
+    _current_async_dsn(),
+    echo=False,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True,
+)
+instrument_engine(engine, "primary")
+instrument_sql(engine.sync_engine)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+# Optional read replica; see core/replica.py for routing (lag check, stickiness).
+read_engine = None
+ReadSessionLocal = None
+if settings.read_replica_dsn:
+    read_engine = create_async_engine(
+        _to_async_dsn(settings.read_replica_dsn),
+        echo=False,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+    )
+    instrument_engine(read_engine, "replica")
+    instrument_sql(read_engine.sync_engine)
+    ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession, info={"replica": True})
 async_session = SessionLocal  # backward compatible alias
 
 class Base(DeclarativeBase):
     pass
 
+# One session (and so at most one pooled connection) per request: every router and
+# ``require()`` depend on this same callable, which FastAPI caches per request.
 async def get_session() -> AsyncSession:
     async with SessionLocal() as session:
         yield session
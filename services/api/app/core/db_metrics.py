@@ -0,0 +1,72 @@
+"""Prometheus instrumentation for SQLAlchemy connection pools.
+
+Gauges are callback-based (evaluated at scrape time) so the request path pays
+nothing for them; only checkout wait is observed per checkout.
+"""
+from __future__ import annotations
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+POOL_SIZE = Gauge('db_pool_size', 'Configured pool size', ['pool'])
+POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Connections currently checked out', ['pool'])
+POOL_OVERFLOW = Gauge('db_pool_overflow_in_use', 'Overflow connections currently open beyond pool_size', ['pool'])
+POOL_IDLE = Gauge('db_pool_idle', 'Idle connections held in the pool', ['pool'])
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', ['pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+POOL_CHECKOUT_TIMEOUTS = Counter('db_pool_checkout_timeouts_total', 'Checkouts that hit pool_timeout', ['pool'])
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited."""
+
+    metrics_label = 'primary'
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.labels(self.metrics_label).inc()
+            raise
+        finally:
+            POOL_CHECKOUT_WAIT.labels(self.metrics_label).observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_label = self.metrics_label
+        return pool
+
+
+def instrument_engine(engine: AsyncEngine, label: str) -> None:
+    """Attach scrape-time gauges for ``engine``'s pool under ``pool=label``."""
+    def _pool():
+        return engine.sync_engine.pool
+
+    pool = _pool()
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        pool.metrics_label = label
+    if not hasattr(pool, 'checkedout'):
+        return  # NullPool/StaticPool (tests, scripts)
+    POOL_SIZE.labels(label).set_function(lambda: _pool().size())
+    POOL_CHECKED_OUT.labels(label).set_function(lambda: _pool().checkedout())
+    POOL_OVERFLOW.labels(label).set_function(lambda: max(0, _pool().overflow()))
+    POOL_IDLE.labels(label).set_function(lambda: _pool().checkedin())
+
+
+def pool_status(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return {'class': type(pool).__name__}
+    return {
+        'class': type(pool).__name__,
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'idle': pool.checkedin(),
+        'overflow_in_use': max(0, pool.overflow()),
+    }
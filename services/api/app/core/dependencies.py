@@ -1,6 +1,4 @@
-from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.db import async_session
+from app.core.db import get_session
 
 # Minimal user model placeholder to satisfy attribute access in routers during seeding or tests
 class SimpleUser:
@@ -8,9 +6,9 @@ class SimpleUser:
         self.id = id
         self.role = role
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session() as session:
-        yield session
+# Alias rather than a wrapper so FastAPI's per-request dependency cache hands
+# routers using get_db the same session require() already opened.
+get_db = get_session
 
 # In real app, this would decode JWT; placeholder returns staff user id=1
 async def get_current_user() -> SimpleUser:  # type: ignore
@@ -0,0 +1,320 @@
+"""Idempotency-Key support for mutating endpoints.
+
+Routes opt in with ``idem: Idempotency = Depends(idempotent('scope'))`` and wrap
+their work in ``begin``/``complete``::
+
+    cached = await idem.begin(payload)      # replay, or take the in-flight lock
+    if cached is not None:
+        return cached
+    ...do the work...
+    return await idem.complete(result)      # store for IDEMPOTENCY_TTL_SEC
+
+Semantics (per ``scope`` + key, and per calling user for ``idempotent(scope, per_user=True)``
+so two users sending the same key never see each other's responses):
+  * a completed key replays the stored JSON response; the same key with a
+    different request hash is rejected with 422;
+  * while the first request is running, retries wait (up to
+    IDEMPOTENCY_WAIT_SEC) for its result instead of executing again, then 409;
+  * failures are not stored: the lock is released and a retry runs normally.
+
+Storage: Redis (result key + SET NX lock) when reachable; otherwise the
+``idempotency_keys`` table, where a row with a NULL response acts as the lock;
+if neither is available a bounded per-process LRU keeps tests and dev working.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+from fastapi import Depends, Header, HTTPException
+from prometheus_client import Counter, Histogram
+from redis.exceptions import RedisError
+from sqlalchemy import text
+
+from .config import settings
+from .redis import RELEASE_LOCK_LUA, get_redis, mark_redis_down
+
+LOG = logging.getLogger("idempotency")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+_LOCAL_MAX = 10_000
+_DB_RETRY_AFTER_SEC = 30.0
+
+IDEMPOTENCY_REQUESTS = Counter('idempotency_requests_total', 'Idempotent requests by outcome', ['scope', 'outcome', 'backend'])
+IDEMPOTENCY_WAIT = Histogram('idempotency_wait_seconds', 'Time a retry waited for the in-flight original',
+                             buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30))
+
+def request_hash(payload: Any) -> str:
+    """Stable hash of a JSON-able request payload (key order independent)."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class _Pending(Exception):
+    """Another request holds the key; carries the hash it was started with (if known)."""
+
+    def __init__(self, req_hash: Optional[str] = None):
+        self.req_hash = req_hash
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self.use_db = True
+        self._db_down_until = 0.0
+        self._local: OrderedDict[str, tuple[float, str, Any]] = OrderedDict()
+        self._local_locks: dict[str, str] = {}
+
+    # ---- public ----
+    async def acquire(self, key: str, req_hash: str, token: str) -> tuple[str, Optional[Any]]:
+        """Return ``(backend, stored_response)``; ``stored_response`` is None when we now own the key.
+
+        Raises ``_Pending`` when another request is in flight and 422 on hash mismatch.
+        """
+        r = await get_redis()
+        if r is not None:
+            try:
+                return 'redis', await self._redis_acquire(r, key, req_hash, token)
+            except (RedisError, OSError) as e:
+                mark_redis_down(e)
+        if self._db_usable():
+            try:
+                return 'db', await self._db_acquire(key, req_hash)
+            except (_Pending, HTTPException):
+                raise
+            except Exception as e:
+                self._db_failed(e)
+        return 'local', self._local_acquire(key, req_hash, token)
+
+    async def store(self, backend: str, key: str, req_hash: str, token: str, response: Any) -> None:
+        try:
+            if backend == 'redis':
+                r = await get_redis()
+                if r is not None:
+                    pipe = r.pipeline(transaction=True)
+                    pipe.set(_result_key(key), json.dumps({'h': req_hash, 'r': response}, default=str),
+                             ex=settings.idempotency_ttl_sec)
+                    pipe.eval(RELEASE_LOCK_LUA, 1, _lock_key(key), token)
+                    await pipe.execute()
+                    return
+            elif backend == 'db':
+                from .db import engine
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        text("update idempotency_keys set response_json = cast(:resp as jsonb) where key = :k"),
+                        {'k': key, 'resp': json.dumps(response, default=str)},
+                    )
+                return
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+        except Exception as e:
+            self._db_failed(e)
+        self._local_store(key, req_hash, token, response)
+
+    async def release(self, backend: str, key: str, token: str) -> None:
+        """Drop an unfinished claim so a retry can execute."""
+        try:
+            if backend == 'redis':
+                r = await get_redis()
+                if r is not None:
+                    await r.eval(RELEASE_LOCK_LUA, 1, _lock_key(key), token)
+            elif backend == 'db':
+                from .db import engine
+                async with engine.begin() as conn:
+                    await conn.execute(text("delete from idempotency_keys where key = :k and response_json is null"), {'k': key})
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+        except Exception as e:
+            LOG.warning("idempotency release failed for %s: %s", key, e)
+        if self._local_locks.get(key) == token:
+            del self._local_locks[key]
+
+    # ---- redis ----
+    async def _redis_acquire(self, r, key: str, req_hash: str, token: str) -> Optional[Any]:
+        raw = await r.get(_result_key(key))
+        if raw is not None:
+            return _check(json.loads(raw), req_hash)
+        if await r.set(_lock_key(key), token, nx=True, ex=settings.idempotency_lock_sec):
+            # Finished between our GET and SET?
+            raw = await r.get(_result_key(key))
+            if raw is not None:
+                await r.eval(RELEASE_LOCK_LUA, 1, _lock_key(key), token)
+                return _check(json.loads(raw), req_hash)
+            return None
+        holder = await r.get(_lock_key(key))
+        raise _Pending(holder.split('|', 1)[1] if holder and '|' in holder else None)
+
+    # ---- postgres ----
+    def _db_usable(self) -> bool:
+        return self.use_db and time.monotonic() >= self._db_down_until
+
+    def _db_failed(self, exc: Exception) -> None:
+        LOG.warning("idempotency_keys unavailable (%s); using in-process store for %ss", exc, int(_DB_RETRY_AFTER_SEC))
+        self._db_down_until = time.monotonic() + _DB_RETRY_AFTER_SEC
+
+    async def _db_acquire(self, key: str, req_hash: str) -> Optional[Any]:
+        from .db import engine
+        async with engine.begin() as conn:
+            # Expired rows (completed past TTL, or claims abandoned past the lock window) are reclaimed.
+            await conn.execute(text(
+                "delete from idempotency_keys where key = :k and ("
+                " created_at < now() - make_interval(secs => :ttl)"
+                " or (response_json is null and created_at < now() - make_interval(secs => :lock)))"
+            ), {'k': key, 'ttl': settings.idempotency_ttl_sec, 'lock': settings.idempotency_lock_sec})
+            claimed = (await conn.execute(text(
+                "insert into idempotency_keys (key, route, method, request_hash) values (:k, :r, :m, :h) "
+                "on conflict (key) do nothing returning id"
+            ), {'k': key, 'r': key.split(':', 1)[0], 'm': 'POST', 'h': req_hash})).first()
+            if claimed is not None:
+                return None
+            row = (await conn.execute(
+                text("select request_hash, response_json from idempotency_keys where key = :k"), {'k': key}
+            )).first()
+        if row is None:  # vanished between statements; treat as in flight and poll again
+            raise _Pending(None)
+        if row[1] is None:
+            raise _Pending(row[0])
+        return _check({'h': row[0], 'r': row[1]}, req_hash)
+
+    # ---- in-process ----
+    def _local_acquire(self, key: str, req_hash: str, token: str) -> Optional[Any]:
+        hit = self._local.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            self._local.move_to_end(key)
+            return _check({'h': hit[1], 'r': hit[2]}, req_hash)
+        holder = self._local_locks.get(key)
+        if holder is not None and holder != token:
+            raise _Pending(None)
+        self._local_locks[key] = token
+        return None
+
+    def _local_store(self, key: str, req_hash: str, token: str, response: Any) -> None:
+        self._local[key] = (time.monotonic() + settings.idempotency_ttl_sec, req_hash, response)
+        self._local.move_to_end(key)
+        while len(self._local) > _LOCAL_MAX:
+            self._local.popitem(last=False)
+        if self._local_locks.get(key) == token:
+            del self._local_locks[key]
+
+
+def _result_key(key: str) -> str:
+    return f"idem:{key}"
+
+
+def _lock_key(key: str) -> str:
+    return f"idem:{key}:lock"
+
+
+def _check(stored: dict, req_hash: str) -> Any:
+    if stored.get('h') and stored['h'] != req_hash:
+        raise HTTPException(422, f'{IDEMPOTENCY_HEADER} was already used with a different request body')
+    return stored.get('r')
+
+
+store = IdempotencyStore()
+
+
+class Idempotency:
+    """Per-request handle; inactive (pass-through) when no key was supplied."""
+
+    def __init__(self, scope: str, key: Optional[str], owner: Optional[str] = None):
+        self.scope = scope
+        self.key = key
+        self.owner = owner
+        self.replayed = False
+        self._token = ''
+        self._hash: Optional[str] = None
+        self._backend: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.key)
+
+    @property
+    def _scoped(self) -> str:
+        if self.owner is not None:
+            return f"{self.scope}:{self.owner}:{self.key}"
+        return f"{self.scope}:{self.key}"
+
+    async def begin(self, payload: Any) -> Optional[Any]:
+        """Return the stored response for a repeated request, else claim the key and return None."""
+        if not self.active:
+            return None
+        self._hash = request_hash(payload)
+        # The lock value carries the hash so waiters can reject a mismatched body early.
+        self._token = f"{uuid.uuid4().hex}|{self._hash}"
+        deadline = time.monotonic() + settings.idempotency_wait_sec
+        started = None
+        delay = 0.05
+        while True:
+            try:
+                backend, stored = await store.acquire(self._scoped, self._hash, self._token)
+            except _Pending as p:
+                if p.req_hash and p.req_hash != self._hash:
+                    IDEMPOTENCY_REQUESTS.labels(self.scope, 'mismatch', 'any').inc()
+                    raise HTTPException(422, f'{IDEMPOTENCY_HEADER} was already used with a different request body') from None
+                started = started or time.monotonic()
+                if time.monotonic() >= deadline:
+                    IDEMPOTENCY_REQUESTS.labels(self.scope, 'in_progress', 'any').inc()
+                    raise HTTPException(409, f'A request with this {IDEMPOTENCY_HEADER} is still in progress') from None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.5)
+                continue
+            except HTTPException:
+                IDEMPOTENCY_REQUESTS.labels(self.scope, 'mismatch', 'any').inc()
+                raise
+            if started is not None:
+                IDEMPOTENCY_WAIT.observe(time.monotonic() - started)
+            if stored is not None:
+                self.replayed = True
+                IDEMPOTENCY_REQUESTS.labels(self.scope, 'replayed', backend).inc()
+                return stored
+            self._backend = backend
+            IDEMPOTENCY_REQUESTS.labels(self.scope, 'new', backend).inc()
+            return None
+
+    async def complete(self, response: Any) -> Any:
+        """Persist the (JSON-able) response for replays and release the claim."""
+        if self._backend is not None:
+            await store.store(self._backend, self._scoped, self._hash or '', self._token, response)
+            self._backend = None
+        return response
+
+    async def release(self) -> None:
+        if self._backend is not None:
+            await store.release(self._backend, self._scoped, self._token)
+            self._backend = None
+
+
+def idempotent(scope: str, per_user: bool = False):
+    """Dependency factory: ``Depends(idempotent('attendance.bulk', per_user=True))`` -> ``Idempotency``.
+
+    The key comes from the ``Idempotency-Key`` header; handlers with a natural
+    key (e.g. provider event ids) may set ``idem.key`` before ``begin``.
+    ``per_user`` namespaces stored keys by the authenticated user id; use it on
+    every user-facing route (webhooks key on the provider's id instead).
+    """
+    if per_user:
+        from .security import CurrentUser, get_current_user
+
+        async def user_dependency(idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+                                  user: CurrentUser = Depends(get_current_user)):
+            idem = Idempotency(scope, idempotency_key, owner=str(user.user_id))
+            try:
+                yield idem
+            finally:
+                await idem.release()
+        return user_dependency
+
+    async def dependency(idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)):
+        idem = Idempotency(scope, idempotency_key)
+        try:
+            yield idem
+        finally:
+            # No-op once complete() ran; frees the key when the handler raised.
+            await idem.release()
+    return dependency
@@ -0,0 +1,297 @@
+"""Streaming CSV/XLSX import: parse in chunks, COPY into staging, validate and merge in SQL.
+
+Routes describe an import with an ``ImportSpec`` and call ``run_import``::
+
+    result = await run_import(session, STAFF_IMPORT, file, dry_run=dry_run)
+    return result.as_dict()
+
+Pipeline (one transaction; Python memory is bounded by IMPORT_CHUNK_ROWS):
+
+1. The upload (already spooled to disk by Starlette) is parsed in a worker
+   thread, a chunk of rows at a time. Cells are trimmed, blanks become NULL,
+   and ``ints`` / ``dates`` / ``max_len`` are checked per cell.
+2. Each chunk is COPYed into ``TEMP import_<name>`` (ON COMMIT DROP) with one
+   text column per spec column plus ``row_no`` and ``error``.
+3. ``checks`` run in order as one UPDATE each, setting ``error`` on rows that
+   fail (missing values, duplicates within the file, conflicts with existing
+   data). A row keeps the first error it hits.
+4. ``merge`` is one statement over ``error IS NULL`` rows returning a single
+   row with ``created`` and ``updated`` (extra columns end up in ``extra``).
+5. ``dry_run`` rolls back after the merge, so the counts are exact but nothing
+   is written; otherwise the transaction commits.
+
+Row numbers are spreadsheet rows (the header is row 1). Bad headers and
+undecodable files are rejected with 400 before anything is staged.
+"""
+from __future__ import annotations
+import contextlib
+import csv
+import io
+import hashlib
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Iterator, Mapping, Optional, Sequence
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from .bulk import _ident
+from .config import settings
+
+try:
+    import openpyxl  # type: ignore
+except Exception:  # pragma: no cover
+    openpyxl = None  # type: ignore
+
+
+@dataclass(frozen=True)
+class Check:
+    """``predicate`` (SQL over staging alias ``s``) is true for bad rows; ``message`` is a SQL text expression.
+
+    ``{stage}`` in either is replaced with the staging table name.
+    """
+    predicate: str
+    message: str
+
+
+@dataclass(frozen=True)
+class ImportSpec:
+    name: str
+    columns: Sequence[str]
+    required: Sequence[str] = ()
+    ints: Sequence[str] = ()
+    dates: Sequence[str] = ()
+    max_len: Mapping[str, int] = field(default_factory=dict)
+    checks: Sequence[Check] = ()
+    merge: str = ''
+
+    @property
+    def stage(self) -> str:
+        return _ident(f"import_{self.name}")
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    error_count: int = 0
+    errors: list[str] = field(default_factory=list)
+    dry_run: bool = False
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "status": "ok",
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+def unique_check(spec_columns: Sequence[str], label: str) -> Check:
+    """Flag rows repeating an earlier row's ``spec_columns`` (NULL keys never collide)."""
+    cols = [_ident(c) for c in spec_columns]
+    same = " AND ".join(f"p.{c} = s.{c}" for c in cols)
+    return Check(
+        predicate=f"EXISTS (SELECT 1 FROM {{stage}} p WHERE {same} AND p.row_no < s.row_no)",
+        message=(f"'duplicate {label} (first on row ' || "
+                 f"(SELECT min(p.row_no) FROM {{stage}} p WHERE {same})::text || ')'"),
+    )
+
+
+# ---- parsing (runs in a worker thread) ----
+
+def _csv_rows(fh) -> Iterator[list]:
+    wrapper = io.TextIOWrapper(fh, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(wrapper)
+    finally:
+        with contextlib.suppress(ValueError):  # file already closed
+            wrapper.detach()  # leave the upload's file open for Starlette to close
+
+
+def _xlsx_cell(v: Any) -> str:
+    if v is None:
+        return ''
+    if isinstance(v, datetime):
+        return v.date().isoformat()
+    if isinstance(v, date):
+        return v.isoformat()
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _xlsx_rows(fh) -> Iterator[list]:
+    wb = openpyxl.load_workbook(fh, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield [_xlsx_cell(v) for v in row]
+    finally:
+        wb.close()
+
+
+def _is_xlsx(upload: UploadFile) -> bool:
+    name = (upload.filename or '').lower()
+    return name.endswith('.xlsx') or (upload.content_type or '').endswith('spreadsheetml.sheet')
+
+
+def _header(spec: ImportSpec, raw: list) -> list[Optional[int]]:
+    """Map spec columns to positions in the file; 400 on unknown or missing required columns."""
+    names = [(c or '').strip().lower() for c in raw]
+    unknown = [n for n in names if n and n not in spec.columns]
+    missing = [c for c in spec.required if c not in names]
+    if unknown or missing:
+        raise HTTPException(400, f'Invalid header (unknown: {unknown}, missing: {missing}). Expected columns {list(spec.columns)}')
+    return [names.index(c) if c in names else None for c in spec.columns]
+
+
+def _record(spec: ImportSpec, positions: list[Optional[int]], row_no: int, raw: list) -> Optional[tuple]:
+    """Staging tuple ``(row_no, *values, error)``; None for blank lines. Invalid cells are staged as NULL."""
+    if not any((c or '').strip() for c in raw):
+        return None
+    values: list[Optional[str]] = []
+    error = None
+    for col, pos in zip(spec.columns, positions, strict=True):
+        v = (raw[pos] or '').strip() if pos is not None and pos < len(raw) else ''
+        v = v or None
+        if v is not None and error is None:
+            limit = spec.max_len.get(col)
+            if col in spec.ints:
+                try:
+                    v = str(int(v))
+                except ValueError:
+                    error, v = f'{col} must be a whole number', None
+            elif col in spec.dates:
+                try:
+                    v = date.fromisoformat(v).isoformat()
+                except ValueError:
+                    error, v = f'{col} must be a date (YYYY-MM-DD)', None
+            elif limit and len(v) > limit:
+                error, v = f'{col} longer than {limit} characters', None
+        values.append(v)
+    return (row_no, *values, error)
+
+
+class _Reader:
+    """Pull-based parser: ``take(n)`` returns the next n staged tuples (fewer at EOF)."""
+
+    def __init__(self, spec: ImportSpec, upload: UploadFile):
+        self.spec = spec
+        if _is_xlsx(upload):
+            if openpyxl is None:
+                raise HTTPException(415, 'XLSX import needs openpyxl installed; upload CSV instead')
+            self._rows = _xlsx_rows(upload.file)
+        else:
+            self._rows = _csv_rows(upload.file)
+        self._numbered = enumerate(self._rows, start=1)
+        self.positions: Optional[list[Optional[int]]] = None
+
+    def take(self, n: int) -> list[tuple]:
+        try:
+            if self.positions is None:
+                first = next(self._numbered, None)
+                if first is None:
+                    raise HTTPException(400, 'Empty file')
+                self.positions = _header(self.spec, first[1])
+            out: list[tuple] = []
+            for row_no, raw in self._numbered:
+                rec = _record(self.spec, self.positions, row_no, raw)
+                if rec is not None:
+                    out.append(rec)
+                    if len(out) >= n:
+                        break
+            return out
+        except UnicodeDecodeError:
+            raise HTTPException(400, 'File must be UTF-8 encoded') from None
+        except csv.Error as e:
+            raise HTTPException(400, f'Malformed CSV: {e}') from e
+
+    def close(self) -> None:
+        self._rows.close()
+
+
+def _sha256(fh) -> str:
+    h = hashlib.sha256()
+    for block in iter(lambda: fh.read(1 << 16), b''):
+        h.update(block)
+    fh.seek(0)
+    return h.hexdigest()
+
+
+async def upload_sha256(upload: UploadFile) -> str:
+    """Content hash of an upload (e.g. for ``Idempotency.begin``), read in blocks; rewinds the file."""
+    await upload.seek(0)
+    return await run_in_threadpool(_sha256, upload.file)
+
+
+# ---- staging + merge ----
+
+def _staged(sql: str, stage: str) -> str:
+    return sql.replace('{stage}', stage)
+
+
+async def _copy(session: AsyncSession, table: str, columns: list[str], records: list[tuple]) -> None:
+    """COPY ``records`` into ``table`` on the session's connection (unnest INSERT off asyncpg)."""
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    driver = getattr(raw, 'driver_connection', None)
+    if hasattr(driver, 'copy_records_to_table'):
+        await driver.copy_records_to_table(table, records=records, columns=columns)
+        return
+    params = {f"a_{i}": [r[i] for r in records] for i in range(len(columns))}
+    arrays = ", ".join(f"CAST(:a_{i} AS {'int' if c == 'row_no' else 'text'}[])" for i, c in enumerate(columns))
+    await session.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) SELECT * FROM unnest({arrays})"), params)
+
+
+async def run_import(session: AsyncSession, spec: ImportSpec, upload: UploadFile, dry_run: bool = False,
+                     chunk_rows: Optional[int] = None) -> ImportResult:
+    """Stage, validate and merge ``upload`` per ``spec``; commits unless ``dry_run``."""
+    columns = ['row_no', *(_ident(c) for c in spec.columns), 'error']
+    stage = spec.stage
+    chunk_rows = chunk_rows or settings.import_chunk_rows
+    reader = _Reader(spec, upload)
+    result = ImportResult(dry_run=dry_run)
+    try:
+        await session.execute(text(
+            f"CREATE TEMP TABLE {stage} (row_no int PRIMARY KEY, "
+            + ", ".join(f"{c} text" for c in spec.columns)
+            + ", error text) ON COMMIT DROP"
+        ))
+        while True:
+            records = await run_in_threadpool(reader.take, chunk_rows)
+            if not records:
+                break
+            await _copy(session, stage, columns, records)
+            result.rows += len(records)
+        await session.execute(text(f"ANALYZE {stage}"))
+        for check in spec.checks:
+            await session.execute(text(
+                f"UPDATE {stage} AS s SET error = {_staged(check.message, stage)} "
+                f"WHERE s.error IS NULL AND ({_staged(check.predicate, stage)})"
+            ))
+        merged = (await session.execute(text(_staged(spec.merge, stage)))).mappings().one()
+        result.created = int(merged['created'] or 0)
+        result.updated = int(merged['updated'] or 0)
+        result.extra = {k: v for k, v in merged.items() if k not in ('created', 'updated')}
+        bad = (await session.execute(text(
+            f"SELECT row_no, error, count(*) OVER () AS n FROM {stage} WHERE error IS NOT NULL ORDER BY row_no LIMIT :lim"
+        ), {'lim': settings.import_max_errors})).all()
+        result.error_count = bad[0].n if bad else 0
+        result.errors = [f'row {r.row_no}: {r.error}' for r in bad]
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        reader.close()
+    if dry_run:
+        await session.rollback()
+    else:
+        await session.commit()
+    return result
@@ -1,7 +1,8 @@
-import logging, sys, time, uuid, os, json
-from fastapi import Request
+import logging, sys, os, json
 
 LOG_FORMAT = os.getenv('LOG_FORMAT', 'plain')  # 'plain' | 'json'
+# Fields passed via ``extra=`` that the JSON formatter lifts into the record
+STRUCTURED_FIELDS = ('rid', 'method', 'path', 'route', 'status', 'dur_ms')
 
 logger = logging.getLogger("api")
 handler = logging.StreamHandler(sys.stdout)
@@ -15,6 +16,9 @@ if LOG_FORMAT == 'json':
                 'msg': record.getMessage(),
                 'logger': record.name,
             }
+            for key in STRUCTURED_FIELDS:
+                if key in record.__dict__:
+                    base[key] = record.__dict__[key]
             if record.exc_info:
                 base['exc_info'] = self.formatException(record.exc_info)
             return json.dumps(base, ensure_ascii=False)
@@ -25,18 +29,3 @@ else:
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 logger.setLevel(logging.INFO)
-
-async def request_logging_middleware(request: Request, call_next):
-    rid = str(uuid.uuid4())
-    start = time.time()
-    request.state.request_id = rid
-    logger.info(f"rid={rid} path={request.url.path} start")
-    try:
-        response = await call_next(request)
-    except Exception as e:
-        logger.exception(f"rid={rid} error={e}")
-        raise
-    dur = int((time.time() - start) * 1000)
-    logger.info(f"rid={rid} path={request.url.path} status={response.status_code} dur_ms={dur}")
-    response.headers["X-Request-ID"] = rid
-    return response
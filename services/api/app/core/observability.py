@@ -0,0 +1,102 @@
+"""Request observability as a single pure-ASGI middleware.
+
+Replaces the stacked ``@app.middleware('http')`` layers (request logging,
+Prometheus metrics, debug tracebacks). Per request it:
+
+  * assigns one request id (incoming ``X-Request-ID`` or a fresh uuid4) and
+    exposes it as ``request.state.request_id`` and the response header
+  * labels Prometheus metrics with the matched route template
+    (``/api/chat/messages/{message_id}``), never the raw path
+  * starts the SQL collector and adds ``Server-Timing`` entries
+  * sets the read-your-writes cookie after successful writes
+  * emits a single access log line using lazy %-formatting; with
+    ``LOG_FORMAT=json`` the fields are emitted as structured keys
+
+No request/response objects are built and the body stream is passed through
+untouched, so streaming responses are not buffered.
+"""
+from __future__ import annotations
+import logging
+import time
+import uuid
+
+from prometheus_client import Counter, Histogram
+
+from . import sql_metrics
+from .replica import recent_write_cookie
+
+LOG = logging.getLogger("api")
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_HEADER_RAW = b'x-request-id'
+UNMATCHED_ROUTE = '<unmatched>'
+
+REQUEST_COUNT = Counter('api_requests_total', 'Total HTTP requests', ['method', 'path', 'status'])
+REQUEST_LATENCY = Histogram('api_request_duration_seconds', 'Request latency seconds', ['method', 'path'])
+
+
+def route_template(scope) -> str:
+    route = scope.get('route')
+    return getattr(route, 'path', None) or UNMATCHED_ROUTE
+
+
+class ObservabilityMiddleware:
+    def __init__(self, app, debug: bool = False, skip_paths: tuple[str, ...] = ('/metrics',)):
+        self.app = app
+        self.debug = debug
+        self.skip_paths = frozenset(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        rid = None
+        for k, v in scope['headers']:
+            if k == _REQUEST_ID_HEADER_RAW:
+                rid = v.decode('latin-1')
+                break
+        if not rid:
+            rid = str(uuid.uuid4())
+        scope.setdefault('state', {})['request_id'] = rid
+        method = scope['method']
+        status = 500
+        sql_token = sql_metrics.start_request()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                headers = list(message.get('headers', ()))
+                headers.append((b'x-request-id', rid.encode('latin-1')))
+                for entry in sql_metrics.server_timing(sql_metrics.current_stats()):
+                    headers.append((b'server-timing', entry.encode('latin-1')))
+                cookie = recent_write_cookie(method, status)
+                if cookie:
+                    headers.append((b'set-cookie', cookie.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if self.debug:
+                LOG.exception("unhandled exception rid=%s method=%s path=%s", rid, method, scope['path'])
+            else:
+                LOG.error("unhandled exception rid=%s method=%s path=%s", rid, method, scope['path'])
+            status = 500
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            route = route_template(scope)
+            sql_metrics.finish_request(sql_token, route)
+            REQUEST_COUNT.labels(method, route, status).inc()
+            REQUEST_LATENCY.labels(method, route).observe(duration)
+            if LOG.isEnabledFor(logging.INFO):
+                LOG.info(
+                    "rid=%s method=%s path=%s route=%s status=%s dur_ms=%.1f",
+                    rid, method, scope['path'], route, status, duration * 1000,
+                    extra={'rid': rid, 'method': method, 'path': scope['path'], 'route': route,
+                           'status': status, 'dur_ms': round(duration * 1000, 1)},
+                )
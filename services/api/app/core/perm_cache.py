@@ -0,0 +1,324 @@
+"""Distributed RBAC permission cache.
+
+Role -> permission mappings are compiled into integer bitsets (one bit per
+permission code) and shared through Redis:
+
+  rbac:version   monotonically increasing counter, bumped on every change
+  rbac:snapshot  JSON {version, codes, roles{role: hex bitset}} for that version
+  rbac:invalidate pub/sub channel carrying the new version
+
+Each worker keeps the compiled snapshot in memory and serves permission checks
+without touching the database. A background listener marks the local copy stale
+when an invalidation arrives; the next check then compares versions and reloads
+(from the Redis snapshot when present, otherwise from ``core.role_permission``).
+
+Direct edits to core.role_permission / core.user_permission_override (SQL
+consoles, other services) bump ``core.rbac_version`` through a trigger
+(alembic_clean 20251018_0900) that also sends ``NOTIFY rbac_invalidate``. A
+second listener LISTENs for it, and every version check compares the stored
+DB version too, so even a missed notification is picked up within
+RBAC_CACHE_TTL. Without Redis we degrade to that per-process TTL check.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import settings
+from .db import engine
+from .redis import get_redis, mark_redis_down
+from .schema_registry import schema_registry
+
+LOG = logging.getLogger("auth")
+
+RBAC_VERSION_KEY = "rbac:version"
+RBAC_SNAPSHOT_KEY = "rbac:snapshot"
+RBAC_CHANNEL = "rbac:invalidate"
+RBAC_DB_CHANNEL = "rbac_invalidate"
+RBAC_DB_VERSION_TABLE = "core.rbac_version"
+
+# With both live listeners we only re-check the versions occasionally as a safety net.
+_LISTENER_RECHECK_SEC = 300
+_DB_LISTENER_CHECK_SEC = 5
+
+
+@dataclass
+class CompiledPermissions:
+    version: int
+    codes: tuple[str, ...] = ()
+    role_bits: dict[str, int] = field(default_factory=dict)
+    index: dict[str, int] = field(default_factory=dict)
+    db_version: int = 0
+
+    def __post_init__(self):
+        if not self.index:
+            self.index = {c: i for i, c in enumerate(self.codes)}
+
+    def bit(self, code: str) -> int:
+        i = self.index.get(code)
+        return 0 if i is None else 1 << i
+
+    def mask_for_roles(self, roles: Iterable[str]) -> int:
+        mask = 0
+        for r in roles:
+            mask |= self.role_bits.get(r.lower(), 0)
+        return mask
+
+    def decode(self, mask: int) -> set[str]:
+        return {c for i, c in enumerate(self.codes) if mask >> i & 1}
+
+    def role_permissions(self) -> dict[str, set[str]]:
+        return {role: self.decode(bits) for role, bits in self.role_bits.items()}
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "version": self.version,
+            "db_version": self.db_version,
+            "codes": list(self.codes),
+            "roles": {r: format(b, "x") for r, b in self.role_bits.items()},
+        })
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CompiledPermissions":
+        data = json.loads(raw)
+        return cls(
+            version=int(data["version"]),
+            codes=tuple(data["codes"]),
+            role_bits={r: int(h, 16) for r, h in data["roles"].items()},
+            db_version=int(data.get("db_version", 0)),
+        )
+
+    @classmethod
+    def from_rows(cls, version: int, rows: Iterable[tuple[str, str]], db_version: int = 0) -> "CompiledPermissions":
+        pairs = [(role.lower(), perm) for role, perm in rows]
+        codes = tuple(sorted({p for _, p in pairs}))
+        index = {c: i for i, c in enumerate(codes)}
+        role_bits: dict[str, int] = {}
+        for role, perm in pairs:
+            role_bits[role] = role_bits.get(role, 0) | (1 << index[perm])
+        return cls(version=version, codes=codes, role_bits=role_bits, index=index, db_version=db_version)
+
+
+class PermissionCache:
+    def __init__(self):
+        self._compiled: Optional[CompiledPermissions] = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+        self._db_listener: Optional[asyncio.Task] = None
+        self._listening = False
+        self._db_listening = False
+        # Bumped on every local reload; per-user override caches key on it.
+        self.generation = 0
+
+    @property
+    def version(self) -> int:
+        return self._compiled.version if self._compiled else -1
+
+    def _fresh(self) -> bool:
+        if self._compiled is None or self._stale:
+            return False
+        ttl = _LISTENER_RECHECK_SEC if self._listening and self._db_listening else settings.rbac_cache_ttl
+        return time.monotonic() - self._checked_at < ttl
+
+    async def get(self, session: AsyncSession) -> CompiledPermissions:
+        """Return the compiled snapshot, reloading only when the version moved."""
+        if self._fresh():
+            return self._compiled  # type: ignore[return-value]
+        async with self._lock:
+            if not self._fresh():
+                await self._refresh(session)
+        return self._compiled or CompiledPermissions(version=-1)
+
+    async def _refresh(self, session: AsyncSession):
+        # Read the DB version before any rows so a change committing in between forces one more reload.
+        db_version = await self._read_db_version(session)
+        r = await get_redis()
+        version = 0
+        if r is not None:
+            try:
+                version = int(await r.get(RBAC_VERSION_KEY) or 0)
+                if self._matches(self._compiled, version, db_version):
+                    self._mark_checked()
+                    return
+                raw = await r.get(RBAC_SNAPSHOT_KEY)
+                if raw:
+                    snap = CompiledPermissions.from_json(raw)
+                    if self._matches(snap, version, db_version):
+                        self._install(snap)
+                        return
+            except (RedisError, OSError, ValueError) as e:
+                mark_redis_down(e)
+                r = None
+        if r is None and db_version is not None and self._matches(self._compiled, 0, db_version):
+            self._mark_checked()
+            return
+        compiled = await self._compile_from_db(session, version, db_version or 0)
+        if compiled is None:
+            return  # keep old (or empty) snapshot on failure
+        self._install(compiled)
+        if r is not None:
+            try:
+                # Readers verify the embedded version, so a racing bump just causes one more rebuild.
+                await r.set(RBAC_SNAPSHOT_KEY, compiled.to_json())
+            except (RedisError, OSError) as e:
+                mark_redis_down(e)
+
+    @staticmethod
+    def _matches(compiled: Optional[CompiledPermissions], version: int, db_version: Optional[int]) -> bool:
+        return (
+            compiled is not None
+            and compiled.version == version
+            and (db_version is None or compiled.db_version == db_version)
+        )
+
+    async def _read_db_version(self, session: AsyncSession) -> Optional[int]:
+        """``core.rbac_version`` when the trigger migration ran, else None (Redis version only)."""
+        await schema_registry.ensure_loaded(session)
+        if not schema_registry.has_table(RBAC_DB_VERSION_TABLE):
+            return None
+        try:
+            return int((await session.execute(text("select version from core.rbac_version"))).scalar() or 0)
+        except Exception:
+            try:
+                await session.rollback()
+            except Exception:
+                pass
+            return None
+
+    def _install(self, compiled: CompiledPermissions):
+        self._compiled = compiled
+        self.generation += 1
+        self._mark_checked()
+
+    def _mark_checked(self):
+        self._stale = False
+        self._checked_at = time.monotonic()
+
+    async def _compile_from_db(self, session: AsyncSession, version: int, db_version: int = 0) -> Optional[CompiledPermissions]:
+        # role_permission table may not exist early in migration history
+        try:
+            rows = (await session.execute(text("select role, permission_code from core.role_permission"))).all()
+        except Exception:
+            try:
+                await session.rollback()
+            except Exception:
+                pass
+            return None
+        return CompiledPermissions.from_rows(version, rows, db_version)
+
+    async def invalidate(self) -> int:
+        """Bump the shared version and notify every worker. Call after RBAC writes."""
+        self._stale = True
+        r = await get_redis()
+        if r is None:
+            return self.version + 1
+        try:
+            version = int(await r.incr(RBAC_VERSION_KEY))
+            await r.delete(RBAC_SNAPSHOT_KEY)
+            await r.publish(RBAC_CHANNEL, str(version))
+            return version
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+            return self.version + 1
+
+    def mark_stale(self):
+        self._stale = True
+
+    # ---- pub/sub + LISTEN listeners ----
+    def start_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen_forever(), name="rbac-invalidation-listener")
+        if self._db_listener is None or self._db_listener.done():
+            self._db_listener = asyncio.create_task(self._listen_db_forever(), name="rbac-db-listener")
+
+    async def stop_listener(self):
+        for task in (self._listener, self._db_listener):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._listener = self._db_listener = None
+        self._listening = self._db_listening = False
+
+    def _on_db_notify(self, *_args) -> None:
+        self._stale = True
+
+    async def _listen_db_forever(self):
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    tracked = (await conn.execute(text("select to_regclass(:t)"), {'t': RBAC_DB_VERSION_TABLE})).scalar()
+                if tracked is None:
+                    # Trigger migration not applied: nothing will ever notify; rely on the TTL check.
+                    await asyncio.sleep(_LISTENER_RECHECK_SEC)
+                    continue
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.add_listener(RBAC_DB_CHANNEL, self._on_db_notify)
+                    self._db_listening = True
+                    # Anything committed before LISTEN took effect is caught by one version check.
+                    self._stale = True
+                    try:
+                        while not raw.is_closed():
+                            await asyncio.sleep(_DB_LISTENER_CHECK_SEC)
+                    finally:
+                        try:
+                            await raw.remove_listener(RBAC_DB_CHANNEL, self._on_db_notify)
+                        except Exception:
+                            pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOG.warning("rbac db listener disconnected: %s", e)
+            finally:
+                if self._db_listening:
+                    self._stale = True
+                self._db_listening = False
+            await asyncio.sleep(5)
+
+    async def _listen_forever(self):
+        while True:
+            r = await get_redis()
+            if r is None:
+                self._listening = False
+                await asyncio.sleep(30)
+                continue
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe(RBAC_CHANNEL)
+                self._listening = True
+                # Anything published before we subscribed is caught by one version check.
+                self._stale = True
+                async for msg in pubsub.listen():
+                    if msg.get("type") == "message":
+                        self._stale = True
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as e:
+                LOG.warning("rbac listener disconnected: %s", e)
+                self._listening = False
+                self._stale = True
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+permission_cache = PermissionCache()
+
+
+async def invalidate_permissions() -> int:
+    return await permission_cache.invalidate()
@@ -0,0 +1,168 @@
+"""Token-bucket rate limiting shared across workers.
+
+Each ``RateLimiter`` is a named policy (``limit`` requests per ``window``
+seconds, refilled continuously). Buckets live in Redis and are updated by one
+Lua script, so the check-and-take is atomic across all API processes and uses
+Redis' clock. When Redis is unavailable a bounded per-process LRU of buckets is
+used instead (limits then apply per worker).
+
+Policies can be tuned without a deploy via RATE_LIMITS, e.g.
+``RATE_LIMITS="chat.search=60/60,auth.otp.phone=3/600"``.
+
+Usage inside a handler (identity is whatever the policy is keyed on)::
+
+    await SEARCH_LIMIT.check(caller_identity(request, user), response)
+
+Responses carry ``RateLimit-Limit``/``RateLimit-Remaining``/``RateLimit-Reset``
+and ``RateLimit-Policy``; a rejected call raises 429 with ``Retry-After``. The
+client IP is ``request.client.host`` (run uvicorn with ``--proxy-headers``
+behind a load balancer).
+"""
+from __future__ import annotations
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from prometheus_client import Counter
+from redis.exceptions import RedisError
+from starlette.responses import Response
+
+from .config import settings
+from .redis import get_redis, mark_redis_down
+
+_LOCAL_MAX = 50_000
+
+RATE_LIMITED = Counter('rate_limit_rejected_total', 'Requests rejected by a rate limit', ['policy'])
+RATE_CHECKS = Counter('rate_limit_checks_total', 'Rate limit evaluations', ['policy', 'backend'])
+
+# KEYS[1] bucket; ARGV capacity, refill tokens/sec, cost. Returns {allowed, tokens_left*1000}.
+_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, math.floor(tokens * 1000)}
+"""
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int        # seconds until the bucket is full again
+    retry_after: int  # seconds until one more request would pass (0 when allowed)
+    window: int
+
+
+@lru_cache(maxsize=1)
+def _overrides(raw: str) -> dict[str, tuple[int, int]]:
+    out: dict[str, tuple[int, int]] = {}
+    for part in raw.split(','):
+        name, _, spec = part.strip().partition('=')
+        limit, _, window = spec.partition('/')
+        try:
+            out[name.strip()] = (int(limit), int(window))
+        except ValueError:
+            continue
+    return out
+
+
+class RateLimiter:
+    def __init__(self, name: str, limit: int, window: int):
+        self.name = name
+        self._limit = limit
+        self._window = window
+        self._local: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    @property
+    def policy(self) -> tuple[int, int]:
+        return _overrides(settings.rate_limits).get(self.name, (self._limit, self._window))
+
+    async def hit(self, identity: str, cost: int = 1) -> Decision:
+        limit, window = self.policy
+        rate = limit / window
+        tokens: Optional[float] = None
+        allowed = False
+        r = await get_redis()
+        if r is not None:
+            try:
+                allowed_i, left_milli = await r.eval(_BUCKET_LUA, 1, f"rl:{self.name}:{identity}", limit, rate, cost)
+                allowed, tokens = bool(allowed_i), int(left_milli) / 1000
+                RATE_CHECKS.labels(self.name, 'redis').inc()
+            except (RedisError, OSError) as e:
+                mark_redis_down(e)
+        if tokens is None:
+            allowed, tokens = self._local_hit(identity, limit, rate, cost)
+            RATE_CHECKS.labels(self.name, 'local').inc()
+        return Decision(
+            allowed=allowed,
+            limit=limit,
+            remaining=max(0, int(tokens)),
+            reset=math.ceil((limit - tokens) / rate),
+            retry_after=0 if allowed else max(1, math.ceil((cost - tokens) / rate)),
+            window=window,
+        )
+
+    def _local_hit(self, identity: str, limit: int, rate: float, cost: int) -> tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts = self._local.pop(identity, (float(limit), now))
+        tokens = min(limit, tokens + (now - ts) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._local[identity] = (tokens, now)
+        while len(self._local) > _LOCAL_MAX:
+            self._local.popitem(last=False)
+        return allowed, tokens
+
+    async def check(self, identity: str, response: Optional[Response] = None, cost: int = 1) -> Decision:
+        """Take ``cost`` tokens for ``identity``; set RateLimit-* headers or raise 429."""
+        decision = await self.hit(identity, cost)
+        headers = rate_limit_headers(decision)
+        if not decision.allowed:
+            RATE_LIMITED.labels(self.name).inc()
+            headers['Retry-After'] = str(decision.retry_after)
+            raise HTTPException(429, f'Rate limit exceeded ({self.name})', headers=headers)
+        if response is not None:
+            response.headers.update(headers)
+        return decision
+
+
+def rate_limit_headers(decision: Decision) -> dict[str, str]:
+    return {
+        'RateLimit-Limit': str(decision.limit),
+        'RateLimit-Remaining': str(decision.remaining),
+        'RateLimit-Reset': str(decision.reset),
+        'RateLimit-Policy': f'{decision.limit};w={decision.window}',
+    }
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else 'unknown'
+
+
+def caller_identity(request: Request, user=None) -> str:
+    """``user:<id>`` for an authenticated caller (``core.security.CurrentUser``), else ``ip:<client ip>``."""
+    user_id = getattr(user, 'user_id', None)
+    return f"user:{user_id}" if user_id else f"ip:{client_ip(request)}"
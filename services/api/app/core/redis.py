@@ -0,0 +1,94 @@
+"""Shared async Redis client for cross-worker state (caches, locks, pub/sub).
+
+Redis is optional in dev/test. ``get_redis()`` returns ``None`` when REDIS_URL is
+empty or the server is unreachable so callers can fall back to per-process state.
+After a failed connect we back off for a while instead of paying the connect
+timeout on every request.
+"""
+from __future__ import annotations
+import logging
+import time
+from typing import Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from .config import settings
+
+LOG = logging.getLogger("redis")
+
+_RETRY_AFTER_SEC = 30.0
+
+_client: Optional[aioredis.Redis] = None
+_down_until = 0.0
+
+
+def _build_client() -> aioredis.Redis:
+    return aioredis.from_url(
+        settings.redis_url,
+        decode_responses=True,
+        socket_connect_timeout=0.5,
+        socket_timeout=1.0,
+        health_check_interval=30,
+    )
+
+
+async def get_redis() -> Optional[aioredis.Redis]:
+    """Return a connected client or ``None`` when Redis is disabled/unavailable."""
+    global _client, _down_until
+    if not settings.redis_url:
+        return None
+    now = time.monotonic()
+    if now < _down_until:
+        return None
+    if _client is None:
+        _client = _build_client()
+        try:
+            await _client.ping()
+        except (RedisError, OSError) as e:
+            LOG.warning("redis unavailable (%s); using in-process fallbacks for %ss", e, int(_RETRY_AFTER_SEC))
+            await _safe_close(_client)
+            _client = None
+            _down_until = now + _RETRY_AFTER_SEC
+            return None
+    return _client
+
+
+def mark_redis_down(exc: Exception | None = None) -> None:
+    """Callers report command failures here so subsequent calls skip Redis for a while."""
+    global _client, _down_until
+    if exc is not None:
+        LOG.warning("redis command failed: %s", exc)
+    _down_until = time.monotonic() + _RETRY_AFTER_SEC
+    _client = None
+
+
+# Delete a lock only if we still own it (it may have expired and been re-taken).
+RELEASE_LOCK_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+
+
+async def release_lock(key: str, token: str) -> None:
+    r = await get_redis()
+    if r is None:
+        return
+    try:
+        await r.eval(RELEASE_LOCK_LUA, 1, key, token)
+    except (RedisError, OSError) as e:
+        mark_redis_down(e)
+
+
+async def close_redis() -> None:
+    global _client
+    if _client is not None:
+        await _safe_close(_client)
+        _client = None
+
+
+async def _safe_close(client: aioredis.Redis) -> None:
+    try:
+        await client.aclose()
+    except Exception:  # pragma: no cover - best effort
+        pass
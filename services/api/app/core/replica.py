@@ -0,0 +1,145 @@
+"""Read-replica routing for read-only endpoints.
+
+``get_read_session`` yields a replica session when READ_REPLICA_DSN is set, the
+replica answered its last health probe and its replay lag is within
+REPLICA_MAX_LAG_SEC. Otherwise it hands back the request's primary session
+(shared with ``require()`` through FastAPI's dependency cache).
+
+Read-your-writes: after any successful mutating request the API sets a short
+lived cookie (``mark_recent_write``); while it is present the user's reads go
+to the primary so they see their own changes even if the replica is behind.
+Clients without cookies can send ``X-Read-Primary: 1``.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from fastapi import Depends, Request
+from prometheus_client import Counter, Gauge
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
+
+from . import db
+from .config import settings
+
+LOG = logging.getLogger("db")
+
+STICKY_COOKIE = "erp_rw"
+FORCE_PRIMARY_HEADER = "x-read-primary"
+_WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+_PROBE_INTERVAL_SEC = 2.0
+
+REPLICA_LAG = Gauge('db_replica_lag_seconds', 'Replay lag of the read replica at last probe')
+READ_ROUTED = Counter('db_read_routed_total', 'Read-only sessions by target', ['target', 'reason'])
+
+_LAG_SQL = text("""
+    select case
+        when not pg_is_in_recovery() then 0
+        when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+        else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+    end
+""")
+
+
+class ReplicaHealth:
+    """Caches the replica lag probe so at most one query runs per interval."""
+
+    def __init__(self):
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def usable(self) -> bool:
+        if time.monotonic() - self._checked_at >= _PROBE_INTERVAL_SEC:
+            async with self._lock:
+                if time.monotonic() - self._checked_at >= _PROBE_INTERVAL_SEC:
+                    await self._probe()
+        return self.healthy and self.lag is not None and self.lag <= settings.replica_max_lag_sec
+
+    async def _probe(self):
+        try:
+            async with db.read_engine.connect() as conn:  # type: ignore[union-attr]
+                self.lag = float((await conn.execute(_LAG_SQL)).scalar_one())
+            self.healthy = True
+            REPLICA_LAG.set(self.lag)
+        except Exception as e:
+            if self.healthy:
+                LOG.warning("read replica unavailable, routing reads to primary: %s", e)
+            self.healthy = False
+            self.lag = None
+        finally:
+            self._checked_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            'configured': db.read_engine is not None,
+            'healthy': self.healthy,
+            'lag_sec': self.lag,
+            'max_lag_sec': settings.replica_max_lag_sec,
+        }
+
+
+replica_health = ReplicaHealth()
+
+
+def _sticky(request: Request) -> bool:
+    if request.headers.get(FORCE_PRIMARY_HEADER) == '1':
+        return True
+    raw = request.cookies.get(STICKY_COOKIE)
+    if not raw:
+        return False
+    try:
+        return float(raw) > time.time()
+    except ValueError:
+        return False
+
+
+def recent_write_cookie(method: str, status: int) -> Optional[str]:
+    """``Set-Cookie`` value pinning the caller's reads to the primary after a write."""
+    if db.read_engine is None or method not in _WRITE_METHODS or status >= 400:
+        return None
+    until = time.time() + settings.replica_sticky_sec
+    return f"{STICKY_COOKIE}={until:.0f}; HttpOnly; Max-Age={settings.replica_sticky_sec}; Path=/; SameSite=lax"
+
+
+def mark_recent_write(request: Request, response: Response) -> None:
+    cookie = recent_write_cookie(request.method, response.status_code)
+    if cookie:
+        response.headers.append('set-cookie', cookie)
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """Standalone read-only session for work outside a request (e.g. cache refresh)."""
+    factory = db.SessionLocal
+    if db.ReadSessionLocal is not None and await replica_health.usable():
+        factory = db.ReadSessionLocal
+    async with factory() as session:
+        yield session
+
+
+async def get_read_session(request: Request, primary: AsyncSession = Depends(db.get_session)) -> AsyncGenerator[AsyncSession, None]:
+    """Session for read-only handlers: replica when safe, otherwise the primary.
+
+    Handlers using this must not write; anything that may run DDL or DML should
+    take ``get_session`` as well and use that for the write.
+    """
+    if db.ReadSessionLocal is None:
+        yield primary
+        return
+    if _sticky(request):
+        READ_ROUTED.labels('primary', 'sticky').inc()
+        yield primary
+        return
+    if not await replica_health.usable():
+        READ_ROUTED.labels('primary', 'lag' if replica_health.healthy else 'down').inc()
+        yield primary
+        return
+    READ_ROUTED.labels('replica', 'ok').inc()
+    async with db.ReadSessionLocal() as session:
+        yield session
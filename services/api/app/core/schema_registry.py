@@ -0,0 +1,160 @@
+"""In-memory schema capability registry.
+
+Some handlers must cope with databases that are behind on migrations (optional
+tables, late-added columns). Instead of probing with SELECTs on every request
+they ask this registry, which snapshots ``information_schema.columns`` once at
+startup (lifespan) and again on ``POST /ops/schema/refresh`` or after a handler
+applies its own fallback DDL. ``refresh_all`` (the ops endpoint) reloads the
+serving worker and publishes on the Redis channel ``schema:refresh``; every
+other worker's listener reloads its own copy. Without Redis only the serving
+worker reloads.
+
+Unqualified names resolve through the connection's search_path, mirroring how
+the queries themselves resolve.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import uuid
+from typing import Iterable, Optional, Union
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .redis import get_redis, mark_redis_down
+
+LOG = logging.getLogger("schema")
+
+SCHEMA_CHANNEL = "schema:refresh"
+
+_COLUMNS_SQL = text("""
+    select table_schema, table_name, column_name
+    from information_schema.columns
+    where table_schema not in ('pg_catalog', 'information_schema')
+""")
+_SEARCH_PATH_SQL = text("select unnest(current_schemas(false))")
+
+
+class SchemaRegistry:
+    def __init__(self):
+        self._columns: dict[str, set[str]] = {}  # 'schema.table' -> column names
+        self._search_path: list[str] = ['public']
+        self.loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._listener: Optional[asyncio.Task] = None
+        # Identifies this worker's own broadcasts so it does not reload twice.
+        self._origin = uuid.uuid4().hex
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    async def load(self, conn: Union[AsyncConnection, AsyncSession]) -> None:
+        rows = (await conn.execute(_COLUMNS_SQL)).all()
+        search_path = [r[0] for r in (await conn.execute(_SEARCH_PATH_SQL)).all()]
+        columns: dict[str, set[str]] = {}
+        for schema, table, column in rows:
+            columns.setdefault(f"{schema}.{table}", set()).add(column)
+        self._columns = columns
+        self._search_path = search_path or ['public']
+        self.loaded_at = time.time()
+        LOG.info("schema registry loaded: %d tables, search_path=%s", len(columns), ','.join(self._search_path))
+
+    async def ensure_loaded(self, session: AsyncSession) -> None:
+        """Lazy load for contexts where lifespan did not run (tests, scripts)."""
+        if self.loaded:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self.load(session)
+
+    def _resolve(self, name: str) -> Optional[str]:
+        if '.' in name:
+            return name if name in self._columns else None
+        for schema in self._search_path:
+            key = f"{schema}.{name}"
+            if key in self._columns:
+                return key
+        return None
+
+    def has_table(self, name: str) -> bool:
+        return self._resolve(name) is not None
+
+    def has_columns(self, table: str, *columns: str) -> bool:
+        key = self._resolve(table)
+        return key is not None and set(columns) <= self._columns[key]
+
+    def note_table(self, name: str, columns: Iterable[str] = ()) -> None:
+        """Record a table/columns created by fallback DDL without a full reload."""
+        key = name if '.' in name else f"{self._search_path[0]}.{name}"
+        self._columns.setdefault(self._resolve(name) or key, set()).update(columns)
+
+    async def reload(self) -> None:
+        from .db import engine
+        async with engine.connect() as conn:
+            await self.load(conn)
+
+    async def refresh_all(self) -> int:
+        """Reload here and tell every other worker to reload; returns the workers notified."""
+        await self.reload()
+        r = await get_redis()
+        if r is None:
+            return 0
+        try:
+            return int(await r.publish(SCHEMA_CHANNEL, self._origin))
+        except (RedisError, OSError) as e:
+            mark_redis_down(e)
+            return 0
+
+    # ---- pub/sub listener ----
+    def start_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen_forever(), name="schema-refresh-listener")
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._listener = None
+
+    async def _listen_forever(self):
+        while True:
+            r = await get_redis()
+            if r is None:
+                await asyncio.sleep(30)
+                continue
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe(SCHEMA_CHANNEL)
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message" or msg.get("data") == self._origin:
+                        continue
+                    try:
+                        await self.reload()
+                    except Exception as e:
+                        LOG.warning("schema registry reload after broadcast failed: %s", e)
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as e:
+                LOG.warning("schema refresh listener disconnected: %s", e)
+                await asyncio.sleep(5)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def snapshot(self) -> dict:
+        return {
+            'loaded_at': self.loaded_at,
+            'search_path': list(self._search_path),
+            'tables': len(self._columns),
+        }
+
+
+schema_registry = SchemaRegistry()
@@ -1,16 +1,12 @@
-import jwt, os, time, logging
-from fastapi import Header, HTTPException, Depends
+import jwt, os, logging, time
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Header, HTTPException, Depends, Request
 from .config import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text, select
 from .db import get_session
-
-# Simple in-process caches (non-distributed). For multi-instance deploy add Redis layer.
-_perm_cache = {
-    'loaded_at': 0,
-    'role_perms': {},   # role -> set(permission_code)
-}
-_PERM_CACHE_TTL = 60  # seconds
+from .perm_cache import CompiledPermissions, permission_cache
 
 LOG = logging.getLogger("auth")
 
@@ -51,50 +47,117 @@ def get_current_user(authorization: str = Header(None)) -> CurrentUser:
         LOG.info("AUTH DEBUG: token accepted user_id=%s roles=%s", user.user_id, user.roles)
     return user
 
-async def _load_role_permissions(session: AsyncSession):
-    """Refresh cache if stale. Populates role->permissions mapping from DB."""
-    now = time.time()
-    if now - _perm_cache['loaded_at'] < _PERM_CACHE_TTL and _perm_cache['role_perms']:
-        return _perm_cache['role_perms']
-    role_perms = {}
-    # role_permission table (may not exist early in migration history)
+def get_optional_user(authorization: str = Header(None)) -> Optional[CurrentUser]:
+    """The caller behind a valid bearer token, else None; never raises (rate-limit keys, optional auth)."""
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
     try:
-        rows = (await session.execute(text("select role, permission_code from core.role_permission"))).all()
+        payload = jwt.decode(authorization.split()[1], settings.jwt_secret, algorithms=["HS256"])
     except Exception:
-        return _perm_cache['role_perms']  # silently keep old (or empty) on failure
-    for role, perm in rows:
-        role_perms.setdefault(role.lower(), set()).add(perm)
-    _perm_cache['role_perms'] = role_perms
-    _perm_cache['loaded_at'] = now
-    return role_perms
+        return None
+    return CurrentUser(int(payload.get('sub', 0)), payload.get('phone', ''), payload.get('roles', []))
 
-async def _user_effective_permissions(user: CurrentUser, session: AsyncSession):
-    role_perms = await _load_role_permissions(session)
-    eff = set()
-    for r in user.roles:
-        eff |= role_perms.get(r.lower(), set())
-    # apply per-user overrides if table exists
+async def _load_role_permissions(session: AsyncSession):
+    """Role->permissions mapping from the shared compiled cache (see perm_cache)."""
+    compiled = await permission_cache.get(session)
+    return compiled.role_permissions()
+
+# Per-user GRANT/REVOKE overrides, cached per permission-cache generation: an override edit
+# bumps core.rbac_version, the cache reloads and the generation moves. Entries also expire
+# after RBAC_CACHE_TTL in case that signal is missed. Bounded LRU keyed by user_id.
+_OVERRIDE_CACHE_MAX = 4096
+_override_cache: "OrderedDict[int, tuple[int, float, frozenset[str], frozenset[str]]]" = OrderedDict()
+
+async def _user_overrides(user_id: int, session: AsyncSession) -> tuple[frozenset[str], frozenset[str]]:
+    gen = permission_cache.generation
+    now = time.monotonic()
+    hit = _override_cache.get(user_id)
+    if hit is not None and hit[0] == gen and now - hit[1] < settings.rbac_cache_ttl:
+        _override_cache.move_to_end(user_id)
+        return hit[2], hit[3]
+    grants: set[str] = set()
+    revokes: set[str] = set()
+    # table may not exist in older schemas
     try:
-        rows = (await session.execute(text("select permission_code, mode from core.user_permission_override where user_id=:uid"), {'uid': user.user_id})).all()
+        rows = (await session.execute(text("select permission_code, mode from core.user_permission_override where user_id=:uid"), {'uid': user_id})).all()
         for code, mode in rows:
             if mode == 'GRANT':
-                eff.add(code)
-            elif mode == 'REVOKE' and code in eff:
-                eff.remove(code)
+                grants.add(code)
+            elif mode == 'REVOKE':
+                revokes.add(code)
     except Exception:
-        pass
-    return eff
+        try:
+            await session.rollback()
+        except Exception:
+            pass
+    entry = (gen, now, frozenset(grants), frozenset(revokes))
+    _override_cache[user_id] = entry
+    _override_cache.move_to_end(user_id)
+    while len(_override_cache) > _OVERRIDE_CACHE_MAX:
+        _override_cache.popitem(last=False)
+    return entry[2], entry[3]
+
+class PermissionContext:
+    """Effective permissions for one request, resolved once and reused by every require().
+
+    ``mask`` is the role bitset with overrides applied; codes granted by override but
+    unknown to the role catalog live in ``extra``.
+    """
+    __slots__ = ('user_id', 'mask', 'extra', 'compiled')
+
+    def __init__(self, user_id: int, mask: int, extra: frozenset[str], compiled: CompiledPermissions):
+        self.user_id = user_id
+        self.mask = mask
+        self.extra = extra
+        self.compiled = compiled
+
+    def has(self, permission: str) -> bool:
+        bit = self.compiled.bit(permission)
+        if bit:
+            return bool(self.mask & bit)
+        return permission in self.extra
+
+    def codes(self) -> set[str]:
+        return self.compiled.decode(self.mask) | set(self.extra)
+
+async def _build_permission_context(user: CurrentUser, session: AsyncSession) -> PermissionContext:
+    compiled = await permission_cache.get(session)
+    mask = compiled.mask_for_roles(user.roles)
+    grants, revokes = await _user_overrides(user.user_id, session)
+    extra = set()
+    for code in grants:
+        bit = compiled.bit(code)
+        if bit:
+            mask |= bit
+        else:
+            extra.add(code)
+    for code in revokes:
+        mask &= ~compiled.bit(code)
+        extra.discard(code)
+    return PermissionContext(user.user_id, mask, frozenset(extra), compiled)
+
+async def get_permission_context(request: Request, user: CurrentUser, session: AsyncSession) -> PermissionContext:
+    """Resolve once per request; stacked require() dependencies reuse request.state.perm_ctx."""
+    ctx = getattr(request.state, 'perm_ctx', None)
+    if ctx is None or ctx.user_id != user.user_id:
+        ctx = await _build_permission_context(user, session)
+        request.state.perm_ctx = ctx
+    return ctx
+
+async def _user_effective_permissions(user: CurrentUser, session: AsyncSession):
+    return (await _build_permission_context(user, session)).codes()
 
 def require(permission: str):
-    async def _dep(user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
+    async def _dep(request: Request, user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_session)):
         if not settings.rbac_enforce:
             if _auth_debug():
                 LOG.info("AUTH DEBUG: RBAC disabled; permitting %s for user %s", permission, user.user_id)
             return user
-        eff = await _user_effective_permissions(user, session)
+        ctx = await get_permission_context(request, user, session)
+        allowed = ctx.has(permission)
         if _auth_debug():
-            LOG.info("AUTH DEBUG: user=%s has_perms=%d checking=%s result=%s", user.user_id, len(eff), permission, permission in eff)
-        if permission not in eff:
+            LOG.info("AUTH DEBUG: user=%s checking=%s result=%s", user.user_id, permission, allowed)
+        if not allowed:
             if _auth_debug():
                 LOG.warning("AUTH DEBUG: user=%s missing permission %s", user.user_id, permission)
             raise HTTPException(403, "Forbidden")
@@ -0,0 +1,154 @@
+"""Per-request SQL instrumentation.
+
+Cursor events on every engine feed a request-scoped ``QueryStats`` held in a
+contextvar. The HTTP middleware (core/observability.py) starts a collector, adds
+``server_timing`` entries (``db`` total, ``db-slow`` slowest statement) when the
+response starts, and finally calls ``finish_request`` which observes query count
+and DB time histograms labelled by route template.
+
+With SQL_NPLUS1_DEBUG on, statements are also grouped by shape (whitespace and
+literals collapsed, IN-lists folded) and any shape executed at least
+SQL_NPLUS1_THRESHOLD times in one request is logged and counted: the usual
+signature of a per-row query inside a loop.
+"""
+from __future__ import annotations
+import hashlib
+import logging
+import re
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+LOG = logging.getLogger("sql")
+
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'SQL statements executed per request', ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 200),
+)
+DB_TIME = Histogram(
+    'db_time_per_request_seconds', 'Time spent in SQL per request', ['route'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_REPEATED = Counter('db_repeated_statement_total', 'Requests with a statement shape repeated past the N+1 threshold', ['route'])
+
+_collector: ContextVar[Optional["QueryStats"]] = ContextVar("sql_query_stats", default=None)
+
+_WS_RE = re.compile(r"\s+")
+_STR_RE = re.compile(r"'(?:[^']|'')*'")
+_NUM_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_LIST_RE = re.compile(r"\((?:\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|\$\d+|%\(\w+\)s|:\w+)\s*\)")
+_POSTCOMPILE_RE = re.compile(r"\$\d+")
+
+
+def normalize_statement(sql: str) -> str:
+    s = _STR_RE.sub("?", sql)
+    s = _POSTCOMPILE_RE.sub("?", s)
+    s = _NUM_RE.sub("?", s)
+    s = _PARAM_LIST_RE.sub("(...)", s)
+    return _WS_RE.sub(" ", s).strip()
+
+
+def fingerprint(sql: str) -> str:
+    return hashlib.sha1(normalize_statement(sql).encode()).hexdigest()[:10]
+
+
+class QueryStats:
+    __slots__ = ("count", "total", "slowest", "slowest_sql", "shapes")
+
+    def __init__(self, track_shapes: bool = False):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_sql: Optional[str] = None
+        self.shapes: Optional[dict[str, int]] = {} if track_shapes else None
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_sql = statement
+        if self.shapes is not None:
+            # Bound statements are usually byte-identical per shape; normalise at report time.
+            self.shapes[statement] = self.shapes.get(statement, 0) + 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        if not self.shapes:
+            return []
+        grouped: dict[str, int] = {}
+        for sql, n in self.shapes.items():
+            key = normalize_statement(sql)
+            grouped[key] = grouped.get(key, 0) + n
+        return sorted(((k, n) for k, n in grouped.items() if n >= threshold), key=lambda kv: -kv[1])
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _collector.get()
+
+
+def start_request():
+    """Install a fresh collector; returns the token for ``finish_request``."""
+    return _collector.set(QueryStats(track_shapes=settings.sql_nplus1_debug))
+
+
+def server_timing(stats: Optional[QueryStats]) -> list[str]:
+    """``Server-Timing`` entries: total DB time and the slowest statement fingerprint."""
+    if stats is None or not stats.count:
+        return []
+    timing = [f'db;dur={stats.total * 1000:.2f};desc="{stats.count} queries"']
+    if stats.slowest_sql is not None:
+        timing.append(f'db-slow;dur={stats.slowest * 1000:.2f};desc="{fingerprint(stats.slowest_sql)}"')
+    return timing
+
+
+def finish_request(token, route: str) -> Optional[QueryStats]:
+    """Uninstall the collector and record metrics for the finished request."""
+    stats = _collector.get()
+    _collector.reset(token)
+    if stats is None:
+        return None
+    DB_QUERIES.labels(route).observe(stats.count)
+    DB_TIME.labels(route).observe(stats.total)
+    if stats.shapes is not None:
+        hits = stats.repeated(settings.sql_nplus1_threshold)
+        if hits:
+            DB_REPEATED.labels(route).inc()
+            for shape, n in hits:
+                LOG.warning("possible N+1 route=%s repeats=%d fp=%s sql=%s", route, n, fingerprint(shape), shape[:300])
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _collector.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute; drop their start mark.
+    conn = exception_context.connection
+    starts = conn.info.get("query_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_sql(engine: Engine) -> None:
+    """Attach the cursor hooks to a (sync) engine; idempotent."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from fastapi import Depends
 from .security import CurrentUser
 from .dependencies import get_current_user
-from sqlalchemy import Column, BigInteger, DateTime, Text, JSON
+from sqlalchemy import Column, BigInteger, DateTime, Text, JSON, Index, text
 from .db import Base
 from datetime import datetime
 from fastapi import Request
@@ -12,10 +12,19 @@ from functools import wraps
 
 
 class AuditLog(Base):
+    """Monthly range-partitioned on created_at (see migration 20251018_0100_audit_log_partitioning)."""
     __tablename__ = 'audit_log'
-    __table_args__ = {'schema': 'core'}
+    __table_args__ = (
+        Index('ix_audit_log_created', text('created_at DESC'), text('id DESC')),
+        Index('ix_audit_log_action', 'action', text('created_at DESC'), text('id DESC')),
+        Index('ix_audit_log_object', 'object_type', 'object_id', text('created_at DESC')),
+        Index('ix_audit_log_user', 'user_id', text('created_at DESC'), text('id DESC')),
+        Index('ix_audit_log_request', 'request_id', postgresql_where=text('request_id IS NOT NULL')),
+        {'schema': 'core'},
+    )
     id = Column(BigInteger, primary_key=True, autoincrement=True)
-    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    # Partition key must be part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, default=datetime.utcnow, server_default=text('now()'))
     user_id = Column(BigInteger)
     school_id = Column(BigInteger)
     action = Column(Text, nullable=False)
@@ -42,41 +51,65 @@ async def get_tenant_context(user: CurrentUser = Depends(get_current_user)) -> T
     return TenantContext(school_id=1, user_id=int(user_id or 0), roles=list(roles))
 
 from typing import Optional
+import inspect as _inspect
+from .audit import audit_writer, stop_tracking, track_changes
+
+_AUDIT_PARAMS = ('audit_request', 'audit_session', 'audit_tenant')
 
 def audit(action: str, object_type: Optional[str] = None, verb: Optional[str] = None):
-    """Decorator for FastAPI route functions (async) to persist an audit row after successful execution.
+    """Decorator for FastAPI route functions (async) to record an audit entry after successful execution.
 
     Usage:
         @router.post('/foo')
         @audit('create_foo', object_type='foo', verb='CREATE')
         async def create_foo(...): ...
+
+    Entries go through the async batch writer (core/audit.py); nothing is committed
+    in the request. One entry is written per ORM object the handler created, changed
+    or deleted (with before/after values from change tracking), or a single entry
+    without snapshots when nothing was flushed through the ORM.
     """
     def _outer(fn):
+        sig = _inspect.signature(fn)
+        extra = [
+            _inspect.Parameter('audit_request', _inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            _inspect.Parameter('audit_session', _inspect.Parameter.KEYWORD_ONLY, annotation=AsyncSession, default=Depends(get_session)),
+            _inspect.Parameter('audit_tenant', _inspect.Parameter.KEYWORD_ONLY, annotation=TenantContext, default=Depends(get_tenant_context)),
+        ]
+        params = [p for p in sig.parameters.values() if p.kind != _inspect.Parameter.VAR_KEYWORD]
+        positional = [p for p in params if p.kind != _inspect.Parameter.KEYWORD_ONLY]
+        keyword_only = [p for p in params if p.kind == _inspect.Parameter.KEYWORD_ONLY]
+
         @wraps(fn)
-        async def _inner(*args, request: Request, session: AsyncSession = Depends(get_session), tenant: TenantContext = Depends(get_tenant_context), **kwargs):  # type: ignore
-            before_snapshot = None  # Placeholder if we ever fetch existing
-            result = await fn(*args, request=request, session=session, tenant=tenant, **kwargs)  # type: ignore
+        async def _inner(*args, **kwargs):
+            request: Request = kwargs.pop('audit_request')
+            session: AsyncSession = kwargs.pop('audit_session')
+            tenant: TenantContext = kwargs.pop('audit_tenant')
+            # get_session is cached per request, so this is the handler's own session.
+            changes = track_changes(session)
             try:
-                log_entry = AuditLog(
-                    user_id=tenant.user_id,
-                    school_id=tenant.school_id,
-                    action=action,
-                    object_type=object_type,
-                    object_id=None,
-                    verb=verb,
-                    before=before_snapshot,
-                    after=None,
-                    request_id=getattr(request.state, 'request_id', None),
-                    ip=request.client.host if request.client else None,
-                    user_agent=request.headers.get('user-agent')
-                )
-                session.add(log_entry)
-                await session.commit()
-            except Exception:  # pragma: no cover - logging failure not fatal
-                try:
-                    await session.rollback()
-                except Exception:
-                    pass
+                result = await fn(*args, **kwargs)
+            finally:
+                stop_tracking(session)
+            base = dict(
+                user_id=tenant.user_id,
+                school_id=tenant.school_id,
+                action=action,
+                request_id=getattr(request.state, 'request_id', None),
+                ip=request.client.host if request.client else None,
+                user_agent=request.headers.get('user-agent'),
+            )
+            for change in changes or [{}]:
+                await audit_writer.submit(audit_writer.build_record(**{
+                    **base,
+                    'object_type': object_type or change.get('object_type'),
+                    'object_id': change.get('object_id'),
+                    'verb': verb or change.get('verb'),
+                    'before': change.get('before'),
+                    'after': change.get('after'),
+                }))
             return result
+
+        _inner.__signature__ = sig.replace(parameters=positional + keyword_only + extra)  # type: ignore[attr-defined]
         return _inner
-    return _outer
\ No newline at end of file
+    return _outer
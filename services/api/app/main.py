@@ -1,17 +1,18 @@
-from fastapi import FastAPI, Request, Response, Depends, HTTPException, APIRouter
+from fastapi import FastAPI, Response, Depends, HTTPException, APIRouter
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
-import time
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from .core.logging import request_logging_middleware
-import logging, traceback, os
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from .core import logging as _api_logging  # noqa: F401  (installs the "api" log handler)
+from .core.observability import ObservabilityMiddleware
+from .core.responses import ORJSONResponse
+from .core.exports import ExportFormat, export_response, export_select, pick_columns
+import logging, os
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.core.db import get_session
+from sqlalchemy import select, tuple_
 from app.core.tenant import AuditLog, get_tenant_context, TenantContext
 from app.core.security import CurrentUser, get_current_user, require
-import uuid
 from .modules.students.router import router as students_router
 from .modules.attendance.router import router as attendance_router
 from .modules.attendance.bulk_router import router as attendance_bulk_router
@@ -36,6 +37,13 @@ from .modules.gallery.router import router as gallery_router
 from .modules.teacher.router import router as teacher_router
 from sqlalchemy import text
 from .core.db import engine
+from .core.audit import audit_writer
+from .core.cache import cache
+from .core.perm_cache import permission_cache
+from .core.redis import close_redis
+from .core.replica import get_read_session
+from .core.schema_registry import schema_registry
+from .modules.attendance.board import attendance_board
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -55,10 +63,21 @@ async def lifespan(app: FastAPI):
                 version_present = False
         if table_count == 0 and not version_present:
             raise RuntimeError("Database appears empty and unmigrated (no tables, no alembic_version). Run bootstrap or alembic upgrade before starting API.")
+        async with engine.connect() as conn:
+            await schema_registry.load(conn)
+    permission_cache.start_listener()
+    cache.start_listener()
+    schema_registry.start_listener()
+    audit_writer.start()
     yield
-    # (Optional future shutdown cleanup)
+    await attendance_board.stop()
+    await audit_writer.stop()
+    await cache.stop_listener()
+    await schema_registry.stop_listener()
+    await permission_cache.stop_listener()
+    await close_redis()
 
-app = FastAPI(title="School ERPLake API", lifespan=lifespan)
+app = FastAPI(title="School ERPLake API", lifespan=lifespan, default_response_class=ORJSONResponse)
 logger = logging.getLogger("erplake.api")
 if not logger.handlers:
     handler = logging.StreamHandler()
@@ -67,17 +86,6 @@ if not logger.handlers:
     logger.addHandler(handler)
 API_DEBUG = os.getenv('API_DEBUG', '').lower() in ('1','true','yes','on')
 logger.setLevel(logging.DEBUG if API_DEBUG else logging.INFO)
-app.middleware('http')(request_logging_middleware)
-
-if API_DEBUG:
-    @app.middleware('http')
-    async def exception_debug_middleware(request: Request, call_next):
-        try:
-            return await call_next(request)
-        except Exception as e:
-            tb = ''.join(traceback.format_exception(type(e), e, e.__traceback__))
-            logger.error("Unhandled exception path=%s method=%s %s", request.url.path, request.method, tb)
-            raise
 
 # CORS configuration to allow frontend dev server
 origins = [
@@ -92,28 +100,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-REQUEST_COUNT = Counter('api_requests_total', 'Total HTTP requests', ['method','path','status'])
-REQUEST_LATENCY = Histogram('api_request_duration_seconds', 'Request latency seconds', ['method','path'])
-REQUEST_ID_HEADER = 'X-Request-ID'
-
-@app.middleware('http')
-async def metrics_middleware(request: Request, call_next):
-    start = time.time()
-    response: Optional[Response] = None
-    # Attach a request id
-    req_id = request.headers.get(REQUEST_ID_HEADER) or str(uuid.uuid4())
-    request.state.request_id = req_id
-    try:
-        response = await call_next(request)
-        return response
-    finally:
-        path = request.url.path
-        # Avoid high cardinality: collapse dynamic numeric IDs
-        norm_path = '/'.join(['{id}' if p.isdigit() else p for p in path.split('/') if p]) or '/'
-        duration = time.time() - start
-        status = getattr(response, 'status_code', 500)
-        REQUEST_COUNT.labels(request.method, norm_path, status).inc()
-        REQUEST_LATENCY.labels(request.method, norm_path).observe(duration)
+# Request id, access log, route-template metrics, Server-Timing (see core/observability.py)
+app.add_middleware(ObservabilityMiddleware, debug=API_DEBUG)
 
 @app.get('/metrics')
 async def metrics():
@@ -137,14 +125,73 @@ if API_DEBUG:
     async def debug_fail():
         raise RuntimeError("Intentional debug failure for logging verification")
 
-@api_router.get('/ops/audit', dependencies=[Depends(require('ops:audit_read'))])
-async def list_audit(action: Optional[str] = None, object_type: Optional[str] = None, limit: int = 50, session: AsyncSession = Depends(get_session)):
-    q = select(AuditLog).order_by(AuditLog.id.desc()).limit(min(limit, 200))
+AUDIT_PAGE_MAX = 500
+
+def _audit_filters(action, object_type, object_id, user_id, request_id, since, until) -> list:
+    conds = []
     if action:
-        q = q.filter(AuditLog.action==action)
+        conds.append(AuditLog.action==action)
     if object_type:
-        q = q.filter(AuditLog.object_type==object_type)
+        conds.append(AuditLog.object_type==object_type)
+    if object_id:
+        conds.append(AuditLog.object_id==object_id)
+    if user_id is not None:
+        conds.append(AuditLog.user_id==user_id)
+    if request_id:
+        conds.append(AuditLog.request_id==request_id)
+    if since:
+        conds.append(AuditLog.created_at >= since)
+    if until:
+        conds.append(AuditLog.created_at < until)
+    return conds
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+def audit_cursor(created_at: datetime, id: int) -> str:
+    """``<epoch microseconds>.<id>``: exact and safe to paste into a query string."""
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return f"{(created_at - _EPOCH) // _MICROSECOND}.{id}"
+
+def parse_audit_cursor(cursor: str) -> tuple[datetime, int]:
+    us, _, id = cursor.partition('.')
+    try:
+        return _EPOCH + int(us) * _MICROSECOND, int(id)
+    except (ValueError, OverflowError):
+        raise HTTPException(400, 'Invalid cursor') from None
+
+@api_router.get('/ops/audit', dependencies=[Depends(require('ops:audit_read'))])
+async def list_audit(
+    response: Response,
+    action: Optional[str] = None,
+    object_type: Optional[str] = None,
+    object_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    request_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Newest-first audit entries with keyset paging on ``(created_at, id)``.
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` for the next
+    page. The ordering matches the ``(action|user_id, created_at DESC, id DESC)``
+    indexes, and the cursor's ``created_at`` (like ``since``/``until``) bounds the
+    scan to the monthly partitions at or before it.
+    """
+    limit = max(1, min(limit, AUDIT_PAGE_MAX))
+    q = select(AuditLog).order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit)
+    q = q.filter(*_audit_filters(action, object_type, object_id, user_id, request_id, since, until))
+    if cursor:
+        at, last_id = parse_audit_cursor(cursor)
+        # The plain bound is what lets the planner prune partitions; the row comparison is the keyset.
+        q = q.filter(AuditLog.created_at <= at, tuple_(AuditLog.created_at, AuditLog.id) < (at, last_id))
     rows = (await session.execute(q)).scalars().all()
+    if len(rows) == limit:
+        response.headers['X-Next-Cursor'] = audit_cursor(rows[-1].created_at, rows[-1].id)
     return [
         {
             'id': r.id,
@@ -159,6 +206,41 @@ async def list_audit(action: Optional[str] = None, object_type: Optional[str] =
         } for r in rows
     ]
 
+AUDIT_EXPORT = {
+    'id': AuditLog.id,
+    'at': AuditLog.created_at,
+    'action': AuditLog.action,
+    'object_type': AuditLog.object_type,
+    'object_id': AuditLog.object_id,
+    'verb': AuditLog.verb,
+    'user_id': AuditLog.user_id,
+    'school_id': AuditLog.school_id,
+    'request_id': AuditLog.request_id,
+    'ip': AuditLog.ip,
+    'before': AuditLog.before,
+    'after': AuditLog.after,
+}
+
+@api_router.get('/ops/audit/export', dependencies=[Depends(require('ops:audit_read'))])
+async def export_audit(
+    format: ExportFormat = ExportFormat.csv,
+    columns: Optional[str] = None,
+    action: Optional[str] = None,
+    object_type: Optional[str] = None,
+    object_id: Optional[str] = None,
+    user_id: Optional[int] = None,
+    request_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    """Stream matching audit entries oldest-first; bound ``since``/``until`` to limit the partitions scanned."""
+    stmt = (
+        export_select(AUDIT_EXPORT, pick_columns(AUDIT_EXPORT, columns))
+        .where(*_audit_filters(action, object_type, object_id, user_id, request_id, since, until))
+        .order_by(AuditLog.created_at, AuditLog.id)
+    )
+    return export_response(stmt, format, 'audit-log')
+
 """Mount all routers under /api prefix for consistent frontend proxying."""
 api_router.include_router(auth_router)
 api_router.include_router(students_router)
@@ -0,0 +1,176 @@
+"""Read side of the ``attendance_month`` bitmap store.
+
+One row per (student, month) with ``present`` / ``absent`` / ``late`` /
+``excused`` INTEGER masks, bit ``d - 1`` = day ``d``. The table, its triggers
+and the rebuild function live in
+alembic_clean/versions/20251018_0500_attendance_month.py; like the classes
+rollup it is declared on its own MetaData so ``create_all`` never creates it
+without the triggers, and callers check ``schema_registry`` first
+(``month_source`` falls back to folding the daily tables into the same shape).
+
+A year of attendance is ~12 rows per student instead of ~220 daily rows.
+Day counts are popcounts: ``bit_count(mask::bit(32))`` summed in SQL for whole
+classes/schools, ``int.bit_count`` in Python for one student's streaks, where
+the months are laid end to end in one integer (31 bits per month).
+
+Percentages count late as attended; excused and unmarked days are neutral.
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Iterable, Optional, Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.dialects.postgresql import BIT
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..students.models_extra import AttendanceEvent
+from .models import AttendanceStudent
+
+BITMAP_TABLE = 'attendance_month'
+MONTH_BITS = 31
+STATUSES = ('present', 'absent', 'late', 'excused')
+
+_metadata = sa.MetaData()
+
+attendance_month = sa.Table(
+    BITMAP_TABLE, _metadata,
+    sa.Column('student_id', sa.Integer, primary_key=True),
+    sa.Column('month', sa.Date, primary_key=True),
+    sa.Column('present', sa.Integer),
+    sa.Column('absent', sa.Integer),
+    sa.Column('late', sa.Integer),
+    sa.Column('excused', sa.Integer),
+    sa.Column('updated_at', sa.DateTime(timezone=True)),
+)
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _month_index(m: date) -> int:
+    return m.year * 12 + m.month - 1
+
+
+def window_mask(month: date, start: date, end: date) -> int:
+    """Bits of ``month`` whose days fall inside ``start..end`` (inclusive)."""
+    first = start.day if month_start(start) == month else 1
+    last = end.day if month_start(end) == month else MONTH_BITS
+    if month < month_start(start) or month > month_start(end) or last < first:
+        return 0
+    return ((1 << last) - 1) & ~((1 << (first - 1)) - 1)
+
+
+def month_source(use_table: bool, start: date, end: date) -> sa.FromClause:
+    """(student_id, month, present, absent, late, excused) rows for months overlapping ``start..end``.
+
+    Reads ``attendance_month`` when it exists; otherwise builds the same masks
+    from ``attendance_events`` / ``attendance_student`` (student mark wins).
+    """
+    if use_table:
+        t = attendance_month
+        return (
+            select(t.c.student_id, t.c.month, t.c.present, t.c.absent, t.c.late, t.c.excused)
+            .where(t.c.month >= month_start(start), t.c.month <= month_start(end))
+        ).subquery('am')
+    ev = (
+        select(AttendanceEvent.student_id, AttendanceEvent.date, AttendanceEvent.present)
+        .where(AttendanceEvent.date >= start, AttendanceEvent.date <= end)
+    ).subquery('ev')
+    st = (
+        select(AttendanceStudent.student_id, AttendanceStudent.date, AttendanceStudent.status)
+        .where(AttendanceStudent.date >= start, AttendanceStudent.date <= end)
+    ).subquery('st')
+    day = func.coalesce(ev.c.date, st.c.date)
+    status = func.coalesce(st.c.status, case((ev.c.present == 1, 'present'), (ev.c.present == 0, 'absent')))
+    bit = sa.literal(1).op('<<')(sa.cast(sa.extract('day', day), sa.Integer) - 1)
+    student_id = func.coalesce(ev.c.student_id, st.c.student_id)
+    month = sa.cast(func.date_trunc('month', day), sa.Date)
+    return (
+        select(
+            student_id.label('student_id'),
+            month.label('month'),
+            *(func.coalesce(func.bit_or(bit).filter(status == s), 0).label(s) for s in STATUSES),
+        )
+        .select_from(ev.join(st, and_(st.c.student_id == ev.c.student_id, st.c.date == ev.c.date), full=True))
+        .group_by(student_id, month)
+    ).subquery('am')
+
+
+def windowed_counts(src: sa.FromClause, start: date, end: date) -> list:
+    """``sum(bit_count(mask & window))`` per status, labelled by status name.
+
+    Only the first and last month can be partial; every other month keeps all bits.
+    """
+    first, last = month_start(start), month_start(end)
+    w = case(
+        (src.c.month == first, window_mask(first, start, end)),
+        (src.c.month == last, window_mask(last, start, end)),
+        else_=-1,
+    )
+    return [
+        func.coalesce(func.sum(func.bit_count(sa.cast(src.c[s].op('&')(w), BIT(32)))), 0).label(s)
+        for s in STATUSES
+    ]
+
+
+def attendance_pct(present: int, absent: int, late: int) -> Optional[float]:
+    marked = present + absent + late
+    return round((present + late) * 100 / marked, 1) if marked else None
+
+
+def streaks(attended: int, missed: int) -> tuple[int, int]:
+    """(current, longest) runs of attended days not broken by a missed day.
+
+    Both arguments are day bitmaps, oldest day in bit 0; days in neither
+    (excused, unmarked, weekends) neither count nor break a streak.
+    """
+    current = (attended >> missed.bit_length()).bit_count()
+    longest, lo, rest = current, 0, missed
+    while rest:
+        hi = (rest & -rest).bit_length() - 1  # next missed day
+        longest = max(longest, ((attended >> lo) & ((1 << (hi - lo)) - 1)).bit_count())
+        lo, rest = hi + 1, rest & (rest - 1)
+    return current, longest
+
+
+def summarize(rows: Iterable[Sequence], start: date, end: date) -> dict:
+    """Counts, percentage and streaks for one student's ``(month, present, absent, late, excused)`` rows."""
+    rows = sorted(rows, key=lambda r: r[0])
+    base = _month_index(month_start(start))
+    totals = dict.fromkeys(STATUSES, 0)
+    attended = missed = 0
+    months = []
+    for month, *masks in rows:
+        w = window_mask(month, start, end)
+        bits = dict(zip(STATUSES, ((m or 0) & w for m in masks), strict=True))
+        counts = {s: b.bit_count() for s, b in bits.items()}
+        for s in STATUSES:
+            totals[s] += counts[s]
+        shift = (_month_index(month) - base) * MONTH_BITS
+        attended |= (bits['present'] | bits['late']) << shift
+        missed |= bits['absent'] << shift
+        months.append({'month': month.isoformat()[:7], **counts,
+                       'attendance_pct': attendance_pct(counts['present'], counts['absent'], counts['late'])})
+    current, longest = streaks(attended, missed)
+    return {
+        **totals,
+        'marked': totals['present'] + totals['absent'] + totals['late'],
+        'attendance_pct': attendance_pct(totals['present'], totals['absent'], totals['late']),
+        'current_streak': current,
+        'longest_streak': longest,
+        'months': months,
+    }
+
+
+def default_window(start: Optional[date], end: Optional[date], today: Optional[date] = None) -> tuple[date, date]:
+    """Missing bounds default to the trailing year ending today."""
+    end = end or today or date.today()
+    return start or end - timedelta(days=364), end
+
+
+async def rebuild(session: AsyncSession, start: date, end: date) -> int:
+    """Recompute every month overlapping ``start..end`` from the daily tables; returns rows changed."""
+    res = await session.execute(sa.text("SELECT attendance_month_rebuild(:f, :t)"), {'f': start, 't': end})
+    return int(res.scalar() or 0)
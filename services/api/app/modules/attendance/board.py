@@ -0,0 +1,222 @@
+"""Live attendance completion board (enrolled vs marked today, per class section).
+
+Principals used to poll /teacher/overview and /classes, re-running the
+enrollment x attendance joins on every refresh. Instead each API worker keeps
+one board in memory and pushes changes to its Server-Sent-Events subscribers:
+
+* a trigger on attendance_student (alembic_clean 20251018_0800) sends
+  ``NOTIFY attendance_board`` when a statement touches today's marks;
+* one listener per worker holds a pooled connection with ``LISTEN``; a burst of
+  notifications (a whole school submitting at 9:00) is coalesced for
+  ATTENDANCE_BOARD_DEBOUNCE_SEC into a single grouped recompute;
+* only classes whose counts moved are sent (``event: update``); new
+  subscribers, slow subscribers whose queue overflowed and the first refresh
+  of a new day get the whole board (``event: snapshot``).
+
+The board is also recomputed every ATTENDANCE_BOARD_REFRESH_SEC (every
+``_POLL_FALLBACK_SEC`` while the listener is down), so a missed notification
+costs staleness, not correctness. The listener starts with the first
+subscriber and stops when the last one disconnects, so workers nobody watches
+never hold the extra connection; one-off ``snapshot()`` calls on such a worker
+recompute the board instead.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import logging
+from datetime import date
+from typing import AsyncIterator, Optional
+
+import orjson
+from sqlalchemy import func, select
+
+from ...core.config import settings
+from ...core.db import SessionLocal, engine
+from ..core import models_new as core_models
+from .models import AttendanceStudent
+
+LOG = logging.getLogger("attendance.board")
+
+CHANNEL = 'attendance_board'
+HEARTBEAT_SEC = 15
+SUBSCRIBER_QUEUE = 32
+_POLL_FALLBACK_SEC = 5
+_LISTENER_CHECK_SEC = 5
+
+
+def board_stmt(day: date):
+    """One row per class section with enrolments: (class_section_id, grade, section, enrolled, marked)."""
+    e = core_models.Enrollment
+    enrolled = select(e.class_section_id, func.count().label('enrolled')).group_by(e.class_section_id).subquery('enrolled')
+    marked = (
+        select(e.class_section_id, func.count(func.distinct(AttendanceStudent.student_id)).label('marked'))
+        .select_from(AttendanceStudent)
+        .join(e, e.student_id == AttendanceStudent.student_id)
+        .where(AttendanceStudent.date == day)
+        .group_by(e.class_section_id)
+    ).subquery('marked')
+    cs = core_models.ClassSection
+    return (
+        select(
+            cs.id.label('class_section_id'),
+            cs.grade_label,
+            cs.section_label,
+            enrolled.c.enrolled,
+            func.coalesce(marked.c.marked, 0).label('marked'),
+        )
+        .join(enrolled, enrolled.c.class_section_id == cs.id)
+        .outerjoin(marked, marked.c.class_section_id == cs.id)
+        .order_by(cs.grade_label, cs.section_label)
+    )
+
+
+def board_row(r) -> dict:
+    pct = round(r.marked / r.enrolled * 100.0, 1) if r.enrolled else 0.0
+    return {
+        'class_section_id': r.class_section_id,
+        'grade_label': r.grade_label,
+        'section_label': r.section_label,
+        'enrolled': r.enrolled,
+        'marked': r.marked,
+        'percent_marked': pct,
+        'complete': bool(r.enrolled) and r.marked >= r.enrolled,
+    }
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+class AttendanceBoard:
+    def __init__(self):
+        self._rows: dict[int, dict] = {}
+        self._day: Optional[date] = None
+        self._subscribers: set[asyncio.Queue] = set()
+        self._dirty = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._listening = False
+
+    # ---- state ----
+    async def _load(self, day: date) -> list[dict]:
+        async with SessionLocal() as session:
+            return [board_row(r) for r in (await session.execute(board_stmt(day))).all()]
+
+    async def refresh(self, today: Optional[date] = None) -> None:
+        """Recompute the board and publish what changed."""
+        today = today or date.today()
+        async with self._lock:
+            rows = {r['class_section_id']: r for r in await self._load(today)}
+            new_day = today != self._day
+            changed = [r for cid, r in rows.items() if self._rows.get(cid) != r]
+            removed = [cid for cid in self._rows if cid not in rows]
+            self._rows, self._day = rows, today
+        if new_day:
+            self._publish('snapshot', self._snapshot_payload())
+        elif changed or removed:
+            self._publish('update', {'date': today.isoformat(), 'classes': changed, 'removed': removed})
+
+    def _snapshot_payload(self) -> dict:
+        return {'date': self._day.isoformat() if self._day else None, 'classes': list(self._rows.values())}
+
+    async def snapshot(self) -> dict:
+        """Current board: from memory while a stream keeps it live, otherwise recomputed."""
+        if self._task is None or self._task.done() or self._day != date.today():
+            await self.refresh()
+        return self._snapshot_payload()
+
+    def _publish(self, event: str, data: dict) -> None:
+        for q in list(self._subscribers):
+            if q.full():
+                # Slow client: drop its backlog and resync it with the whole board.
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait(('snapshot', self._snapshot_payload()))
+            else:
+                q.put_nowait((event, data))
+
+    # ---- subscribers ----
+    async def events(self) -> AsyncIterator[str]:
+        """SSE stream: one snapshot, then updates; a comment line every HEARTBEAT_SEC keeps proxies open."""
+        # Subscribe only after the initial snapshot: a cold refresh publishes one to existing subscribers.
+        # Nothing awaits between the two, so no update can fall in the gap.
+        payload = await self.snapshot()
+        q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self._subscribers.add(q)
+        self._ensure_started()
+        try:
+            yield sse('snapshot', payload)
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(q.get(), timeout=HEARTBEAT_SEC)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield sse(event, data)
+        finally:
+            self._subscribers.discard(q)
+            if not self._subscribers and self._task is not None:
+                # Last viewer gone: release the LISTEN connection and stop refreshing.
+                self._task.cancel()
+                self._task = None
+
+    # ---- background work ----
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="attendance-board")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._task
+            self._task = None
+        self._listening = False
+
+    def _on_notify(self, *_args) -> None:
+        self._dirty.set()
+
+    async def _run(self) -> None:
+        listener = asyncio.create_task(self._listen_forever(), name="attendance-board-listener")
+        try:
+            while True:
+                timeout = settings.attendance_board_refresh_sec if self._listening else _POLL_FALLBACK_SEC
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._dirty.wait(), timeout=timeout)
+                if self._dirty.is_set():
+                    await asyncio.sleep(settings.attendance_board_debounce_sec)
+                self._dirty.clear()
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    LOG.warning("attendance board refresh failed: %s", e)
+        finally:
+            listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await listener
+
+    async def _listen_forever(self) -> None:
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    await raw.add_listener(CHANNEL, self._on_notify)
+                    self._listening = True
+                    # Anything committed before LISTEN took effect is caught by one refresh.
+                    self._dirty.set()
+                    try:
+                        while not raw.is_closed():
+                            await asyncio.sleep(_LISTENER_CHECK_SEC)
+                    finally:
+                        with contextlib.suppress(Exception):
+                            await raw.remove_listener(CHANNEL, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LOG.warning("attendance board listener disconnected: %s", e)
+            finally:
+                self._listening = False
+            await asyncio.sleep(5)
+
+
+attendance_board = AttendanceBoard()
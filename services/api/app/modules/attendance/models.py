@@ -4,6 +4,7 @@ from datetime import datetime, date
 from ...core.db import Base
 
 class AttendanceStudent(Base):
+    # Range-partitioned by academic year in Postgres (alembic_clean 20251018_0600); the PK there is (id, date).
     __tablename__ = 'attendance_student'
     __table_args__ = (UniqueConstraint('student_id','date', name='uq_attendance_student_date'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
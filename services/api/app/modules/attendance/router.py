@@ -1,10 +1,22 @@
+from datetime import date as Date
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from ...core.security import require
 from ...core.db import get_session
+from ...core.exports import ExportFormat, export_response, export_select, pick_columns
+from ...core.replica import get_read_session
+from ...core.schema_registry import schema_registry
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, and_, case, func
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import StreamingResponse
+from ..students.models import Student
+from ..students.models_extra import AttendanceEvent
 from .models import AttendanceStudent
+from .board import attendance_board
+from .bitmap import BITMAP_TABLE, attendance_pct, default_window, month_source, summarize, windowed_counts
+from .service import upsert_mark
 
 router = APIRouter(prefix="/attendance", tags=["attendance"])
 
@@ -17,19 +29,147 @@ class AttendanceIn(BaseModel):
 async def mark_attendance(a: AttendanceIn, session: AsyncSession = Depends(get_session), user=Depends(require('attendance:mark'))):
     if a.status not in {"present","absent","late"}:
         raise HTTPException(422, "Invalid status")
-    result = await session.execute(select(AttendanceStudent).where(AttendanceStudent.student_id==a.student_id, AttendanceStudent.date==a.date))
-    existing = result.scalars().first()
-    if existing:
-        existing.status = a.status
-    else:
-        existing = AttendanceStudent(student_id=a.student_id, date=a.date, status=a.status)
-        session.add(existing)
-    await session.commit()
-    await session.refresh(existing)
-    return {"id": existing.id, "student_id": existing.student_id, "date": str(existing.date), "status": existing.status}
+    try:
+        day = Date.fromisoformat(a.date)
+    except ValueError:
+        raise HTTPException(422, "Invalid date") from None
+    try:
+        mark_id = await upsert_mark(session, a.student_id, day, a.status)
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(404, "Student not found") from None
+    return {"id": mark_id, "student_id": a.student_id, "date": str(day), "status": a.status}
 
 @router.get("/student/{student_id}")
 async def get_attendance(student_id: int, session: AsyncSession = Depends(get_session), user=Depends(require('attendance:view'))):
     result = await session.execute(select(AttendanceStudent).where(AttendanceStudent.student_id==student_id).order_by(AttendanceStudent.date.desc()))
     rows = result.scalars().all()
     return [ {"id": r.id, "student_id": r.student_id, "date": str(r.date), "status": r.status} for r in rows ]
+
+
+@router.get("/summary/student/{student_id}")
+async def student_attendance_summary(
+    student_id: int,
+    start: Optional[Date] = None,
+    end: Optional[Date] = None,
+    session: AsyncSession = Depends(get_read_session),
+    user=Depends(require('attendance:view')),
+):
+    """Counts, percentage, monthly breakdown and streaks for ``start..end`` (default: trailing year)."""
+    start, end = default_window(start, end)
+    if start > end:
+        raise HTTPException(422, "start must be on or before end")
+    await schema_registry.ensure_loaded(session)
+    src = month_source(schema_registry.has_table(BITMAP_TABLE), start, end)
+    rows = (await session.execute(
+        select(src.c.month, src.c.present, src.c.absent, src.c.late, src.c.excused).where(src.c.student_id == student_id)
+    )).all()
+    if not rows and (await session.get(Student, student_id)) is None:
+        raise HTTPException(404, "Student not found")
+    return {"student_id": student_id, "start": str(start), "end": str(end), **summarize(rows, start, end)}
+
+@router.get("/summary")
+async def attendance_summary(
+    start: Optional[Date] = None,
+    end: Optional[Date] = None,
+    klass: Optional[str] = None,
+    section: Optional[str] = None,
+    session: AsyncSession = Depends(get_read_session),
+    user=Depends(require('attendance:view')),
+):
+    """Per-student attendance percentages for a school/class over ``start..end`` (default: trailing year)."""
+    start, end = default_window(start, end)
+    if start > end:
+        raise HTTPException(422, "start must be on or before end")
+    await schema_registry.ensure_loaded(session)
+    src = month_source(schema_registry.has_table(BITMAP_TABLE), start, end)
+    stmt = (
+        select(Student.id, Student.first_name, Student.last_name, Student.class_.label('klass'), Student.section, *windowed_counts(src, start, end))
+        .select_from(src.join(Student, Student.id == src.c.student_id))
+        .group_by(Student.id)
+        .order_by(Student.class_, Student.section, Student.roll, Student.id)
+    )
+    if klass:
+        stmt = stmt.where(Student.class_ == klass)
+    if section:
+        stmt = stmt.where(Student.section == section)
+    totals = {"present": 0, "absent": 0, "late": 0, "excused": 0}
+    students = []
+    for r in (await session.execute(stmt)).all():
+        counts = {"present": int(r.present), "absent": int(r.absent), "late": int(r.late), "excused": int(r.excused)}
+        for k, v in counts.items():
+            totals[k] += v
+        students.append({
+            "student_id": r.id, "first_name": r.first_name, "last_name": r.last_name,
+            "class": r.klass, "section": r.section, **counts,
+            "attendance_pct": attendance_pct(counts["present"], counts["absent"], counts["late"]),
+        })
+    return {
+        "start": str(start), "end": str(end),
+        "totals": {**totals, "attendance_pct": attendance_pct(totals["present"], totals["absent"], totals["late"])},
+        "students": students,
+    }
+
+
+@router.get("/board")
+async def attendance_board_snapshot(user=Depends(require('attendance:view'))):
+    """Today's per-class completion (enrolled vs marked) from this worker's in-memory board."""
+    return await attendance_board.snapshot()
+
+@router.get("/board/stream")
+async def attendance_board_stream(user=Depends(require('attendance:view'))):
+    """Server-sent events: ``snapshot`` with every class, then ``update`` with the classes whose counts moved."""
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return StreamingResponse(attendance_board.events(), media_type='text/event-stream', headers=headers)
+
+
+def _history_export(start: Optional[Date], end: Optional[Date]):
+    """Columns + FROM for one row per (student, day) across both attendance stores.
+
+    ``attendance_student`` (present/absent/late marks) wins over the 0/1
+    ``attendance_events`` row for the same day.
+    """
+    ev = select(AttendanceEvent.student_id, AttendanceEvent.date, AttendanceEvent.present)
+    st = select(AttendanceStudent.student_id, AttendanceStudent.date, AttendanceStudent.status)
+    if start:
+        ev, st = ev.where(AttendanceEvent.date >= start), st.where(AttendanceStudent.date >= start)
+    if end:
+        ev, st = ev.where(AttendanceEvent.date <= end), st.where(AttendanceStudent.date <= end)
+    ev, st = ev.subquery('ev'), st.subquery('st')
+    days = ev.join(st, and_(st.c.student_id == ev.c.student_id, st.c.date == ev.c.date), full=True)
+    student_id = func.coalesce(ev.c.student_id, st.c.student_id)
+    columns = {
+        'date': func.coalesce(ev.c.date, st.c.date),
+        'student_id': student_id,
+        'first_name': Student.first_name,
+        'last_name': Student.last_name,
+        'class': Student.class_,
+        'section': Student.section,
+        'roll': Student.roll,
+        'status': func.coalesce(st.c.status, case((ev.c.present == 1, 'present'), (ev.c.present == 0, 'absent'))),
+    }
+    return columns, days.join(Student, Student.id == student_id)
+
+@router.get("/export")
+async def export_attendance(
+    format: ExportFormat = ExportFormat.csv,
+    columns: Optional[str] = None,
+    start: Optional[Date] = None,
+    end: Optional[Date] = None,
+    student_id: Optional[int] = None,
+    klass: Optional[str] = None,
+    section: Optional[str] = None,
+    user=Depends(require('attendance:view')),
+):
+    """Stream attendance history (one row per student-day) as CSV/XLSX/Parquet."""
+    available, source = _history_export(start, end)
+    stmt = export_select(available, pick_columns(available, columns)).select_from(source)
+    if student_id is not None:
+        stmt = stmt.where(Student.id == student_id)
+    if klass:
+        stmt = stmt.where(Student.class_ == klass)
+    if section:
+        stmt = stmt.where(Student.section == section)
+    stmt = stmt.order_by(available['date'], Student.class_, Student.section, Student.roll, Student.id)
+    return export_response(stmt, format, 'attendance')
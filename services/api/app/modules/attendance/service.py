@@ -0,0 +1,90 @@
+"""Attendance write path shared by /attendance/student, /attendance/bulk and the teacher class sheet.
+
+Every write is one ``INSERT ... SELECT FROM unnest(...) ON CONFLICT (student_id,
+date) DO UPDATE`` per MAX_BATCH marks, so a 40-student class or a 3,000-student
+school day costs one round trip instead of one (or three) per student:
+
+* marks are deduplicated on (student_id, date), last one wins (Postgres cannot
+  update the same row twice in one statement);
+* rows whose status is unchanged are not rewritten (no dead tuples, no trigger
+  work for the class_daily_stats rollup);
+* marks for student ids that do not exist are skipped and reported (count and
+  ids) instead of failing the whole batch on the foreign key.
+
+Callers validate statuses and commit.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAX_BATCH = 10_000
+
+_UPSERT = text("""
+    WITH v AS (
+        SELECT * FROM unnest(CAST(:student_ids AS int[]), CAST(:dates AS date[]), CAST(:statuses AS text[]))
+            AS v(student_id, date, status)
+    ), known AS (
+        SELECT v.* FROM v WHERE EXISTS (SELECT 1 FROM students s WHERE s.id = v.student_id)
+    ), w AS (
+        INSERT INTO attendance_student AS a (student_id, date, status, created_at)
+        SELECT student_id, date, status, now() FROM known
+        ON CONFLICT (student_id, date) DO UPDATE SET status = EXCLUDED.status
+        WHERE a.status IS DISTINCT FROM EXCLUDED.status
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT count(*) FILTER (WHERE inserted) AS inserted,
+           count(*) FILTER (WHERE NOT inserted) AS updated,
+           (SELECT count(*) FROM v) - (SELECT count(*) FROM known) AS skipped,
+           ARRAY(SELECT DISTINCT v.student_id FROM v
+                 WHERE NOT EXISTS (SELECT 1 FROM known k WHERE k.student_id = v.student_id)) AS skipped_ids
+    FROM w
+""")
+
+_UPSERT_ONE = text("""
+    INSERT INTO attendance_student AS a (student_id, date, status, created_at)
+    VALUES (:student_id, :date, :status, now())
+    ON CONFLICT (student_id, date) DO UPDATE SET status = EXCLUDED.status
+    RETURNING a.id
+""")
+
+
+@dataclass
+class MarkResult:
+    processed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0  # marks for unknown student ids
+    skipped_ids: set[int] = field(default_factory=set)
+
+    @property
+    def unchanged(self) -> int:
+        return self.processed - self.inserted - self.updated - self.skipped
+
+
+async def upsert_marks(session: AsyncSession, marks: Iterable[tuple[int, date, str]]) -> MarkResult:
+    """Write ``(student_id, date, status)`` marks; one statement per MAX_BATCH distinct marks."""
+    latest = {(sid, day): status for sid, day, status in marks}
+    items = list(latest.items())
+    result = MarkResult(processed=len(items))
+    for start in range(0, len(items), MAX_BATCH):
+        chunk = items[start:start + MAX_BATCH]
+        row = (await session.execute(_UPSERT, {
+            'student_ids': [k[0] for k, _ in chunk],
+            'dates': [k[1] for k, _ in chunk],
+            'statuses': [s for _, s in chunk],
+        })).one()
+        result.inserted += row.inserted
+        result.updated += row.updated
+        result.skipped += row.skipped
+        result.skipped_ids.update(row.skipped_ids or ())
+    return result
+
+
+async def upsert_mark(session: AsyncSession, student_id: int, day: date, status: str) -> int:
+    """Write a single mark and return its row id (one round trip)."""
+    res = await session.execute(_UPSERT_ONE, {'student_id': student_id, 'date': day, 'status': status})
+    return res.scalar_one()
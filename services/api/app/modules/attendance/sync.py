@@ -0,0 +1,107 @@
+"""Delta sync for offline-capable teacher clients.
+
+``POST /teacher/class/{id}/attendance/sync`` takes the client's last token and
+its queued marks and answers with everything that changed for the class since
+that token, so a reconnect costs the deltas instead of the roster:
+
+* tokens are ``"<class_section_id>.<seq>"`` over the per-class counter kept by
+  the attendance_sync triggers (alembic_clean 20251018_0700); the new token is
+  read *before* the changes so a write committing in between is picked up by
+  the next sync instead of being skipped;
+* queued marks go through ``service.upsert_marks``; replaying them is a no-op.
+  A mark whose row another device changed after the client's token (to a
+  different status) is not applied: it comes back as a conflict and the server
+  row is in ``changes``;
+* an unknown, foreign or future token (or a database without the sync tables)
+  gets ``reset: true`` and the full window of marks.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+SYNC_TABLE = 'attendance_sync'
+
+_LAST_SEQ = text("SELECT last_seq FROM attendance_sync_class WHERE class_section_id = :c")
+
+_CHANGES = text("""
+    SELECT student_id, date, status, seq FROM attendance_sync
+    WHERE class_section_id = :c AND seq > :since AND seq <= :upto AND date >= :start
+    ORDER BY seq
+""")
+
+_CONFLICTS = text("""
+    SELECT s.student_id, s.date, s.status
+    FROM unnest(CAST(:student_ids AS int[]), CAST(:dates AS date[]), CAST(:statuses AS text[])) AS m(student_id, date, status)
+    JOIN attendance_sync s ON s.class_section_id = :c AND s.student_id = m.student_id AND s.date = m.date
+    WHERE s.seq > :since AND s.status IS DISTINCT FROM m.status
+""")
+
+# No sync tables (or a reset): the class's current marks in the window.
+_SNAPSHOT = text("""
+    SELECT a.student_id, a.date, a.status, NULL AS seq
+    FROM attendance_student a
+    WHERE a.date >= :start
+      AND a.student_id IN (SELECT e.student_id FROM academics.enrollment e WHERE e.class_section_id = :c)
+    ORDER BY a.date, a.student_id
+""")
+
+
+def format_token(class_section_id: int, seq: int) -> str:
+    return f"{class_section_id}.{seq}"
+
+
+def parse_token(token: Optional[str], class_section_id: int) -> Optional[int]:
+    """The seq in ``token`` if it was issued for this class, else None."""
+    if not token:
+        return None
+    cls, _, seq = token.partition('.')
+    if cls != str(class_section_id) or not seq.isdigit():
+        return None
+    return int(seq)
+
+
+@dataclass
+class SyncResult:
+    token: Optional[str]
+    reset: bool
+    changes: list[dict] = field(default_factory=list)
+    conflicts: list[dict] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {'token': self.token, 'reset': self.reset, 'changes': self.changes, 'conflicts': self.conflicts}
+
+
+def _rows(rows) -> list[dict]:
+    return [{'student_id': r.student_id, 'date': r.date.isoformat(), 'status': r.status, 'seq': r.seq} for r in rows]
+
+
+async def conflicting_marks(
+    session: AsyncSession, class_section_id: int, since: int, marks: Sequence[tuple[int, date, str]],
+) -> set[tuple[int, date]]:
+    """(student_id, date) of ``marks`` whose server row changed to another status after ``since``."""
+    if not marks:
+        return set()
+    rows = (await session.execute(_CONFLICTS, {
+        'c': class_section_id, 'since': since,
+        'student_ids': [m[0] for m in marks], 'dates': [m[1] for m in marks], 'statuses': [m[2] for m in marks],
+    })).all()
+    return {(r.student_id, r.date) for r in rows}
+
+
+async def changes_since(
+    session: AsyncSession, class_section_id: int, since: Optional[int], start: date, tracked: bool = True,
+) -> SyncResult:
+    """Marks changed after ``since`` (or the whole window on reset) plus the token to send next time."""
+    upto = (await session.execute(_LAST_SEQ, {'c': class_section_id})).scalar() if tracked else None
+    if upto is None:
+        upto = 0
+    if not tracked or since is None or since > upto:
+        rows = (await session.execute(_SNAPSHOT, {'c': class_section_id, 'start': start})).all()
+        token = format_token(class_section_id, upto) if tracked else None
+        return SyncResult(token=token, reset=True, changes=_rows(rows))
+    rows = (await session.execute(_CHANGES, {'c': class_section_id, 'since': since, 'upto': upto, 'start': start})).all()
+    return SyncResult(token=format_token(class_section_id, upto), reset=False, changes=_rows(rows))
@@ -1,5 +1,5 @@
 import os, time, secrets
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
 import redis
 import jwt
@@ -7,6 +7,7 @@ from sqlalchemy import select, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from ...core.db import get_session, Base
 from ...core.config import settings
+from ...core.ratelimit import RateLimiter, client_ip
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy import Integer, String, DateTime
 from datetime import datetime
@@ -21,6 +22,11 @@ REFRESH_TTL = 60 * 60 * 24 * 15  # 15 days
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# OTP abuse caps: SMS cost / enumeration per phone and per client IP, and code guessing on verify.
+OTP_START_PHONE_LIMIT = RateLimiter('auth.otp.phone', limit=5, window=900)
+OTP_START_IP_LIMIT = RateLimiter('auth.otp.ip', limit=20, window=900)
+OTP_VERIFY_LIMIT = RateLimiter('auth.verify.phone', limit=10, window=900)
+
 class OTPStart(BaseModel):
     phone: str
 
@@ -35,7 +41,9 @@ class TokenOut(BaseModel):
     refresh_token: Optional[str] = None
 
 @router.post("/otp")
-async def start_otp(body: OTPStart):
+async def start_otp(body: OTPStart, request: Request, response: Response):
+    await OTP_START_IP_LIMIT.check(f"ip:{client_ip(request)}", response)
+    await OTP_START_PHONE_LIMIT.check(f"phone:{body.phone}", response)
     code = os.getenv("DEV_OTP", "123456") if settings.env == 'dev' else f"{secrets.randbelow(1000000):06d}"
     _r.set(f"otp:{body.phone}", code, ex=OTP_TTL)
     # TODO: integrate real SMS/WhatsApp send
@@ -63,7 +71,8 @@ import hashlib
 from sqlalchemy import text
 
 @router.post("/verify", response_model=TokenOut)
-async def verify(body: OTPVerify, session: AsyncSession = Depends(get_session)):
+async def verify(body: OTPVerify, response: Response, session: AsyncSession = Depends(get_session)):
+    await OTP_VERIFY_LIMIT.check(f"phone:{body.phone}", response)
     cached = _r.get(f"otp:{body.phone}")
     if not cached or cached != body.code:
         raise HTTPException(401, "Invalid or expired code")
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy import text
 from uuid import UUID
 from typing import Optional  # Python 3.9 compatibility
 from app.core.dependencies import get_db, get_current_user  # assumed existing
+from app.core.ratelimit import RateLimiter, caller_identity
+from app.core.security import CurrentUser, get_optional_user
 from . import schemas, models
 
 router = APIRouter(prefix="/chat", tags=["chat"])
@@ -184,27 +186,13 @@ async def websocket_chat(conversation_id: UUID, ws: WebSocket):
 
 _FTS_LANGS = {"english","simple"}
 _MAX_QUERY_LEN = 120
-_RATE_BUCKET: dict[int, list[float]] = {}
-_RATE_WINDOW = 60.0  # seconds
-_RATE_MAX = 30       # max searches per window per user
-
-def _rate_check(user_id: int, now: float):
-    bucket = _RATE_BUCKET.setdefault(user_id, [])
-    # prune
-    cutoff = now - _RATE_WINDOW
-    while bucket and bucket[0] < cutoff:
-        bucket.pop(0)
-    if len(bucket) >= _RATE_MAX:
-        return False
-    bucket.append(now)
-    return True
+SEARCH_LIMIT = RateLimiter('chat.search', limit=30, window=60)  # per user
 
 @router.get("/search/messages", response_model=list[schemas.MessageSearchResult])
-async def search_messages(q: str, conversation_id: Optional[UUID] = None, limit: int = 50, lang: str = "english", db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+async def search_messages(q: str, request: Request, response: Response, conversation_id: Optional[UUID] = None, limit: int = 50, lang: str = "english", db: AsyncSession = Depends(get_db), user=Depends(get_current_user), caller: Optional[CurrentUser] = Depends(get_optional_user)):
     """Full-text search over messages body (websearch syntax).
     Guards: length, rate limit, allowed language, soft-delete filtered.
     """
-    import time as _t
     if not q or not q.strip():
         raise HTTPException(status_code=400, detail="Empty query")
     if len(q) > _MAX_QUERY_LEN:
@@ -212,8 +200,7 @@ async def search_messages(q: str, conversation_id: Optional[UUID] = None, limit:
     lang = lang.lower()
     if lang not in _FTS_LANGS:
         raise HTTPException(status_code=400, detail="Unsupported language")
-    if not _rate_check(user.id, _t.time()):
-        raise HTTPException(status_code=429, detail="Search rate exceeded")
+    await SEARCH_LIMIT.check(caller_identity(request, caller), response)
     base = f"""
         select m.id, m.conversation_id, m.sender_id, m.sequence, m.created_at,
                ts_headline(:lang, m.body, websearch_to_tsquery(:lang, :q)) as snippet,
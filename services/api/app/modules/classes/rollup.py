@@ -0,0 +1,108 @@
+"""Read side of the ``class_daily_stats`` rollup.
+
+The table and its maintenance (triggers + reconcile function) live in
+alembic_clean/versions/20251018_0300_class_daily_stats.py. It is declared on its
+own MetaData so ``Base.metadata.create_all`` never creates it without the
+triggers that keep it correct; callers check ``schema_registry`` first.
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Optional
+
+import sqlalchemy as sa
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import ClassTeacher
+
+ROLLUP_TABLE = 'class_daily_stats'
+
+_metadata = sa.MetaData()
+
+class_daily_stats = sa.Table(
+    ROLLUP_TABLE, _metadata,
+    sa.Column('grade', sa.Text, primary_key=True),
+    sa.Column('section', sa.Text, primary_key=True),
+    sa.Column('day', sa.Date, primary_key=True),
+    sa.Column('enrolled', sa.Integer),
+    sa.Column('male', sa.Integer),
+    sa.Column('female', sa.Integer),
+    sa.Column('present', sa.Integer),
+    sa.Column('absent', sa.Integer),
+    sa.Column('late', sa.Integer),
+    sa.Column('fee_due_count', sa.Integer),
+    sa.Column('fee_due_amount', sa.BigInteger),
+    sa.Column('updated_at', sa.DateTime(timezone=True)),
+)
+
+
+def class_rows_query(
+    grade: Optional[str],
+    section: Optional[str],
+    attendance_days: int,
+    limit: int,
+    offset: int,
+    today: Optional[date] = None,
+):
+    """Per-class list rows from the rollup, same column order as the legacy /classes query.
+
+    State (enrolled, gender split, fees) is the latest row on or before today;
+    attendance_pct is present / marked over the trailing ``attendance_days``.
+    Reads O(classes x days) rollup rows regardless of student or event volume.
+    """
+    today = today or date.today()
+    t = class_daily_stats
+    scope = [t.c.day <= today]
+    if grade is not None:
+        scope.append(t.c.grade == grade)
+    if section is not None:
+        scope.append(t.c.section == section)
+
+    latest = (
+        select(t.c.grade, t.c.section, t.c.enrolled, t.c.male, t.c.female, t.c.fee_due_count, t.c.fee_due_amount)
+        .where(*scope)
+        .distinct(t.c.grade, t.c.section)
+        .order_by(t.c.grade, t.c.section, t.c.day.desc())
+    ).cte('latest')
+
+    att = (
+        select(
+            t.c.grade,
+            t.c.section,
+            func.sum(t.c.present).label('present'),
+            func.sum(t.c.present + t.c.absent).label('marked'),
+        )
+        .where(*scope, t.c.day > today - timedelta(days=attendance_days))
+        .group_by(t.c.grade, t.c.section)
+    ).cte('att')
+
+    teacher = select(sa.cast(ClassTeacher.grade, sa.String).label('grade'), ClassTeacher.section, ClassTeacher.teacher_name).cte('teacher')
+
+    return (
+        select(
+            latest.c.grade,
+            latest.c.section,
+            latest.c.enrolled,
+            latest.c.male,
+            latest.c.female,
+            func.coalesce((att.c.present * 100 / func.nullif(att.c.marked, 0)).cast(sa.Integer), 0),
+            latest.c.fee_due_count,
+            latest.c.fee_due_amount,
+            teacher.c.teacher_name,
+        )
+        .select_from(
+            latest
+            .outerjoin(att, sa.and_(att.c.grade == latest.c.grade, att.c.section == latest.c.section))
+            .outerjoin(teacher, sa.and_(teacher.c.grade == latest.c.grade, teacher.c.section == latest.c.section))
+        )
+        .where(latest.c.enrolled > 0)
+        .order_by(sa.cast(latest.c.grade, sa.Integer).asc(), latest.c.section.asc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+async def reconcile(session: AsyncSession, start: date, end: date) -> int:
+    """Recompute rollup rows for ``start..end`` (and today's state); returns rows changed."""
+    res = await session.execute(sa.text("SELECT class_daily_stats_reconcile(:f, :t)"), {'f': start, 't': end})
+    return int(res.scalar() or 0)
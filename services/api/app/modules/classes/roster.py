@@ -0,0 +1,128 @@
+"""Class detail (``GET /classes/{id}``) statements and the roster cache.
+
+A detail response is built from one statement: a one-row header (teacher,
+result status, attendance) LEFT JOINed to the roster, where each student's tags
+and outstanding fees come from LATERAL subqueries. The rendered roster part
+(students, gender split, fee totals) is cached per class; on a cache hit only
+the header statement runs, so every request is a single round trip.
+
+Roster entries are tagged ``roster:{grade}-{section}`` plus ``student:{id}`` for
+each member. Writers call ``invalidate_rosters`` with the students they touched
+(tags, fees) and the classes whose membership changed (enrolment, moves).
+ROSTER_CACHE_TTL_SEC bounds staleness for writes made outside the API.
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Optional
+
+import sqlalchemy as sa
+from sqlalchemy import select, func, case
+
+from ..students.models import Student
+from ..students.models_extra import AttendanceEvent, FeeInvoice, StudentTag
+from .models import ClassStatus, ClassTeacher
+from ...core.cache import cache
+
+ROSTER_CACHE_TTL_SEC = 60
+
+
+def roster_tag(grade: Any, section: Any) -> str:
+    return f"roster:{grade}-{section}"
+
+
+def student_tag(student_id: int) -> str:
+    return f"student:{student_id}"
+
+
+async def invalidate_rosters(student_ids: Iterable[int] = (), classes: Iterable[tuple[Optional[str], Optional[str]]] = ()) -> None:
+    """Drop cached rosters containing ``student_ids`` and those of ``classes`` ((grade, section) pairs)."""
+    tags = [student_tag(sid) for sid in student_ids]
+    tags += [roster_tag(g, s) for g, s in classes if g and s]
+    await cache.invalidate(*tags)
+
+
+def class_header_stmt(grade: int, section: str):
+    """One row: class_teacher, result_status, attendance_pct (all-time, over the current roster)."""
+    members = select(Student.id).where(Student.class_ == str(grade), Student.section == section)
+    attendance = (
+        select(func.coalesce(((func.sum(case((AttendanceEvent.present == 1, 1), else_=0)) * 100)
+                              / func.nullif(func.count(AttendanceEvent.id), 0)).cast(sa.Integer), 0))
+        .where(AttendanceEvent.student_id.in_(members))
+        .scalar_subquery()
+    )
+    teacher = select(ClassTeacher.teacher_name).where(ClassTeacher.grade == grade, ClassTeacher.section == section).limit(1).scalar_subquery()
+    status = select(ClassStatus.result_status).where(ClassStatus.grade == grade, ClassStatus.section == section).limit(1).scalar_subquery()
+    return select(
+        teacher.label('class_teacher'),
+        func.coalesce(status, 'Pending').label('result_status'),
+        attendance.label('attendance_pct'),
+    )
+
+
+def class_detail_stmt(grade: int, section: str):
+    """Header columns + one row per student (or a single row with NULL student columns for an empty class)."""
+    header = class_header_stmt(grade, section).subquery('hdr')
+    tags = (
+        select(func.array_agg(StudentTag.tag).label('tags'))
+        .where(StudentTag.student_id == Student.id)
+        .correlate(Student)
+        .lateral('t')
+    )
+    outstanding = FeeInvoice.amount - FeeInvoice.paid_amount
+    fees = (
+        select(
+            func.coalesce(func.sum(outstanding), 0).label('due'),
+            func.count().filter(outstanding > 0).label('due_n'),
+        )
+        .where(FeeInvoice.student_id == Student.id, FeeInvoice.settled_at.is_(None))
+        .correlate(Student)
+        .lateral('f')
+    )
+    roster = (
+        select(
+            Student.id.label('student_id'), Student.first_name, Student.last_name, Student.guardian_phone,
+            Student.roll, Student.gender, tags.c.tags, fees.c.due, fees.c.due_n,
+        )
+        .select_from(Student)
+        .outerjoin(tags, sa.true())
+        .outerjoin(fees, sa.true())
+        .where(Student.class_ == str(grade), Student.section == section)
+    ).subquery('roster')
+    return (
+        select(header, roster)
+        .select_from(header.outerjoin(roster, sa.true()))
+        .order_by(roster.c.roll.asc().nulls_last(), roster.c.student_id.asc())
+    )
+
+
+def roster_payload(rows) -> dict:
+    """JSON-able roster summary cached per class (same shape in the local and Redis tiers)."""
+    students = []
+    male = female = fee_due_count = fee_due_amount = 0
+    for r in rows:
+        if r.student_id is None:
+            continue
+        gender = (r.gender or '').upper()
+        male += gender == 'M'
+        female += gender == 'F'
+        due = int(r.due or 0)
+        fee_due_amount += due
+        fee_due_count += bool(r.due_n)
+        students.append({
+            'student_id': r.student_id,
+            'name': ' '.join([p for p in [r.first_name, r.last_name] if p]),
+            'roll': r.roll,
+            'guardian_phone': r.guardian_phone,
+            'tags': list(r.tags or []),
+            'fee_due_amount': due,
+        })
+    return {
+        'students': students,
+        'male': male,
+        'female': female,
+        'fee_due_count': fee_due_count,
+        'fee_due_amount': fee_due_amount,
+    }
+
+
+def roster_tags(grade: int, section: str, payload: dict) -> list[str]:
+    return [roster_tag(grade, section)] + [student_tag(s['student_id']) for s in payload['students']]
@@ -6,13 +6,18 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, literal, case
 import sqlalchemy as sa
 from ..students.models import Student
-from ..students.models_extra import AttendanceEvent, FeeInvoice, StudentTag
+from ..students.models_extra import AttendanceEvent, FeeInvoice
 from .models import ClassStatus, ClassTeacher, HeadMistress
 from .models_tasks import ClassTask, ClassNote
-from sqlalchemy.exc import ProgrammingError
-from ...core.db import get_session
+from .rollup import ROLLUP_TABLE, class_rows_query
+from .roster import ROSTER_CACHE_TTL_SEC, class_detail_stmt, class_header_stmt, roster_payload, roster_tags
+from ...core.bulk import upsert_rows
+from ...core.cache import cache, cache_key
+from ...core.db import SessionLocal, get_session
+from ...core.replica import get_read_session
+from ...core.schema_registry import schema_registry
 from ...core.security import require
-from datetime import datetime
+from datetime import datetime, date, timedelta
 
 router = APIRouter(prefix="/classes", tags=["classes"])
 
@@ -87,30 +92,31 @@ class NoteUpdate(BaseModel):
     text: str
 
 async def _ensure_task_tables(session: AsyncSession):
-    try:
-        await session.execute(sa.text("SELECT 1 FROM class_tasks LIMIT 1"))
-        await session.execute(sa.text("SELECT 1 FROM class_notes LIMIT 1"))
-    except ProgrammingError:
-        await session.rollback()
-        await session.execute(sa.text("""
-        CREATE TABLE IF NOT EXISTS class_tasks (
-            id SERIAL PRIMARY KEY,
-            grade TEXT NOT NULL,
-            section VARCHAR(5) NOT NULL,
-            text VARCHAR(300) NOT NULL,
-            due DATE NULL,
-            status VARCHAR(12) NOT NULL DEFAULT 'Open'
-        );
-        CREATE INDEX IF NOT EXISTS idx_class_tasks_grade_section ON class_tasks(grade, section);
-        CREATE TABLE IF NOT EXISTS class_notes (
-            id SERIAL PRIMARY KEY,
-            grade TEXT NOT NULL,
-            section VARCHAR(5) NOT NULL,
-            text VARCHAR(500) NOT NULL
-        );
-        CREATE INDEX IF NOT EXISTS idx_class_notes_grade_section ON class_notes(grade, section);
-        """))
-        await session.commit()
+    # Capability check is in-memory (registry loaded at startup); DDL only on legacy DBs.
+    await schema_registry.ensure_loaded(session)
+    if schema_registry.has_table('class_tasks') and schema_registry.has_table('class_notes'):
+        return
+    await session.execute(sa.text("""
+    CREATE TABLE IF NOT EXISTS class_tasks (
+        id SERIAL PRIMARY KEY,
+        grade TEXT NOT NULL,
+        section VARCHAR(5) NOT NULL,
+        text VARCHAR(300) NOT NULL,
+        due DATE NULL,
+        status VARCHAR(12) NOT NULL DEFAULT 'Open'
+    );
+    CREATE INDEX IF NOT EXISTS idx_class_tasks_grade_section ON class_tasks(grade, section);
+    CREATE TABLE IF NOT EXISTS class_notes (
+        id SERIAL PRIMARY KEY,
+        grade TEXT NOT NULL,
+        section VARCHAR(5) NOT NULL,
+        text VARCHAR(500) NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_class_notes_grade_section ON class_notes(grade, section);
+    """))
+    await session.commit()
+    schema_registry.note_table('class_tasks', ['id', 'grade', 'section', 'text', 'due', 'status'])
+    schema_registry.note_table('class_notes', ['id', 'grade', 'section', 'text'])
 
 # ---------------- Tasks & Notes CRUD ----------------
 class TaskOut(BaseModel):
@@ -209,13 +215,19 @@ async def _class_status_map(session: AsyncSession) -> dict[tuple[str,str], str]:
 
 @router.get("", response_model=List[ClassListResponse])
 async def list_classes(
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
     user=Depends(require('classes:list')),
     grade: Optional[str] = Query(None, min_length=1),
     section: Optional[str] = Query(None, min_length=1, max_length=2),
     limit: int = Query(100, ge=1, le=500),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    attendance_days: int = Query(30, ge=1, le=366, description="Trailing window for attendance_pct"),
 ):
+    await schema_registry.ensure_loaded(session)
+    if schema_registry.has_table(ROLLUP_TABLE):
+        rows = (await session.execute(class_rows_query(grade, section, attendance_days, limit, offset))).all()
+        return await _class_list_rows(session, rows)
+
     stu = Student
     # Base filtered students
     conditions = [stu.class_.isnot(None), stu.section.isnot(None)]
@@ -243,7 +255,8 @@ async def list_classes(
                           func.nullif(func.count(AttendanceEvent.id),0)).cast(sa.Integer),0).label('attendance_pct')
         )
         .select_from(base_cte.join(stu, sa.and_(stu.class_==base_cte.c.grade, stu.section==base_cte.c.section))
-                     .join(AttendanceEvent, AttendanceEvent.student_id==stu.id, isouter=True))
+                     .join(AttendanceEvent, sa.and_(AttendanceEvent.student_id==stu.id,
+                                                    AttendanceEvent.date > date.today() - timedelta(days=attendance_days)), isouter=True))
         .group_by(base_cte.c.grade, base_cte.c.section)
     ).cte('att')
 
@@ -285,6 +298,9 @@ async def list_classes(
         .offset(offset)
     )
     rows = (await session.execute(query)).all()
+    return await _class_list_rows(session, rows)
+
+async def _class_list_rows(session: AsyncSession, rows) -> List[ClassListResponse]:
     status_map = await _class_status_map(session)
     out: List[ClassListResponse] = []
     for grade_val, section_val, total, male, female, att_pct, fee_due_count, fee_due_amt, teacher_name in rows:
@@ -316,80 +332,39 @@ async def get_class(class_id: str, session: AsyncSession = Depends(get_session),
         grade_int = int(grade_part)
     except Exception:
         raise HTTPException(400, 'Invalid class_id format')
-    stu = Student
-    # Roster
-    roster_stmt = select(stu.id, stu.first_name, stu.last_name, stu.guardian_phone, stu.roll, stu.gender).where(stu.class_==str(grade_int), stu.section==section).order_by(stu.roll.asc().nulls_last(), stu.id.asc())
-    roster_rows = (await session.execute(roster_stmt)).all()
-    if not roster_rows:
-        # Ensure we still return metadata if status row exists
-        status_map = await _class_status_map(session)
-        result_status = status_map.get((grade_int, section), 'Pending')
-        # class teacher lookup
-        teacher_row = (await session.execute(select(ClassTeacher.teacher_name).where(ClassTeacher.grade==grade_int, ClassTeacher.section==section))).scalar_one_or_none()
-        return ClassDetail(
-            id=f"{grade_int}{section}",
-            grade=grade_int,
-            section=section,
-            class_teacher=teacher_row,
-            total=0, male=0, female=0,
-            attendance_pct=0,
-            fee_due_count=0,
-            fee_due_amount=0,
-            result_status=result_status,
-            roster=[],
-            generated_at=datetime.utcnow().isoformat()+"Z"
-        )
-    student_ids = [r[0] for r in roster_rows]
-    # derive male/female counts from roster rows
-    male = sum(1 for r in roster_rows if (r[5] or '').upper()=='M')
-    female = sum(1 for r in roster_rows if (r[5] or '').upper()=='F')
-    # Attendance aggregate
-    att_stmt = select(
-        func.coalesce(((func.sum(case((AttendanceEvent.present==1,1), else_=0))*100)/func.nullif(func.count(AttendanceEvent.id),0)).cast(sa.Integer),0)
-    ).where(AttendanceEvent.student_id.in_(student_ids))
-    attendance_pct = (await session.execute(att_stmt)).scalar() or 0
-    # Fee aggregate
-    fee_sum_stmt = select(
-        func.coalesce(func.sum(FeeInvoice.amount - FeeInvoice.paid_amount),0),
-        func.count(sa.distinct(sa.case((FeeInvoice.amount - FeeInvoice.paid_amount > 0, FeeInvoice.student_id), else_=None)))
-    ).where(FeeInvoice.student_id.in_(student_ids), FeeInvoice.settled_at.is_(None))
-    fee_sum, fee_due_count = (await session.execute(fee_sum_stmt)).one()
-    status_map = await _class_status_map(session)
-    result_status = status_map.get((grade_int, section), 'Pending')
-    teacher_row = (await session.execute(select(ClassTeacher.teacher_name).where(ClassTeacher.grade==grade_int, ClassTeacher.section==section))).scalar_one_or_none()
-    # Tag map
-    tag_rows = (await session.execute(select(StudentTag.student_id, StudentTag.tag).where(StudentTag.student_id.in_(student_ids)))).all()
-    tag_map: dict[int, list[str]] = {}
-    for sid, tag in tag_rows:
-        tag_map.setdefault(sid, []).append(tag)
-    # Fee per student
-    per_fee_stmt = select(FeeInvoice.student_id, func.coalesce(func.sum(FeeInvoice.amount - FeeInvoice.paid_amount),0)).where(FeeInvoice.student_id.in_(student_ids), FeeInvoice.settled_at.is_(None)).group_by(FeeInvoice.student_id)
-    per_fee_map = { sid: amt for sid, amt in (await session.execute(per_fee_stmt)).all() }
-    roster: list[RosterStudent] = []
-    for sid, first_name, last_name, gphone, roll, _gender in roster_rows:
-        roster.append(RosterStudent(
-            student_id=sid,
-            name=' '.join([p for p in [first_name,last_name] if p]),
-            roll=roll,
-            guardian_phone=gphone,
-            tags=tag_map.get(sid, []),
-            attendance_mark=None,
-            fee_due_amount=int(per_fee_map.get(sid,0)),
-            last_present_date=None
-        ))
+    # One statement on a miss (header + roster); header only when the roster is cached.
+    header = None
+
+    async def _load():
+        nonlocal header
+        # Shared with concurrent callers of the key, so it must not use this request's session.
+        async with SessionLocal() as s:
+            rows = (await s.execute(class_detail_stmt(grade_int, section))).all()
+        header = rows[0]
+        return roster_payload(rows)
+
+    roster, _ = await cache.get_or_load(
+        cache_key('class_roster', grade=grade_int, section=section),
+        _load,
+        ttl=ROSTER_CACHE_TTL_SEC,
+        tags=lambda payload: roster_tags(grade_int, section, payload),
+    )
+    if header is None:
+        header = (await session.execute(class_header_stmt(grade_int, section))).one()
+    students = roster['students']
     return ClassDetail(
         id=f"{grade_int}{section}",
         grade=grade_int,
         section=section,
-    class_teacher=teacher_row,
-        total=len(roster_rows),
-    male=int(male or 0),
-    female=int(female or 0),
-        attendance_pct=int(attendance_pct),
-        fee_due_count=int(fee_due_count or 0),
-        fee_due_amount=int(fee_sum or 0),
-        result_status=result_status,
-        roster=roster,
+        class_teacher=header.class_teacher,
+        total=len(students),
+        male=roster['male'],
+        female=roster['female'],
+        attendance_pct=int(header.attendance_pct or 0) if students else 0,
+        fee_due_count=roster['fee_due_count'],
+        fee_due_amount=roster['fee_due_amount'],
+        result_status=header.result_status,
+        roster=[RosterStudent(**st) for st in students],
         generated_at=datetime.utcnow().isoformat()+"Z"
     )
 
@@ -444,6 +419,7 @@ async def bulk_action(payload: BulkActionRequest, session: AsyncSession = Depend
         new_status = (payload.params or {}).get('result_status')
         if new_status not in {'Published','Pending'}:
             raise HTTPException(400, 'Invalid result_status')
+        rows: dict[tuple[int, str], dict] = {}
         for cid in payload.class_ids:
             try:
                 if '-' in cid:
@@ -453,14 +429,13 @@ async def bulk_action(payload: BulkActionRequest, session: AsyncSession = Depend
                 grade_int = int(grade_part)
             except Exception:
                 continue
-            # upsert logic
-            existing = await session.execute(select(ClassStatus).where(ClassStatus.grade==grade_int, ClassStatus.section==section))
-            row = existing.scalar_one_or_none()
-            if row:
-                row.result_status = new_status
-            else:
-                session.add(ClassStatus(grade=grade_int, section=section, result_status=new_status))
-            affected += 1
+            rows[(grade_int, section)] = {'grade': grade_int, 'section': section, 'result_status': new_status}
+        # One upsert for all classes
+        affected = await upsert_rows(
+            session, 'class_status', list(rows.values()),
+            types={'grade': 'int', 'section': 'text', 'result_status': 'text'},
+            conflict=('grade', 'section'), update=('result_status',), set_now=('updated_at',),
+        )
         await session.commit()
         return BulkActionResponse(status='ok', task_id=None, affected=affected)
     # Other actions would enqueue tasks; simulate
@@ -1,42 +1,43 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from pydantic import BaseModel
 from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func, Table, Column, Integer, Date, Text, MetaData, text as _text
-from sqlalchemy import exc as sa_exc
+from sqlalchemy import select, delete, func, cast, literal, Float, Table, Column, Integer, Date, Text, MetaData, text as _text
 from datetime import date, timedelta
 from .models import Wing, SchoolClass, ClassStudent
 from ..students.models import Student
+from ...core.bulk import delete_except, insert_missing, update_rows
+from ...core.cache import cache, cache_key
 from ...core.db import get_session
+from ...core.exports import ExportFormat, csv_json_response, export_response, export_select, pick_columns
+from ...core.idempotency import Idempotency, idempotent
+from ...core.importer import Check, ImportSpec, run_import, unique_check, upload_sha256
+from ...core.replica import read_session
+from ...core.responses import model_list_response
+from ...core.schema_registry import schema_registry
 from ...core.security import require
-import csv, io, time
 
 router_wings = APIRouter(prefix="/wings", tags=["wings"])
 router_classes_admin = APIRouter(prefix="/classes-admin", tags=["classes-admin"])  # separate from existing /classes analytics endpoint
 
 # Runtime schema safety: add staff linkage columns if migration not applied yet.
-_STAFF_COLUMNS_ENSURED = False
+_STAFF_COLUMNS = ('teacher_staff_id', 'assistant_teacher_id', 'support_staff_ids')
 
 async def _ensure_staff_columns(session: AsyncSession):
-    global _STAFF_COLUMNS_ENSURED
-    if _STAFF_COLUMNS_ENSURED:
+    await schema_registry.ensure_loaded(session)
+    if schema_registry.has_columns('school_classes', *_STAFF_COLUMNS):
         return
     try:
-        # Probe one of the new columns
-        await session.execute(select(SchoolClass.teacher_staff_id).limit(1))
-        _STAFF_COLUMNS_ENSURED = True
-        return
+        await session.execute(_text("ALTER TABLE school_classes ADD COLUMN IF NOT EXISTS teacher_staff_id integer"))
+        await session.execute(_text("ALTER TABLE school_classes ADD COLUMN IF NOT EXISTS assistant_teacher_id integer"))
+        await session.execute(_text("ALTER TABLE school_classes ADD COLUMN IF NOT EXISTS support_staff_ids text"))
+        await session.commit()
     except Exception:
-        try:
-            await session.execute(_text("ALTER TABLE school_classes ADD COLUMN IF NOT EXISTS teacher_staff_id integer"))
-            await session.execute(_text("ALTER TABLE school_classes ADD COLUMN IF NOT EXISTS assistant_teacher_id integer"))
-            await session.execute(_text("ALTER TABLE school_classes ADD COLUMN IF NOT EXISTS support_staff_ids text"))
-            await session.commit()
-        except Exception:
-            await session.rollback()
-        finally:
-            _STAFF_COLUMNS_ENSURED = True
+        await session.rollback()
+    finally:
+        # Record either way so a failing ALTER (e.g. missing privilege) is not retried per request.
+        schema_registry.note_table('school_classes', _STAFF_COLUMNS)
 
 # -------------------- Pydantic Schemas --------------------
 class WingCreate(BaseModel):
@@ -138,31 +139,129 @@ async def delete_wing(wing_id: int, session: AsyncSession = Depends(get_session)
 
 # -------------------- Classes Endpoints --------------------
 _AGG_CACHE_TTL_SEC = 30  # seconds
-_agg_cache = { 'data': None, 'params': None, 'ts': 0.0 }
+_AGG_STALE_SEC = 120     # past the TTL, serve the last value (x-cache: STALE) while one refresh runs
 
-def _invalidate_agg_cache():
-    _agg_cache['data'] = None
-    _agg_cache['params'] = None
-    _agg_cache['ts'] = 0.0
+def _year_tag(academic_year: Optional[str]) -> str:
+    return f"ay:{academic_year or '*'}"
 
-@router_classes_admin.get("", response_model=List[ClassOut])
-async def list_classes_admin(academic_year: Optional[str] = None,
-    attendance_days: int = 1,
-    exam_window_days: int = 90,
-    response: Response = None,
-    session: AsyncSession = Depends(get_session), user=Depends(require('classes:list'))):
-    await _ensure_staff_columns(session)
+async def _invalidate_classes(*class_ids: int, academic_year: Optional[str] = None):
+    """Drop cached class aggregates touching these classes / this year (all workers)."""
+    tags = [f"class:{cid}" for cid in class_ids]
+    if academic_year is not None:
+        tags += [_year_tag(academic_year), _year_tag(None)]
+    await cache.invalidate(*tags)
+
+def _decode_class_rows(raw: list) -> list[ClassOut]:
+    return [ClassOut(**r) for r in raw]
+
+async def _classes_admin_rows(primary: AsyncSession, academic_year: Optional[str],
+    attendance_days: int, exam_window_days: int) -> tuple[list[ClassOut], str]:
+    """Aggregated class rows plus cache status ('HIT'/'STALE'/'MISS') shared by list and metrics."""
+    # Fallback DDL must hit the primary; the aggregation itself reads through ``read_session``.
+    await _ensure_staff_columns(primary)
     # Basic validation & normalization
     attendance_days = max(1, min(attendance_days, 120))  # cap to avoid huge scans
     exam_window_days = max(1, min(exam_window_days, 365))
-    cache_key = (academic_year, attendance_days, exam_window_days)
-    now = time.time()
-    if _agg_cache['data'] is not None and _agg_cache['params'] == cache_key and (now - _agg_cache['ts']) < _AGG_CACHE_TTL_SEC:
-        if response is not None:
-            response.headers['x-cache'] = 'HIT'
-        return _agg_cache['data']
-    if response is not None:
-        response.headers['x-cache'] = 'MISS'
+    key = cache_key('classes_admin', academic_year=academic_year, attendance_days=attendance_days, exam_window_days=exam_window_days)
+    # Tags: the year, every class in the result and each attendance date in the window,
+    # so narrow writes only drop the entries they affect.
+    today = date.today()
+    window_tags = [_year_tag(academic_year)] + [f"attendance:{today - timedelta(days=i)}" for i in range(attendance_days)]
+    async def _load() -> list[ClassOut]:
+        # Shared with concurrent callers and background revalidation: may outlive this request's session.
+        async with read_session() as s:
+            return await _aggregate_classes(s, academic_year, attendance_days, exam_window_days)
+    return await cache.get_or_load(
+        key,
+        _load,
+        ttl=_AGG_CACHE_TTL_SEC,
+        stale_ttl=_AGG_STALE_SEC,
+        refresh=_load,
+        tags=lambda rows: window_tags + [f"class:{c.id}" for c in rows],
+        decode=_decode_class_rows,
+    )
+
+# exam_scores is not an ORM model (created by the academics schema / seed data); only queried when present.
+_exam_metadata = MetaData()
+exam_scores = Table(
+    'exam_scores', _exam_metadata,
+    Column('id', Integer),
+    Column('student_id', Integer),
+    Column('exam_date', Date),
+    Column('exam_type', Text),
+    Column('total_marks', Integer),
+    Column('obtained_marks', Integer),
+)
+
+def class_stats_stmt(academic_year: Optional[str], att_start: date, exam_cutoff: date, with_exams: bool = True):
+    """One grouped statement: per class_id total/male/female, present & marked attendance rows in the
+    window, students with an unsettled balance and the mean of each student's latest exam percentage.
+
+    Per-student aggregates are computed in derived tables first so the joins stay one row per member.
+    """
+    from ..students.models_extra import AttendanceEvent, FeeInvoice
+    scope = select(SchoolClass.id)
+    if academic_year:
+        scope = scope.where(SchoolClass.academic_year == academic_year)
+    members = select(ClassStudent.class_id, ClassStudent.student_id).where(ClassStudent.class_id.in_(scope)).cte('members')
+    member_ids = select(members.c.student_id)
+    att = (
+        select(
+            AttendanceEvent.student_id,
+            func.count().filter(AttendanceEvent.present != 0).label('present'),
+            func.count(AttendanceEvent.present).label('marked'),
+        )
+        .where(AttendanceEvent.student_id.in_(member_ids), AttendanceEvent.date >= att_start)
+        .group_by(AttendanceEvent.student_id)
+    ).subquery('att')
+    fees = (
+        select(FeeInvoice.student_id)
+        .where(
+            FeeInvoice.student_id.in_(member_ids),
+            FeeInvoice.settled_at.is_(None),
+            func.coalesce(FeeInvoice.amount, 0) - func.coalesce(FeeInvoice.paid_amount, 0) > 0,
+        )
+        .distinct()
+    ).subquery('fees')
+    joined = (
+        members
+        .outerjoin(Student, Student.id == members.c.student_id)
+        .outerjoin(att, att.c.student_id == members.c.student_id)
+        .outerjoin(fees, fees.c.student_id == members.c.student_id)
+    )
+    results = literal(None)
+    if with_exams:
+        latest_exam = (
+            select(
+                exam_scores.c.student_id,
+                (cast(exam_scores.c.obtained_marks, Float) / cast(exam_scores.c.total_marks, Float) * 100).label('pct'),
+            )
+            .where(
+                exam_scores.c.student_id.in_(member_ids),
+                exam_scores.c.exam_date >= exam_cutoff,
+                exam_scores.c.total_marks != 0,
+            )
+            .distinct(exam_scores.c.student_id)
+            .order_by(exam_scores.c.student_id, exam_scores.c.exam_date.desc())
+        ).subquery('latest_exam')
+        joined = joined.outerjoin(latest_exam, latest_exam.c.student_id == members.c.student_id)
+        results = func.avg(latest_exam.c.pct)
+    return (
+        select(
+            members.c.class_id,
+            func.count().label('total'),
+            func.count().filter(func.upper(Student.gender) == 'M').label('male'),
+            func.count().filter(func.upper(Student.gender) == 'F').label('female'),
+            func.coalesce(func.sum(att.c.present), 0).label('present'),
+            func.coalesce(func.sum(att.c.marked), 0).label('marked'),
+            func.count(fees.c.student_id).label('fee_due'),
+            results.label('results_avg'),
+        )
+        .select_from(joined)
+        .group_by(members.c.class_id)
+    )
+
+async def _aggregate_classes(session: AsyncSession, academic_year: Optional[str], attendance_days: int, exam_window_days: int) -> list[ClassOut]:
     stmt = select(SchoolClass)
     if academic_year:
         stmt = stmt.where(SchoolClass.academic_year==academic_year)
@@ -170,110 +269,49 @@ async def list_classes_admin(academic_year: Optional[str] = None,
     out: list[ClassOut] = []
     if not classes:
         return out
-    class_ids = [c.id for c in classes]
-    cs_rows = (await session.execute(select(ClassStudent.class_id, ClassStudent.student_id).where(ClassStudent.class_id.in_(class_ids)))).all()
-    by_class: dict[int, list[int]] = {}
-    for cid, sid in cs_rows:
-        by_class.setdefault(cid, []).append(sid)
-    if cs_rows:
-        from ..students.models import Student  # local import to avoid circular
-        from ..students.models_extra import AttendanceEvent, FeeInvoice
-        student_ids = [sid for _, sid in cs_rows]
-        stu_rows = (await session.execute(select(Student.id, Student.gender).where(Student.id.in_(student_ids)))).all()
-        gender_map = {sid: (g or '').upper() for sid, g in stu_rows}
-        att_start = date.today() - timedelta(days=max(1, attendance_days)-1)
-        today_att = (await session.execute(select(AttendanceEvent.student_id, AttendanceEvent.present).where(AttendanceEvent.student_id.in_(student_ids), AttendanceEvent.date >= att_start))).all()
-        att_map: dict[int, int] = {}
-        for sid, present in today_att:
-            att_map[sid] = att_map.get(sid, 0) + (1 if present else 0)
-        fee_rows = (await session.execute(select(FeeInvoice.student_id, FeeInvoice.amount, FeeInvoice.paid_amount, FeeInvoice.settled_at).where(FeeInvoice.student_id.in_(student_ids)))).all()
-        fee_due_map: dict[int, bool] = {}
-        for sid, amount, paid, settled in fee_rows:
-            if settled is None and (amount or 0) - (paid or 0) > 0:
-                fee_due_map[sid] = True
-        exam_latest: dict[int, tuple[int,int]] = {}
-        exam_cutoff = date.today() - timedelta(days=max(1, exam_window_days))
-        metadata = MetaData()
-        exam_scores_table = Table(
-            'exam_scores', metadata,
-            Column('id', Integer),
-            Column('student_id', Integer),
-            Column('exam_date', Date),
-            Column('exam_type', Text),
-            Column('total_marks', Integer),
-            Column('obtained_marks', Integer),
-        )
-        try:
-            exam_rows = (await session.execute(
-                select(
-                    exam_scores_table.c.student_id,
-                    exam_scores_table.c.exam_date,
-                    exam_scores_table.c.total_marks,
-                    exam_scores_table.c.obtained_marks
-                ).where(
-                    exam_scores_table.c.student_id.in_(student_ids),
-                    exam_scores_table.c.exam_date >= exam_cutoff
-                ).order_by(
-                    exam_scores_table.c.student_id,
-                    exam_scores_table.c.exam_date.desc()
-            ))).all()
-            for sid, exam_date_val, total_marks, obtained_marks in exam_rows:
-                if sid not in exam_latest and total_marks:
-                    exam_latest[sid] = (total_marks, obtained_marks)
-        except sa_exc.SQLAlchemyError:
-            exam_latest = {}
-    else:
-        gender_map = {}
-        att_map = {}
-        fee_due_map = {}
-        exam_latest = {}
+    await schema_registry.ensure_loaded(session)
+    att_start = date.today() - timedelta(days=max(1, attendance_days)-1)
+    exam_cutoff = date.today() - timedelta(days=max(1, exam_window_days))
+    stats = {
+        row.class_id: row for row in (await session.execute(
+            class_stats_stmt(academic_year, att_start, exam_cutoff, with_exams=schema_registry.has_table('exam_scores'))
+        )).all()
+    }
     for c in classes:
-        sids = by_class.get(c.id, [])
-        total = len(sids)
-        male = sum(1 for sid in sids if gender_map.get(sid)== 'M')
-        female = sum(1 for sid in sids if gender_map.get(sid)== 'F')
-        # Attendance percent: average presence over window
-        if total and attendance_days > 0:
-            present_sum = sum(att_map.get(sid, 0) for sid in sids)
-            # present_sum ranges 0..(attendance_days*total)
-            attendance_pct = int((present_sum * 100) / (attendance_days * total))
-            fee_due_pct = int((sum(1 for sid in sids if fee_due_map.get(sid)) * 100)/ total)
-        else:
-            attendance_pct = 0
-            fee_due_pct = 0
+        row = stats.get(c.id)
+        total = row.total if row else 0
+        male = row.male if row else 0
+        female = row.female if row else 0
+        # Attendance percent: present marks over marks recorded in the window
+        attendance_pct = int((row.present * 100) / row.marked) if row and row.marked else 0
+        fee_due_pct = int((row.fee_due * 100) / total) if total else 0
         # Results average: mean of latest exam percentages per student in class
-        if total:
-            percents = []
-            for sid in sids:
-                if sid in exam_latest:
-                    tot, obt = exam_latest[sid]
-                    if tot:
-                        percents.append((obt / tot) * 100)
-            results_avg = int(sum(percents)/len(percents)) if percents else 0
-        else:
-            results_avg = 0
+        results_avg = int(row.results_avg) if row and row.results_avg is not None else 0
         ss_ids = []
         if getattr(c,'support_staff_ids',None):
             ss_ids = [int(x) for x in c.support_staff_ids.split(',') if x]
         out.append(ClassOut(id=c.id, academic_year=c.academic_year, wing_id=c.wing_id, grade=c.grade, section=c.section, teacher_name=c.teacher_name, target_ratio=c.target_ratio, teacher_staff_id=getattr(c,'teacher_staff_id',None), assistant_teacher_id=getattr(c,'assistant_teacher_id',None), support_staff_ids=ss_ids, total_students=total, male=male, female=female, attendance_pct=attendance_pct, fee_due_pct=fee_due_pct, results_avg=results_avg))
-    # store in cache
-    _agg_cache['data'] = out
-    _agg_cache['params'] = cache_key
-    _agg_cache['ts'] = time.time()
     return out
 
+@router_classes_admin.get("", response_model=List[ClassOut])
+async def list_classes_admin(academic_year: Optional[str] = None,
+    attendance_days: int = 1,
+    exam_window_days: int = 90,
+    user=Depends(require('classes:list')),
+    primary: AsyncSession = Depends(get_session)):
+    rows, cache_status = await _classes_admin_rows(primary, academic_year, attendance_days, exam_window_days)
+    return model_list_response(ClassOut, rows, headers={'x-cache': cache_status})
+
 @router_classes_admin.get("/metrics")
 async def classes_admin_metrics(academic_year: Optional[str] = None,
     attendance_days: int = 1,
     exam_window_days: int = 90,
-    session: AsyncSession = Depends(get_session), user=Depends(require('classes:list'))):
+    user=Depends(require('classes:list')),
+    primary: AsyncSession = Depends(get_session)):
     """Lightweight summary: counts & averaged percentages without returning each class row.
     Reuses cached aggregate list when available to avoid recomputation."""
-    # Reuse existing list function logic via internal call (without duplicating SQL); if cache miss it will populate.
-    # We call the underlying function by importing it or referencing directly.
-    # Instead of re-querying DB here, we simulate a call by invoking list_classes_admin with a dummy Response.
-    dummy_resp = Response()
-    classes = await list_classes_admin(academic_year=academic_year, attendance_days=attendance_days, exam_window_days=exam_window_days, response=dummy_resp, session=session, user=user)  # type: ignore
+    # Shares the list endpoint's aggregation (and its cache) instead of re-querying.
+    classes, cache_status = await _classes_admin_rows(primary, academic_year, attendance_days, exam_window_days)
     total_classes = len(classes)
     total_students = sum(c.total_students for c in classes)
     avg_attendance = int(sum(c.attendance_pct * c.total_students for c in classes) / total_students) if total_students else 0
@@ -287,7 +325,7 @@ async def classes_admin_metrics(academic_year: Optional[str] = None,
         "attendance_pct": avg_attendance,
         "results_avg": avg_results,
         "fee_due_pct": fee_due_pct_overall,
-        "cache": dummy_resp.headers.get('x-cache','MISS')
+        "cache": cache_status
     }
 
 @router_classes_admin.post("", response_model=ClassOut)
@@ -299,7 +337,7 @@ async def create_class(body: ClassCreate, session: AsyncSession = Depends(get_se
     cls = SchoolClass(**payload)
     session.add(cls)
     await session.commit(); await session.refresh(cls)
-    _invalidate_agg_cache()
+    await _invalidate_classes(academic_year=cls.academic_year)
     out_payload = body.dict()
     return ClassOut(id=cls.id, total_students=0, **out_payload)
 
@@ -313,7 +351,7 @@ async def update_class(class_id: int, body: ClassUpdate, session: AsyncSession =
         update_data['support_staff_ids'] = ','.join(str(i) for i in update_data['support_staff_ids'])
     for k,v in update_data.items(): setattr(c,k,v)
     await session.commit(); await session.refresh(c)
-    _invalidate_agg_cache()
+    await _invalidate_classes(c.id, academic_year=c.academic_year)
     total_ids = (await session.execute(select(ClassStudent.student_id).where(ClassStudent.class_id==c.id))).scalars().all()
     from ..students.models import Student
     from ..students.models_extra import AttendanceEvent, FeeInvoice
@@ -339,24 +377,20 @@ async def update_class(class_id: int, body: ClassUpdate, session: AsyncSession =
 async def bulk_update_class_settings(body: ClassSettingsBulkRequest, session: AsyncSession = Depends(get_session), user=Depends(require('classes:bulk'))):
     if not body.updates:
         return ClassSettingsBulkResponse(updated=0)
-    updated = 0
+    # Patches for the same class merge in order; None fields are left unchanged.
+    patches: dict[int, dict] = {}
     for patch in body.updates:
-        c = (await session.execute(select(SchoolClass).where(SchoolClass.id==patch.id))).scalar_one_or_none()
-        if not c:
-            continue
-        changed = False
-        if patch.storage_path is not None and c.storage_path != patch.storage_path:
-            c.storage_path = patch.storage_path; changed = True
-        if patch.meet_link is not None and c.meet_link != patch.meet_link:
-            c.meet_link = patch.meet_link; changed = True
-        if patch.target_ratio is not None and c.target_ratio != patch.target_ratio:
-            c.target_ratio = patch.target_ratio; changed = True
-        if changed:
-            updated += 1
-    if updated:
+        patches.setdefault(patch.id, {'id': patch.id}).update(
+            patch.model_dump(include={'storage_path', 'meet_link', 'target_ratio'}, exclude_none=True))
+    updated_ids = await update_rows(
+        session, 'school_classes', 'id', list(patches.values()),
+        types={'id': 'int', 'storage_path': 'text', 'meet_link': 'text', 'target_ratio': 'int'},
+        set_now=('updated_at',),
+    )
+    if updated_ids:
         await session.commit()
-        _invalidate_agg_cache()
-    return ClassSettingsBulkResponse(updated=updated)
+        await _invalidate_classes(*updated_ids)
+    return ClassSettingsBulkResponse(updated=len(updated_ids))
 
 @router_classes_admin.delete("/{class_id}")
 async def delete_class(class_id: int, session: AsyncSession = Depends(get_session), user=Depends(require('classes:bulk'))):
@@ -364,7 +398,7 @@ async def delete_class(class_id: int, session: AsyncSession = Depends(get_sessio
     await session.execute(delete(ClassStudent).where(ClassStudent.class_id==class_id))
     await session.execute(delete(SchoolClass).where(SchoolClass.id==class_id))
     await session.commit()
-    _invalidate_agg_cache()
+    await _invalidate_classes(class_id)
     return {"status":"ok","deleted": class_id}
 
 @router_classes_admin.post("/{class_id}/students")
@@ -372,55 +406,103 @@ async def assign_students(class_id: int, body: StudentAssignPayload, session: As
     c = (await session.execute(select(SchoolClass).where(SchoolClass.id==class_id))).scalar_one_or_none()
     if not c: raise HTTPException(404, 'Class not found')
     # validate students exist
-    existing = (await session.execute(select(Student.id).where(Student.id.in_(body.student_ids)))).scalars().all()
-    if len(existing) != len(body.student_ids):
-        missing = set(body.student_ids) - set(existing)
+    requested = set(body.student_ids)
+    existing = (await session.execute(select(Student.id).where(Student.id.in_(requested)))).scalars().all()
+    if len(existing) != len(requested):
+        missing = requested - set(existing)
         raise HTTPException(400, f"Invalid student ids: {sorted(missing)}")
+    types = {'class_id': 'int', 'student_id': 'int'}
+    removed = 0
     if body.replace:
-        await session.execute(delete(ClassStudent).where(ClassStudent.class_id==class_id))
-    # insert new ones (avoid duplicates)
-    existing_set = set((await session.execute(select(ClassStudent.student_id).where(ClassStudent.class_id==class_id))).scalars().all())
-    for sid in body.student_ids:
-        if sid in existing_set: continue
-        session.add(ClassStudent(class_id=class_id, student_id=sid))
+        removed = await delete_except(session, 'class_students', {'class_id': class_id}, 'student_id', requested, types)
+    added = await insert_missing(session, 'class_students', {'class_id': class_id}, 'student_id', body.student_ids, types)
     await session.commit()
-    _invalidate_agg_cache()
-    total = (await session.execute(select(ClassStudent.student_id).where(ClassStudent.class_id==class_id))).scalars().all()
-    return {"status":"ok","total":len(total)}
+    if added or removed:
+        await _invalidate_classes(class_id)
+    total = (await session.execute(select(func.count()).select_from(ClassStudent).where(ClassStudent.class_id==class_id))).scalar_one()
+    return {"status":"ok","total":total,"added":added,"removed":removed}
 
 # -------------------- Import / Export CSV --------------------
 CSV_HEADER = ['academic_year','wing','grade','section','teacher_name','target_ratio']
 
+CLASSES_IMPORT = ImportSpec(
+    name='classes',
+    columns=CSV_HEADER,
+    required=['academic_year', 'wing', 'grade', 'section'],
+    ints=['grade', 'target_ratio'],
+    checks=[
+        *(Check(f"s.{c} IS NULL", f"'{c} required'") for c in ('academic_year', 'wing', 'grade', 'section')),
+        unique_check(['academic_year', 'grade', 'section'], 'class'),
+    ],
+    # New wings span the grades imported into them; existing classes take the
+    # row's wing and any non-blank teacher/ratio (unchanged rows are not counted).
+    merge="""
+        WITH v AS (
+            SELECT academic_year, wing, grade, section, teacher_name, CAST(target_ratio AS int) AS target_ratio
+            FROM {stage} WHERE error IS NULL
+        ), new_wings AS (
+            INSERT INTO wings (academic_year, name, grade_start, grade_end, target_ratio)
+            SELECT academic_year, wing, min(CAST(grade AS int))::text, max(CAST(grade AS int))::text, max(target_ratio)
+            FROM v GROUP BY academic_year, wing
+            ON CONFLICT (academic_year, name) DO NOTHING
+            RETURNING id, academic_year, name
+        ), w AS (
+            SELECT id, academic_year, name FROM new_wings
+            UNION ALL
+            SELECT id, academic_year, name FROM wings WHERE (academic_year, name) IN (SELECT academic_year, wing FROM v)
+        ), merged AS (
+            INSERT INTO school_classes AS t (academic_year, wing_id, grade, section, teacher_name, target_ratio)
+            SELECT v.academic_year, w.id, v.grade, v.section, v.teacher_name, v.target_ratio
+            FROM v JOIN w ON w.academic_year = v.academic_year AND w.name = v.wing
+            ON CONFLICT (academic_year, grade, section) DO UPDATE SET
+                wing_id = EXCLUDED.wing_id,
+                teacher_name = coalesce(EXCLUDED.teacher_name, t.teacher_name),
+                target_ratio = coalesce(EXCLUDED.target_ratio, t.target_ratio)
+            WHERE (t.wing_id, t.teacher_name, t.target_ratio) IS DISTINCT FROM
+                  (EXCLUDED.wing_id, coalesce(EXCLUDED.teacher_name, t.teacher_name), coalesce(EXCLUDED.target_ratio, t.target_ratio))
+            RETURNING (xmax = 0) AS inserted, academic_year
+        )
+        SELECT count(*) FILTER (WHERE inserted) AS created,
+               count(*) FILTER (WHERE NOT inserted) AS updated,
+               array_agg(DISTINCT academic_year) AS years
+        FROM merged
+    """,
+)
+
 @router_classes_admin.post('/import')
-async def import_csv(file: UploadFile = File(...), session: AsyncSession = Depends(get_session), user=Depends(require('classes:bulk'))):
-    content = await file.read()
-    text = content.decode('utf-8')
-    reader = csv.DictReader(io.StringIO(text))
-    if reader.fieldnames != CSV_HEADER:
-        raise HTTPException(400, f'Invalid header. Expected {CSV_HEADER}')
-    created = 0
-    for row in reader:
-        # Wing upsert
-        w = (await session.execute(select(Wing).where(Wing.academic_year==row['academic_year'], Wing.name==row['wing']))).scalar_one_or_none()
-        if not w:
-            w = Wing(academic_year=row['academic_year'], name=row['wing'], grade_start=int(row['grade']), grade_end=int(row['grade']), target_ratio=int(row['target_ratio'] or 0) or None)
-            session.add(w)
-            await session.flush()
-        cls = (await session.execute(select(SchoolClass).where(SchoolClass.academic_year==row['academic_year'], SchoolClass.grade==int(row['grade']), SchoolClass.section==row['section']))).scalar_one_or_none()
-        if not cls:
-            cls = SchoolClass(academic_year=row['academic_year'], wing_id=w.id, grade=int(row['grade']), section=row['section'], teacher_name=row['teacher_name'] or None, target_ratio=int(row['target_ratio'] or 0) or None)
-            session.add(cls)
-            created += 1
-    await session.commit()
-    _invalidate_agg_cache()
-    return {"status":"ok","created":created}
+async def import_csv(file: UploadFile = File(...), dry_run: bool = Query(False), session: AsyncSession = Depends(get_session), user=Depends(require('classes:bulk')), idem: Idempotency = Depends(idempotent('classes.import', per_user=True))):
+    """Create/update wings and classes from CSV or XLSX; per-row errors are reported, valid rows still merge."""
+    cached = await idem.begin({'sha256': await upload_sha256(file), 'dry_run': dry_run})
+    if cached is not None:
+        return cached
+    result = await run_import(session, CLASSES_IMPORT, file, dry_run=dry_run)
+    years = [y for y in result.extra.get('years') or [] if y]
+    if not dry_run and (result.created or result.updated):
+        await cache.invalidate(*(_year_tag(y) for y in years), _year_tag(None))
+    return await idem.complete(result.as_dict())
+
+CLASS_EXPORT = {
+    'academic_year': SchoolClass.academic_year,
+    'wing': Wing.name,
+    'grade': SchoolClass.grade,
+    'section': SchoolClass.section,
+    'teacher_name': SchoolClass.teacher_name,
+    'target_ratio': SchoolClass.target_ratio,
+    'id': SchoolClass.id,
+    'head_teacher': SchoolClass.head_teacher,
+}
 
 @router_classes_admin.get('/export')
-async def export_csv(academic_year: str, session: AsyncSession = Depends(get_session), user=Depends(require('classes:list'))):
-    stmt = select(SchoolClass, Wing.name.label('wing_name')).join(Wing, Wing.id==SchoolClass.wing_id, isouter=True).where(SchoolClass.academic_year==academic_year)
-    rows = (await session.execute(stmt)).all()
-    output = io.StringIO(); writer = csv.writer(output)
-    writer.writerow(CSV_HEADER)
-    for cls, wing_name in rows:
-        writer.writerow([cls.academic_year, wing_name or '', cls.grade, cls.section, cls.teacher_name or '', cls.target_ratio or ''])
-    return {"csv": output.getvalue()}
+async def export_csv(academic_year: str, format: Optional[ExportFormat] = None, columns: Optional[str] = None, user=Depends(require('classes:list'))):
+    """Stream the year's classes. Without ``format`` the body is the legacy ``{"csv": ...}`` (import-compatible columns)."""
+    cols = pick_columns(CLASS_EXPORT, columns) if columns else CSV_HEADER
+    stmt = (
+        export_select(CLASS_EXPORT, cols)
+        .select_from(SchoolClass)
+        .join(Wing, Wing.id == SchoolClass.wing_id, isouter=True)
+        .where(SchoolClass.academic_year == academic_year)
+        .order_by(SchoolClass.grade, SchoolClass.section)
+    )
+    if format is None:
+        return csv_json_response(stmt)
+    return export_response(stmt, format, f'classes-{academic_year}')
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.core.db import get_session
+from app.core.idempotency import Idempotency, idempotent
 from app.core.tenant import get_tenant_context, TenantContext
 from . import models, schemas
 
@@ -21,9 +22,14 @@ async def list_templates(session: AsyncSession = Depends(get_session)):
     return rows
 
 @router.post('/outbox', response_model=schemas.OutboxOut)
-async def enqueue_message(payload: schemas.OutboxEnqueue, session: AsyncSession = Depends(get_session), tenant: TenantContext = Depends(get_tenant_context)):
+async def enqueue_message(payload: schemas.OutboxEnqueue, session: AsyncSession = Depends(get_session), tenant: TenantContext = Depends(get_tenant_context), idem: Idempotency = Depends(idempotent('comms.outbox', per_user=True))):
     if not payload.body and not payload.template_id:
         raise HTTPException(400, 'Provide body or template_id')
+    if idem.key:
+        idem.key = f"{tenant.school_id}:{idem.key}"
+    cached = await idem.begin(payload.model_dump(mode='json'))
+    if cached is not None:
+        return cached
     template_body = None
     if payload.template_id:
         tmpl = await session.get(models.MessageTemplate, payload.template_id)
@@ -43,7 +49,7 @@ async def enqueue_message(payload: schemas.OutboxEnqueue, session: AsyncSession
     session.add(rec)
     await session.commit()
     await session.refresh(rec)
-    return rec
+    return await idem.complete(schemas.OutboxOut.model_validate(rec).model_dump(mode='json'))
 
 @router.get('/outbox/{outbox_id}', response_model=schemas.OutboxOut)
 async def get_outbox(outbox_id: int, session: AsyncSession = Depends(get_session)):
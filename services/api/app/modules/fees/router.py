@@ -1,9 +1,13 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from ...core.security import require
 from ...core.db import get_session
+from ...core.exports import ExportFormat, export_response, export_select, pick_columns
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
+from ..students.models import Student
+from ..students.models_extra import FeeInvoice
 from .models import Invoice
 
 router = APIRouter(prefix="/fees", tags=["fees"])
@@ -28,3 +32,46 @@ async def get_invoice(invoice_id: int, session: AsyncSession = Depends(get_sessi
     if not invoice:
         raise HTTPException(404, "Invoice not found")
     return {"id": invoice.id, "student_id": invoice.student_id, "amount_paise": invoice.amount_paise, "currency": invoice.currency, "status": invoice.status, "created_at": invoice.created_at.isoformat() if invoice.created_at else None}
+
+_outstanding = FeeInvoice.amount - FeeInvoice.paid_amount
+
+DUES_EXPORT = {
+    'invoice_id': FeeInvoice.id,
+    'student_id': FeeInvoice.student_id,
+    'first_name': Student.first_name,
+    'last_name': Student.last_name,
+    'class': Student.class_,
+    'section': Student.section,
+    'roll': Student.roll,
+    'guardian_phone': Student.guardian_phone,
+    'amount': FeeInvoice.amount,
+    'paid_amount': FeeInvoice.paid_amount,
+    'due': _outstanding,
+    'due_date': FeeInvoice.due_date,
+    'created_at': FeeInvoice.created_at,
+}
+
+@router.get("/dues/export")
+async def export_dues(
+    format: ExportFormat = ExportFormat.csv,
+    columns: Optional[str] = None,
+    klass: Optional[str] = None,
+    section: Optional[str] = None,
+    overdue: bool = False,
+    user=Depends(require('fees:view_invoice')),
+):
+    """Stream unsettled invoices with an outstanding balance (``overdue``: due date already passed)."""
+    stmt = (
+        export_select(DUES_EXPORT, pick_columns(DUES_EXPORT, columns))
+        .select_from(FeeInvoice)
+        .join(Student, Student.id == FeeInvoice.student_id)
+        .where(FeeInvoice.settled_at.is_(None), _outstanding > 0)
+        .order_by(Student.class_, Student.section, Student.roll, FeeInvoice.id)
+    )
+    if klass:
+        stmt = stmt.where(Student.class_ == klass)
+    if section:
+        stmt = stmt.where(Student.section == section)
+    if overdue:
+        stmt = stmt.where(FeeInvoice.due_date < func.current_date())
+    return export_response(stmt, format, 'fee-dues')
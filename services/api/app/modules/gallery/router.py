@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, update
+from sqlalchemy import select, func
 from app.core.db import get_session
 from app.core.security import get_current_user, require
 from app.modules.gallery import models, schemas
@@ -41,6 +41,7 @@ async def delete_gallery_image(image_id: int, session: AsyncSession = Depends(ge
     obj = (await session.execute(q)).scalar_one_or_none()
     if not obj:
         raise HTTPException(status_code=404, detail="Image not found")
-    await session.execute(update(models.ClassGalleryImage).where(models.ClassGalleryImage.id==image_id).values(is_deleted=True))
+    # ORM attribute change (not a bulk UPDATE) so the audit entry carries before/after values.
+    obj.is_deleted = True
     await session.commit()
     return {"status": "deleted"}
@@ -5,7 +5,9 @@ from typing import Optional, List
 from datetime import date, datetime, timedelta
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
+from ...core.cache import cache
 from ...core.db import get_session
+from ...core.responses import model_list_response
 from ...core.security import require
 from .models import LeaveRequest, LeaveStatus, LeaveType
 from ..students.models_extra import AttendanceEvent
@@ -73,7 +75,7 @@ async def create_leave(body: LeaveCreate, session: AsyncSession = Depends(get_se
 @router.get('', response_model=List[LeaveOut])
 async def list_leaves(session: AsyncSession = Depends(get_session), user=Depends(require('leaves:list'))):
     result = await session.execute(select(LeaveRequest).order_by(LeaveRequest.created_at.desc()).limit(200))
-    return [LeaveOut.from_model(l) for l in result.scalars().all()]
+    return model_list_response(LeaveOut, (LeaveOut.from_model(l) for l in result.scalars().all()))
 
 @router.get('/{leave_id}', response_model=LeaveOut)
 async def get_leave(leave_id: str, session: AsyncSession = Depends(get_session), user=Depends(require('leaves:view'))):
@@ -100,12 +102,15 @@ async def approve_leave(leave_id: str, body: LeaveApproveRequest, session: Async
     # generate attendance_events absent records
     d = l.start_date
     events = 0
+    dates = []
     while d <= l.end_date:
         session.add(AttendanceEvent(student_id=l.student_id, date=d, present=0))
+        dates.append(d)
         d += timedelta(days=1)
         events += 1
     l.auto_generated_absence_events = True
     await session.commit()
+    await cache.invalidate(*(f"attendance:{x}" for x in dates))
     await session.refresh(l)
     return LeaveOut.from_model(l)
 
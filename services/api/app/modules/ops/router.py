@@ -1,10 +1,15 @@
 from __future__ import annotations
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 import socket
 from sqlalchemy import text
 import time
 from app.core.db import engine
+from app.core.db_metrics import pool_status
+from app.core.replica import replica_health
 from app.core.config import settings
+from app.core.perm_cache import permission_cache
+from app.core.schema_registry import schema_registry
+from app.core.security import require
 from urllib.parse import urlparse
 
 router = APIRouter(prefix="/ops", tags=["ops"])
@@ -59,4 +64,21 @@ async def ops_status():
         "user": parsed.username,
         "driver": 'asyncpg' if 'asyncpg' in dsn else 'psycopg',
     }
-    return {"ports": port_status, "db": db_info, "alembic_version": alembic_version, "db_latency_ms": db_latency_ms, "dsn": db_meta}
+    return {"ports": port_status, "db": db_info, "alembic_version": alembic_version, "db_latency_ms": db_latency_ms, "dsn": db_meta, "pool": pool_status(engine), "replica": replica_health.snapshot()}
+
+@router.post('/rbac/invalidate', dependencies=[Depends(require('ops:manage'))])
+async def rbac_invalidate():
+    """Publish an RBAC change so every worker reloads role permissions on its next check.
+
+    Edits to core.role_permission / core.user_permission_override are picked up by
+    the rbac_version trigger; use this after restoring or bulk-loading RBAC data
+    on a database without that trigger.
+    """
+    version = await permission_cache.invalidate()
+    return {"version": version}
+
+@router.post('/schema/refresh', dependencies=[Depends(require('ops:manage'))])
+async def schema_refresh():
+    """Reload the schema capability registry on every worker after out-of-band migrations."""
+    notified = await schema_registry.refresh_all()
+    return {**schema_registry.snapshot(), 'workers_notified': notified}
@@ -3,6 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from typing import Optional
 from app.core.db import get_session
+from app.core.idempotency import Idempotency, idempotent
 from app.core.tenant import get_tenant_context, TenantContext
 from . import models, schemas
 from datetime import date as _date
@@ -90,8 +91,14 @@ def _derive_status_from_events(event_type: str, raw: dict) -> Optional[str]:
     return None
 
 @router.post('/webhook/event', response_model=schemas.PaymentEventOut)
-async def ingest_payment_event(payload: schemas.PaymentEventIn, session: AsyncSession = Depends(get_session), tenant: TenantContext = Depends(get_tenant_context)):
-    # Idempotency on (school, provider, event_id)
+async def ingest_payment_event(payload: schemas.PaymentEventIn, session: AsyncSession = Depends(get_session), tenant: TenantContext = Depends(get_tenant_context), idem: Idempotency = Depends(idempotent('payments.webhook'))):
+    # Natural key (school, provider, event_id): concurrent redeliveries wait for the first
+    # instead of racing the SELECT below. Only identifying fields are hashed since
+    # providers may resend an event with a different envelope.
+    idem.key = f"{tenant.school_id}:{payload.provider}:{payload.event_id}"
+    cached = await idem.begin({'provider': payload.provider, 'event_id': payload.event_id, 'event_type': payload.event_type})
+    if cached is not None:
+        return cached
     existing = await session.execute(select(models.PaymentEvent).where(
         models.PaymentEvent.school_id==tenant.school_id,
         models.PaymentEvent.provider==payload.provider,
@@ -99,7 +106,7 @@ async def ingest_payment_event(payload: schemas.PaymentEventIn, session: AsyncSe
     ))
     existing_obj = existing.scalar_one_or_none()
     if existing_obj:
-        return existing_obj
+        return await idem.complete(schemas.PaymentEventOut.model_validate(existing_obj).model_dump(mode='json'))
 
     # Attempt to resolve related pg_transaction
     tx = None
@@ -127,7 +134,7 @@ async def ingest_payment_event(payload: schemas.PaymentEventIn, session: AsyncSe
         await session.execute(update(models.PgTransaction).where(models.PgTransaction.id==tx.id).values(status=status))
     await session.commit()
     await session.refresh(event)
-    return event
+    return await idem.complete(schemas.PaymentEventOut.model_validate(event).model_dump(mode='json'))
 
 
 @router.get('/settlements', response_model=list[schemas.SettlementSummaryOut])
@@ -8,43 +8,47 @@ from app.core.tenant import get_tenant_context, TenantContext
 from app.core.security import require
 from sqlalchemy import select, update
 from app.core.db import engine
+from app.core.schema_registry import schema_registry
 import uuid
 
 router = APIRouter(prefix='/settings', tags=['settings'])
 
+_BRAND_DDL = """
+    CREATE TABLE IF NOT EXISTS brand_settings (
+        id uuid PRIMARY KEY,
+        school_name varchar NOT NULL DEFAULT 'My School',
+        principal_name varchar NULL,
+        phone_primary varchar NULL,
+        phone_transport varchar NULL,
+        email_contact varchar NULL,
+        location_address varchar NULL,
+        address_line1 varchar NULL,
+        address_line2 varchar NULL,
+        city varchar NULL,
+        state varchar NULL,
+        country varchar NULL,
+        postal_code varchar NULL,
+        logo_url varchar NULL,
+        website_url varchar NULL,
+        tagline varchar NULL,
+        social_links jsonb NULL,
+        updated_by varchar NULL,
+        updated_at timestamptz DEFAULT now()
+    )"""
+
+async def _ensure_brand_table(db: AsyncSession):
+    """Create brand_settings on legacy DBs; existence comes from the startup schema registry."""
+    await schema_registry.ensure_loaded(db)
+    if schema_registry.has_table('brand_settings'):
+        return
+    async with engine.begin() as conn:
+        await conn.execute(_text(_BRAND_DDL))
+    schema_registry.note_table('brand_settings', [c.name for c in models.BrandSettings.__table__.columns])
+
 @router.get('/brand', response_model=schemas.BrandSettingsOut)
 async def get_brand(db: AsyncSession = Depends(get_db)):
-    try:
-        rec = (await db.execute(select(models.BrandSettings))).scalars().first()
-    except Exception:
-        try:
-            await db.rollback()
-        except Exception:
-            pass
-        async with engine.begin() as conn:
-            await conn.execute(_text("""
-            CREATE TABLE IF NOT EXISTS brand_settings (
-                id uuid PRIMARY KEY,
-                school_name varchar NOT NULL DEFAULT 'My School',
-                principal_name varchar NULL,
-                phone_primary varchar NULL,
-                phone_transport varchar NULL,
-                email_contact varchar NULL,
-                location_address varchar NULL,
-                address_line1 varchar NULL,
-                address_line2 varchar NULL,
-                city varchar NULL,
-                state varchar NULL,
-                country varchar NULL,
-                postal_code varchar NULL,
-                logo_url varchar NULL,
-                website_url varchar NULL,
-                tagline varchar NULL,
-                social_links jsonb NULL,
-                updated_by varchar NULL,
-                updated_at timestamptz DEFAULT now()
-            )"""))
-        rec = (await db.execute(select(models.BrandSettings))).scalars().first()
+    await _ensure_brand_table(db)
+    rec = (await db.execute(select(models.BrandSettings))).scalars().first()
     if not rec:
         rec = models.BrandSettings()
         if not getattr(rec, 'id', None):
@@ -58,37 +62,8 @@ async def get_brand(db: AsyncSession = Depends(get_db)):
 async def update_brand(payload: schemas.BrandSettingsUpdate, db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
     if user.role not in ('admin','staff','moderator'):
         raise HTTPException(status_code=403, detail='Not allowed')
-    try:
-        rec = (await db.execute(select(models.BrandSettings))).scalars().first()
-    except Exception:
-        try:
-            await db.rollback()
-        except Exception:
-            pass
-        async with engine.begin() as conn:
-            await conn.execute(_text("""
-            CREATE TABLE IF NOT EXISTS brand_settings (
-                id uuid PRIMARY KEY,
-                school_name varchar NOT NULL DEFAULT 'My School',
-                principal_name varchar NULL,
-                phone_primary varchar NULL,
-                phone_transport varchar NULL,
-                email_contact varchar NULL,
-                location_address varchar NULL,
-                address_line1 varchar NULL,
-                address_line2 varchar NULL,
-                city varchar NULL,
-                state varchar NULL,
-                country varchar NULL,
-                postal_code varchar NULL,
-                logo_url varchar NULL,
-                website_url varchar NULL,
-                tagline varchar NULL,
-                social_links jsonb NULL,
-                updated_by varchar NULL,
-                updated_at timestamptz DEFAULT now()
-            )"""))
-        rec = (await db.execute(select(models.BrandSettings))).scalars().first()
+    await _ensure_brand_table(db)
+    rec = (await db.execute(select(models.BrandSettings))).scalars().first()
     if not rec:
         rec = models.BrandSettings()
         if not getattr(rec, 'id', None):
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
 from uuid import UUID
 from datetime import datetime
 from typing import Optional
 from app.core.dependencies import get_db, get_current_user
+from app.core.ratelimit import RateLimiter, caller_identity
+from app.core.security import CurrentUser, get_optional_user
 from . import models, schemas
 
 router = APIRouter(prefix="/social", tags=["social"])
 
+SEARCH_LIMIT = RateLimiter('social.search', limit=30, window=60)  # per user
+
 @router.get("/posts", response_model=list[schemas.SocialPostOut])
 async def list_posts(db: AsyncSession = Depends(get_db), user=Depends(get_current_user), platform: Optional[str] = None, status_filter: Optional[str] = None, scheduled_after: Optional[datetime] = None, limit: int = 100):
     q = select(models.SocialPost).order_by(models.SocialPost.created_at.desc()).limit(limit)
@@ -32,7 +36,7 @@ async def create_post(payload: schemas.SocialPostCreate, db: AsyncSession = Depe
     return post
 
 @router.get("/search/posts", response_model=list[schemas.SocialPostSearchResult])
-async def search_posts(q: str, platform: Optional[str] = None, limit: int = 50, lang: str = "english", db: AsyncSession = Depends(get_db), user=Depends(get_current_user)):
+async def search_posts(q: str, request: Request, response: Response, platform: Optional[str] = None, limit: int = 50, lang: str = "english", db: AsyncSession = Depends(get_db), caller: Optional[CurrentUser] = Depends(get_optional_user)):
     if not q or not q.strip():
         raise HTTPException(status_code=400, detail="Empty query")
     if len(q) > 120:
@@ -40,6 +44,7 @@ async def search_posts(q: str, platform: Optional[str] = None, limit: int = 50,
     lang = lang.lower()
     if lang not in {"english","simple"}:
         raise HTTPException(status_code=400, detail="Unsupported language")
+    await SEARCH_LIMIT.check(caller_identity(request, caller), response)
     sql = f"""
         select p.id, p.platform, p.title,
                ts_headline(:lang, p.body, websearch_to_tsquery(:lang, :q)) as snippet,
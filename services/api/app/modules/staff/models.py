@@ -9,6 +9,7 @@ class Staff(Base):
     __tablename__ = 'staff'
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     staff_code: Mapped[str] = mapped_column(String(20), unique=True, nullable=False)
+    employee_id: Mapped[Optional[str]] = mapped_column(String(20), unique=True)  # external HR id; import key
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     role: Mapped[str] = mapped_column(String(50), nullable=False)
     department: Mapped[Optional[str]] = mapped_column(String(80))
@@ -27,6 +28,10 @@ class Staff(Base):
     leave_balance: Mapped[Optional[int]] = mapped_column(Integer, default=0)
     last_appraisal: Mapped[Optional[date]] = mapped_column(Date())
     next_appraisal: Mapped[Optional[date]] = mapped_column(Date())
+    emergency_contact_name: Mapped[Optional[str]] = mapped_column(String(120))
+    emergency_contact_relation: Mapped[Optional[str]] = mapped_column(String(40))
+    emergency_contact_phone: Mapped[Optional[str]] = mapped_column(String(40))
+    emergency_contact_address: Mapped[Optional[str]] = mapped_column(String(255))
     created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
     leave_requests: Mapped[List['StaffLeaveRequest']] = relationship('StaffLeaveRequest', back_populates='staff', cascade='all,delete')
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile
 from typing import Optional
 from pydantic import BaseModel
 from typing import Optional, List
@@ -36,6 +36,10 @@ class LeaveType(str, Enum):
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from ...core.db import get_session
+from ...core.exports import ExportFormat, export_response, export_select, pick_columns
+from ...core.idempotency import Idempotency, idempotent
+from ...core.importer import Check, ImportSpec, run_import, unique_check, upload_sha256
+from ...core.responses import model_list_response
 from ...core.security import require
 from .models import Staff, StaffLeaveRequest, StaffAnnouncement, StaffDuty, StaffSubstitution
 import sqlalchemy as sa
@@ -88,6 +92,7 @@ class StaffUpdate(BaseModel):
 class StaffOut(BaseModel):
     id: int
     staff_code: str
+    employee_id: Optional[str] = None
     name: str
     role: str
     department: Optional[str]
@@ -105,6 +110,10 @@ class StaffOut(BaseModel):
     next_appraisal: Optional[str]
     resignation_date: Optional[str]
     resignation_reason: Optional[str]
+    emergency_contact_name: Optional[str] = None
+    emergency_contact_relation: Optional[str] = None
+    emergency_contact_phone: Optional[str] = None
+    emergency_contact_address: Optional[str] = None
 
     @classmethod
     def from_model(cls, s: Staff):
@@ -112,6 +121,7 @@ class StaffOut(BaseModel):
         return cls(
             id=s.id,
             staff_code=s.staff_code,
+            employee_id=s.employee_id,
             name=s.name,
             role=s.role,
             department=s.department,
@@ -129,6 +139,10 @@ class StaffOut(BaseModel):
             next_appraisal=iso(s.next_appraisal),
             resignation_date=iso(s.resignation_date),
             resignation_reason=s.resignation_reason,
+            emergency_contact_name=s.emergency_contact_name,
+            emergency_contact_relation=s.emergency_contact_relation,
+            emergency_contact_phone=s.emergency_contact_phone,
+            emergency_contact_address=s.emergency_contact_address,
         )
 
 class LeaveRequestCreate(BaseModel):
@@ -252,7 +266,6 @@ async def create_staff(body: StaffCreate, session: AsyncSession = Depends(get_se
 
 @router.get("", response_model=list[StaffOut])
 async def list_staff(
-    response: Response,
     session: AsyncSession = Depends(get_session),
     user=Depends(require('staff:list')),
     offset: int = Query(0, ge=0),
@@ -265,7 +278,7 @@ async def list_staff(
     stmt = select(Staff)
     if search:
         like = f"%{search.lower()}%"
-        stmt = stmt.where(sa.or_(sa.func.lower(Staff.name).like(like), sa.func.lower(Staff.staff_code).like(like)))
+        stmt = stmt.where(sa.or_(sa.func.lower(Staff.name).like(like), sa.func.lower(Staff.staff_code).like(like), sa.func.lower(Staff.employee_id).like(like)))
     if role:
         stmt = stmt.where(Staff.role==role)
     if department:
@@ -275,8 +288,7 @@ async def list_staff(
     total = (await session.execute(stmt.with_only_columns(sa.func.count()))).scalar_one()
     stmt = stmt.order_by(Staff.id.desc()).offset(offset).limit(limit)
     rows = (await session.execute(stmt)).scalars().all()
-    response.headers['X-Total-Count'] = str(total)
-    return [StaffOut.from_model(r) for r in rows]
+    return model_list_response(StaffOut, (StaffOut.from_model(r) for r in rows), headers={'X-Total-Count': str(total)})
 
 @router.get("/id/{staff_id}", response_model=StaffOut)
 async def get_staff(staff_id: int, session: AsyncSession = Depends(get_session), user=Depends(require('staff:detail'))):
@@ -297,6 +309,131 @@ async def update_staff(staff_id: int, body: StaffUpdate, session: AsyncSession =
     await session.commit(); await session.refresh(r)
     return StaffOut.from_model(r)
 
+# -------------------- CSV/XLSX import --------------------
+STAFF_IMPORT_COLUMNS = [
+    'staff_code', 'employee_id', 'name', 'role', 'department', 'grade', 'email', 'phone', 'date_of_joining', 'birthday',
+    'reports_to', 'status', 'attendance_30', 'leave_balance', 'emergency_contact_name', 'emergency_contact_relation',
+    'emergency_contact_phone', 'emergency_contact_address',
+]
+_STAFF_CASTS = {'date_of_joining': 'date', 'birthday': 'date', 'attendance_30': 'int', 'leave_balance': 'int'}
+
+
+def _staff_import_merge() -> str:
+    """Rows match existing staff on employee_id (else staff_code); blank cells keep current values.
+
+    New staff default to staff_code = employee_id, role Teacher, status Active.
+    """
+    val = lambda c: f"CAST(m.{c} AS {_STAFF_CASTS[c]})" if c in _STAFF_CASTS else f"m.{c}"
+    cols = [c for c in STAFF_IMPORT_COLUMNS if c != 'employee_id']
+    new = [f"coalesce({val(c)}, t.{c})" for c in cols]
+    defaults = {
+        'staff_code': "coalesce(m.staff_code, m.employee_id)",
+        'role': "coalesce(m.role, 'Teacher')",
+        'status': "coalesce(m.status, 'Active')",
+        'attendance_30': "coalesce(CAST(m.attendance_30 AS int), 0)",
+        'leave_balance': "coalesce(CAST(m.leave_balance AS int), 0)",
+    }
+    return f"""
+        WITH m AS (
+            SELECT v.*, coalesce(e.id, c.id) AS staff_id
+            FROM {{stage}} v
+            LEFT JOIN staff e ON e.employee_id = v.employee_id
+            LEFT JOIN staff c ON v.employee_id IS NULL AND c.staff_code = v.staff_code
+            WHERE v.error IS NULL
+        ), upd AS (
+            UPDATE staff AS t SET {', '.join(f'{c} = {n}' for c, n in zip(cols, new, strict=True))}, updated_at = now()
+            FROM m
+            WHERE t.id = m.staff_id AND ({', '.join(f't.{c}' for c in cols)}) IS DISTINCT FROM ({', '.join(new)})
+            RETURNING t.id
+        ), ins AS (
+            INSERT INTO staff ({', '.join(STAFF_IMPORT_COLUMNS)}, leaves_taken_ytd, created_at, updated_at)
+            SELECT {', '.join(defaults.get(c, val(c)) for c in STAFF_IMPORT_COLUMNS)}, 0, now(), now()
+            FROM m WHERE m.staff_id IS NULL
+            RETURNING id
+        )
+        SELECT (SELECT count(*) FROM ins) AS created, (SELECT count(*) FROM upd) AS updated
+    """
+
+
+def _in_list(values) -> str:
+    return ", ".join("'" + v.value.replace("'", "''") + "'" for v in values)
+
+
+STAFF_IMPORT = ImportSpec(
+    name='staff',
+    columns=STAFF_IMPORT_COLUMNS,
+    required=['name'],
+    ints=['attendance_30', 'leave_balance'],
+    dates=['date_of_joining', 'birthday'],
+    max_len={
+        'staff_code': 20, 'employee_id': 20, 'name': 120, 'role': 50, 'department': 80, 'grade': 40, 'email': 120,
+        'phone': 40, 'reports_to': 120, 'status': 20, 'emergency_contact_name': 120, 'emergency_contact_relation': 40,
+        'emergency_contact_phone': 40, 'emergency_contact_address': 255,
+    },
+    checks=[
+        Check("s.employee_id IS NULL AND s.staff_code IS NULL", "'employee_id or staff_code required'"),
+        unique_check(['employee_id'], 'employee_id'),
+        unique_check(['staff_code'], 'staff_code'),
+        Check(
+            "s.name IS NULL"
+            " AND NOT EXISTS (SELECT 1 FROM staff st WHERE st.employee_id = s.employee_id)"
+            " AND NOT EXISTS (SELECT 1 FROM staff st WHERE s.employee_id IS NULL AND st.staff_code = s.staff_code)",
+            "'name required'",
+        ),
+        Check(f"s.role NOT IN ({_in_list(StaffRole)})", "'unknown role ' || s.role"),
+        Check(f"s.department NOT IN ({_in_list(Department)})", "'unknown department ' || s.department"),
+        Check("CAST(s.date_of_joining AS date) > current_date", "'date_of_joining cannot be in the future'"),
+        Check("CAST(s.birthday AS date) > current_date", "'birthday cannot be in the future'"),
+        # the code a new (or re-coded) row would write must not belong to someone else
+        Check(
+            "s.employee_id IS NOT NULL"
+            " AND (s.staff_code IS NOT NULL OR NOT EXISTS (SELECT 1 FROM staff e WHERE e.employee_id = s.employee_id))"
+            " AND EXISTS (SELECT 1 FROM staff o WHERE o.staff_code = coalesce(s.staff_code, s.employee_id)"
+            " AND o.employee_id IS DISTINCT FROM s.employee_id)",
+            "'staff_code ' || coalesce(s.staff_code, s.employee_id) || ' already in use'",
+        ),
+    ],
+    merge=_staff_import_merge(),
+)
+
+@router.post('/import')
+async def import_staff(file: UploadFile = File(...), dry_run: bool = Query(False), session: AsyncSession = Depends(get_session), user=Depends(require('staff:create')), idem: Idempotency = Depends(idempotent('staff.import', per_user=True))):
+    """Create/update staff from CSV or XLSX (columns: STAFF_IMPORT_COLUMNS); returns created/updated and per-row errors."""
+    cached = await idem.begin({'sha256': await upload_sha256(file), 'dry_run': dry_run})
+    if cached is not None:
+        return cached
+    result = await run_import(session, STAFF_IMPORT, file, dry_run=dry_run)
+    return await idem.complete(result.as_dict())
+
+STAFF_EXPORT = {
+    'id': Staff.id,
+    **{c: getattr(Staff, c) for c in STAFF_IMPORT_COLUMNS},
+    'leaves_taken_ytd': Staff.leaves_taken_ytd,
+    'last_appraisal': Staff.last_appraisal,
+    'next_appraisal': Staff.next_appraisal,
+    'resignation_date': Staff.resignation_date,
+    'resignation_reason': Staff.resignation_reason,
+}
+
+@router.get('/export')
+async def export_staff(
+    format: ExportFormat = ExportFormat.csv,
+    columns: Optional[str] = None,
+    role: Optional[str] = None,
+    department: Optional[str] = None,
+    status: Optional[str] = None,
+    user=Depends(require('staff:list')),
+):
+    """Stream staff as CSV/XLSX/Parquet; the default columns re-import through ``/staff/import``."""
+    stmt = export_select(STAFF_EXPORT, pick_columns(STAFF_EXPORT, columns)).order_by(Staff.id)
+    if role:
+        stmt = stmt.where(Staff.role==role)
+    if department:
+        stmt = stmt.where(Staff.department==department)
+    if status:
+        stmt = stmt.where(Staff.status==status)
+    return export_response(stmt, format, 'staff')
+
 @router.post('/leave', response_model=LeaveRequestOut)
 async def create_leave(body: LeaveRequestCreate, session: AsyncSession = Depends(get_session), user=Depends(require('staff:leave'))):
     staff = (await session.execute(select(Staff).where(Staff.id==body.staff_id))).scalar_one_or_none()
@@ -26,6 +26,7 @@ class StudentTransport(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class AttendanceEvent(Base):
+    # Range-partitioned by academic year in Postgres (alembic_clean 20251018_0600); the PK there is (id, date).
     __tablename__ = 'attendance_events'
     __table_args__ = (
         # Support ON CONFLICT (student_id, date) DO NOTHING in seed script.
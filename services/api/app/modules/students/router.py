@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
@@ -7,7 +7,11 @@ import sqlalchemy as sa
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from ...core.db import get_session
+from ...core.exports import ExportFormat, export_response, export_select, pick_columns
+from ...core.replica import get_read_session, read_session
+from ...core.responses import model_list_response, stream_json_array
 from ...core.security import require
+from ..classes.roster import invalidate_rosters
 from .models import Student as LegacyStudent
 from .models_extra import StudentTag, StudentTransport, AttendanceEvent, FeeInvoice
 from ..core.models_new import CoreStudent as NewStudent, Enrollment, ClassSection, AcademicYear, School  # type: ignore
@@ -169,10 +173,24 @@ async def create_student(body: StudentCreate, session: AsyncSession = Depends(ge
             await session.commit()
         except Exception:
             await session.rollback()
+    await invalidate_rosters(classes=[(klass_val, body.section)])
     return StudentOut.from_model(student)
 
 @router.get("", response_model=list[StudentOut])
-async def list_students(session: AsyncSession = Depends(get_session), user=Depends(require('students:list'))):
+async def list_students(
+    session: AsyncSession = Depends(get_read_session),
+    user=Depends(require('students:list')),
+    stream: bool = Query(False, description="Return every student as a chunked JSON array instead of the latest 200"),
+):
+    if USE_NEW_STUDENT_MODEL:
+        if stream:
+            return stream_json_array(_stream_new_students(), lambda s: StudentOut.from_model(s).model_dump(mode='json'))
+        # Simplified listing for new model (no derived aggregates yet)
+        stmt = select(NewStudent).order_by(NewStudent.id.desc()).limit(200)
+        result = await session.execute(stmt)
+        students = result.scalars().all()
+        return model_list_response(StudentOut, (StudentOut.from_model(s) for s in students))
+
     # Correlated subqueries to compute dynamic values from normalization tables.
     attendance_pct_expr = (
         select(
@@ -183,8 +201,8 @@ async def list_students(session: AsyncSession = Depends(get_session), user=Depen
                 ).cast(sa.Integer), 0
             )
         )
-        .where(AttendanceEvent.student_id == Student.id)
-        .correlate(Student)
+        .where(AttendanceEvent.student_id == LegacyStudent.id)
+        .correlate(LegacyStudent)
         .scalar_subquery()
     )
 
@@ -192,16 +210,16 @@ async def list_students(session: AsyncSession = Depends(get_session), user=Depen
         select(
             func.coalesce(func.sum(FeeInvoice.amount - FeeInvoice.paid_amount), 0)
         )
-        .where(FeeInvoice.student_id == Student.id)
+        .where(FeeInvoice.student_id == LegacyStudent.id)
         .where(FeeInvoice.settled_at.is_(None))
-        .correlate(Student)
+        .correlate(LegacyStudent)
         .scalar_subquery()
     )
 
     tags_expr = (
         select(func.string_agg(StudentTag.tag, literal(',')))
-        .where(StudentTag.student_id == Student.id)
-        .correlate(Student)
+        .where(StudentTag.student_id == LegacyStudent.id)
+        .correlate(LegacyStudent)
         .scalar_subquery()
     )
 
@@ -209,47 +227,104 @@ async def list_students(session: AsyncSession = Depends(get_session), user=Depen
         select(
             func.json_build_object('route', StudentTransport.route, 'stop', StudentTransport.stop)
         )
-        .where(StudentTransport.student_id == Student.id)
+        .where(StudentTransport.student_id == LegacyStudent.id)
         .where(StudentTransport.active == 1)
         .order_by(StudentTransport.updated_at.desc())
         .limit(1)
-        .correlate(Student)
+        .correlate(LegacyStudent)
         .scalar_subquery()
     )
 
-    if USE_NEW_STUDENT_MODEL:
-        # Simplified listing for new model (no derived aggregates yet)
-        stmt = select(NewStudent).order_by(NewStudent.id.desc()).limit(200)
-        result = await session.execute(stmt)
-        students = result.scalars().all()
-        return [StudentOut.from_model(s) for s in students]
-    else:
-        stmt = (
-            select(
-                LegacyStudent,
-                attendance_pct_expr.label('attendance_pct_calc'),
-                fee_due_expr.label('fee_due_amount_calc'),
-                tags_expr.label('tags_calc'),
-                transport_expr.label('transport_calc')
-            )
-            .order_by(LegacyStudent.id.desc())
-            .limit(200)
+    stmt = (
+        select(
+            LegacyStudent,
+            attendance_pct_expr.label('attendance_pct_calc'),
+            fee_due_expr.label('fee_due_amount_calc'),
+            tags_expr.label('tags_calc'),
+            transport_expr.label('transport_calc')
         )
-        result = await session.execute(stmt)
-        rows = result.all()
-        out: List[StudentOut] = []
-        for student, attendance_pct_calc, fee_due_calc, tags_calc, transport_calc in rows:
-            model_out = StudentOut.from_model(student)
-            if attendance_pct_calc is not None:
-                model_out.attendance_pct = int(attendance_pct_calc)
-            if fee_due_calc is not None:
-                model_out.fee_due_amount = int(fee_due_calc)
-            if tags_calc:
-                model_out.tags = [t for t in tags_calc.split(',') if t]
-            if transport_calc is not None:
-                model_out.transport = transport_calc
-            out.append(model_out)
-        return out
+        .order_by(LegacyStudent.id.desc())
+        .limit(200)
+    )
+    result = await session.execute(stmt)
+    rows = result.all()
+    out: List[StudentOut] = []
+    for student, attendance_pct_calc, fee_due_calc, tags_calc, transport_calc in rows:
+        model_out = StudentOut.from_model(student)
+        if attendance_pct_calc is not None:
+            model_out.attendance_pct = int(attendance_pct_calc)
+        if fee_due_calc is not None:
+            model_out.fee_due_amount = int(fee_due_calc)
+        if tags_calc:
+            model_out.tags = [t for t in tags_calc.split(',') if t]
+        if transport_calc is not None:
+            model_out.transport = transport_calc
+        out.append(model_out)
+    return model_list_response(StudentOut, out)
+
+async def _stream_new_students():
+    # Own session: the request-scoped one is closed before a streaming body is sent.
+    # read_session applies the replica health/lag checks and falls back to the primary.
+    async with read_session() as session:
+        result = await session.stream_scalars(select(NewStudent).order_by(NewStudent.id.desc()).execution_options(yield_per=500))
+        async for student in result:
+            yield student
+
+
+_export_attendance = (
+    select(
+        AttendanceEvent.student_id,
+        ((func.sum(case((AttendanceEvent.present == 1, 1), else_=0)) * 100) / func.nullif(func.count(AttendanceEvent.id), 0)).cast(sa.Integer).label('pct'),
+    )
+    .group_by(AttendanceEvent.student_id)
+    .subquery('att')
+)
+_export_fees = (
+    select(FeeInvoice.student_id, func.sum(FeeInvoice.amount - FeeInvoice.paid_amount).label('due'))
+    .where(FeeInvoice.settled_at.is_(None))
+    .group_by(FeeInvoice.student_id)
+    .subquery('fees')
+)
+STUDENT_EXPORT = {
+    'id': LegacyStudent.id,
+    'admission_no': LegacyStudent.admission_no,
+    'first_name': LegacyStudent.first_name,
+    'last_name': LegacyStudent.last_name,
+    'class': LegacyStudent.class_,
+    'section': LegacyStudent.section,
+    'roll': LegacyStudent.roll,
+    'gender': LegacyStudent.gender,
+    'guardian_phone': LegacyStudent.guardian_phone,
+    'tags': LegacyStudent.tags,
+    'attendance_pct': func.coalesce(_export_attendance.c.pct, 0),
+    'fee_due_amount': func.coalesce(_export_fees.c.due, 0),
+    'created_at': LegacyStudent.created_at,
+}
+
+@router.get("/export")
+async def export_students(
+    format: ExportFormat = ExportFormat.csv,
+    columns: Optional[str] = None,
+    klass: Optional[str] = None,
+    section: Optional[str] = None,
+    user=Depends(require('students:list')),
+):
+    """Stream the class rosters (``students`` table) with all-time attendance % and outstanding fees.
+
+    The aggregates are one grouped pass each, joined once; unused ones are pruned by the planner.
+    """
+    stmt = (
+        export_select(STUDENT_EXPORT, pick_columns(STUDENT_EXPORT, columns))
+        .select_from(LegacyStudent)
+        .outerjoin(_export_attendance, _export_attendance.c.student_id == LegacyStudent.id)
+        .outerjoin(_export_fees, _export_fees.c.student_id == LegacyStudent.id)
+        .order_by(LegacyStudent.class_, LegacyStudent.section, LegacyStudent.roll, LegacyStudent.id)
+    )
+    if klass:
+        stmt = stmt.where(LegacyStudent.class_ == klass)
+    if section:
+        stmt = stmt.where(LegacyStudent.section == section)
+    return export_response(stmt, format, 'students')
 
 
 class MessageRequest(BaseModel):
@@ -271,6 +346,7 @@ async def update_student(student_id: int, body: StudentPatch, session: AsyncSess
     s = result.scalar_one_or_none()
     if not s:
         raise HTTPException(404, 'Student not found')
+    previous_class = (s.class_, s.section)
     # Update core fields
     updates = body.dict(exclude_unset=True)
     core_fields = ['first_name','last_name','klass','section','guardian_phone']
@@ -305,6 +381,7 @@ async def update_student(student_id: int, body: StudentPatch, session: AsyncSess
         await session.rollback()
         raise HTTPException(409, 'Conflict updating student')
     await session.refresh(s)
+    await invalidate_rosters(student_ids=[s.id], classes=[previous_class, (s.class_, s.section)])
     # Re-fetch dynamic aggregates using single-row version of list logic if needed
     out = StudentOut.from_model(s)
     # Gather derived values
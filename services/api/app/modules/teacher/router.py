@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, text
+from sqlalchemy import select, func, and_
+from app.core.config import settings
 from app.core.db import get_session
+from app.core.replica import get_read_session
+from app.core.schema_registry import schema_registry
 from app.core.security import get_current_user, require
 from app.core.tenant import audit
 from typing import Any
@@ -11,6 +14,8 @@ router = APIRouter(prefix="/teacher", tags=["teacher"])
 # Placeholder models imports - adjust when actual teacher/class models consolidated
 from app.modules.core import models_new as core_models
 from app.modules.attendance import models as attendance_models
+from app.modules.attendance.service import upsert_marks
+from app.modules.attendance.sync import SYNC_TABLE, changes_since, conflicting_marks, parse_token
 from app.modules.gallery import models as gallery_models
 from datetime import date, timedelta
 from pydantic import BaseModel
@@ -25,11 +30,18 @@ class AttendanceSubmitIn(BaseModel):
     date: date
     marks: list[AttendanceMarkIn]
 
+class AttendanceSyncMarkIn(AttendanceMarkIn):
+    date: date
+
+class AttendanceSyncIn(BaseModel):
+    token: Optional[str] = None  # from the previous sync response; omit on first sync
+    marks: list[AttendanceSyncMarkIn] = []
+
 VALID_ATT_STATUS = {'present','absent','late','excused'}
 
 # TEMP DEV: removed permission dependency require('teacher:overview_read') while RBAC disabled
 @router.get('/overview')
-async def teacher_overview(session: AsyncSession = Depends(get_session), current_user=Depends(get_current_user)):
+async def teacher_overview(session: AsyncSession = Depends(get_read_session), current_user=Depends(get_current_user)):
     """Aggregate dashboard for a teacher.
 
     Returns counts, attendance completion for today, last 7 day attendance rates per class,
@@ -305,19 +317,67 @@ async def submit_class_attendance(class_section_id: int, payload: AttendanceSubm
     class_student_ids = {r.student_id for r in (await session.execute(enroll_q)).all()}
     if not class_student_ids:
         raise HTTPException(status_code=404, detail='Class empty or not found')
-    # Upsert each mark
-    # Using ON CONFLICT (student_id,date) DO UPDATE
-    for m in payload.marks:
-        if m.student_id not in class_student_ids:
-            continue  # ignore out of class marks silently
-        stmt = text("""
-            INSERT INTO attendance_student (student_id, date, status)
-            VALUES (:sid, :dt, :st)
-            ON CONFLICT (student_id, date) DO UPDATE SET status = EXCLUDED.status
-        """)
-        await session.execute(stmt, {'sid': m.student_id, 'dt': payload.date, 'st': m.status})
+    # Out-of-class marks are ignored silently; the rest go in as one set-based upsert
+    marks = [(m.student_id, payload.date, m.status) for m in payload.marks if m.student_id in class_student_ids]
+    result = await upsert_marks(session, marks)
+    await session.commit()
+    return {
+        'ok': True,
+        'inserted': result.inserted,
+        'updated': result.updated,
+        'unchanged': result.unchanged,
+        'skipped': result.skipped,
+        'ignored_out_of_class': len(payload.marks) - len(marks),
+    }
+
+
+@router.post('/class/{class_section_id}/attendance/sync')
+async def sync_class_attendance(
+    class_section_id: int,
+    payload: AttendanceSyncIn,
+    days: Optional[int] = Query(None, ge=1, le=366, description="Window of dates returned; default ATTENDANCE_SYNC_DAYS"),
+    session: AsyncSession = Depends(get_session),
+    current_user=Depends(get_current_user),
+):
+    """Apply queued offline marks and return the class's marks changed since ``token``.
+
+    Response: { token, reset, changes: [{student_id, date, status, seq}], conflicts, rejected, applied }.
+    Keep ``token`` for the next call; on ``reset`` replace the local cache with ``changes``.
+    ``rejected`` marks (``reason``: ``not_in_class`` or ``unknown_student``) were not
+    written and will not be, so the client should surface them rather than retry.
+    See app/modules/attendance/sync.py for the protocol.
+    """
+    invalid = [m.status for m in payload.marks if m.status not in VALID_ATT_STATUS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid statuses: {sorted(set(invalid))}")
+    enroll_q = select(core_models.Enrollment.student_id).where(core_models.Enrollment.class_section_id==class_section_id)
+    class_student_ids = {r.student_id for r in (await session.execute(enroll_q)).all()}
+    if not class_student_ids:
+        raise HTTPException(status_code=404, detail='Class empty or not found')
+    await schema_registry.ensure_loaded(session)
+    tracked = schema_registry.has_table(SYNC_TABLE)
+    since = parse_token(payload.token, class_section_id)
+
+    marks = [(m.student_id, m.date, m.status) for m in payload.marks if m.student_id in class_student_ids]
+    rejected = [{'student_id': m.student_id, 'date': m.date, 'reason': 'not_in_class'}
+                for m in payload.marks if m.student_id not in class_student_ids]
+    conflicts = await conflicting_marks(session, class_section_id, since, marks) if tracked and since is not None else set()
+    applied = await upsert_marks(session, [m for m in marks if (m[0], m[1]) not in conflicts])
     await session.commit()
-    return { 'ok': True, 'updated': len(payload.marks) }
+    # Enrolled ids missing from ``students`` are skipped by the write; report them so the client keeps them.
+    rejected += [{'student_id': sid, 'date': d, 'reason': 'unknown_student'}
+                 for sid, d in dict.fromkeys((m[0], m[1]) for m in marks)
+                 if sid in applied.skipped_ids and (sid, d) not in conflicts]
+
+    start = date.today() - timedelta(days=(days or settings.attendance_sync_days) - 1)
+    result = await changes_since(session, class_section_id, since, start, tracked=tracked)
+    result.conflicts = [{'student_id': sid, 'date': d, 'status': st} for sid, d, st in marks if (sid, d) in conflicts]
+    return {
+        **result.as_dict(),
+        'rejected': rejected,
+        'applied': {'inserted': applied.inserted, 'updated': applied.updated, 'unchanged': applied.unchanged,
+                    'skipped': applied.skipped},
+    }
 
 
 # ---------------- Timetable stub (Phase D) -----------------
@@ -0,0 +1,48 @@
+"""Nightly rebuild of the attendance_month bitmaps.
+
+Run daily (``python -m app.workers.attendance_month_reconcile``): recomputes the
+months overlapping the last ATTENDANCE_MONTH_RECONCILE_DAYS from
+attendance_events / attendance_student. Triggers keep the bitmaps current
+between runs; the number of rows this job has to correct is exported as a
+drift signal.
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Optional
+from prometheus_client import Counter
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.modules.attendance.bitmap import rebuild
+
+log = logging.getLogger(__name__)
+
+RUN_INTERVAL = 24 * 3600
+
+ATTENDANCE_MONTH_CORRECTED = Counter('attendance_month_reconcile_rows_total', 'attendance_month rows corrected by reconciliation')
+
+
+async def run_once(today: Optional[date] = None, days: Optional[int] = None) -> dict:
+    today = today or date.today()
+    start = today - timedelta(days=days if days is not None else settings.attendance_month_reconcile_days)
+    async with SessionLocal() as session:
+        changed = await rebuild(session, start, today)
+        await session.commit()
+    ATTENDANCE_MONTH_CORRECTED.inc(changed)
+    return {'from': start.isoformat(), 'to': today.isoformat(), 'changed': changed}
+
+
+async def run_forever():
+    log.info("Attendance month reconcile worker started")
+    while True:
+        try:
+            result = await run_once()
+            log.info("Attendance month reconcile run: %s", result)
+            await asyncio.sleep(RUN_INTERVAL)
+        except Exception:
+            log.exception("Attendance month reconcile error")
+            await asyncio.sleep(300)
+
+
+if __name__ == '__main__':
+    asyncio.run(run_forever())
@@ -0,0 +1,103 @@
+"""Attendance partition maintenance.
+
+Run daily (``python -m app.workers.attendance_partitions``):
+  * creates the academic-year partitions of attendance_events / attendance_student
+    for the current and next year (rows that fell into DEFAULT are moved in)
+  * when ATTENDANCE_KEEP_CLOSED_YEARS > 0, detaches closed years beyond that many
+    and moves them to the ``attendance_archive`` schema (metadata change, no row
+    copy). Archived days drop out of the daily-table queries; attendance_month
+    bitmaps keep their monthly summaries.
+  * prunes attendance_sync change-log rows for days older than ATTENDANCE_SYNC_DAYS
+    (teacher clients never sync further back)
+"""
+import asyncio
+import logging
+import re
+from datetime import date, timedelta
+from typing import Iterable, Optional
+from prometheus_client import Counter
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.db import engine
+
+log = logging.getLogger(__name__)
+
+RUN_INTERVAL = 24 * 3600
+TABLES = ('attendance_events', 'attendance_student')
+ARCHIVE_SCHEMA = 'attendance_archive'
+PARTITION_RE = re.compile(r'^(attendance_events|attendance_student)_ay(\d{4})$')
+
+ATTENDANCE_PARTITIONS_DETACHED = Counter('attendance_partitions_detached_total', 'Attendance partitions moved to the archive schema')
+
+_LIST_PARTITIONS = text("""
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    join pg_class p on p.oid = i.inhparent
+    join pg_namespace n on n.oid = p.relnamespace
+    where n.nspname = 'public' and p.relname = :table
+""")
+
+
+def academic_year(d: date, start_month: int) -> int:
+    """Calendar year the academic year containing ``d`` starts in (2025 for 2025-26)."""
+    return d.year if d.month >= start_month else d.year - 1
+
+
+def expired(names: Iterable[str], today: date, keep_closed: int, start_month: int) -> list[str]:
+    """Yearly partitions more than ``keep_closed`` closed years behind the current one."""
+    if keep_closed <= 0:
+        return []
+    oldest_kept = academic_year(today, start_month) - keep_closed
+    out = []
+    for name in names:
+        m = PARTITION_RE.match(name)
+        if m and int(m.group(2)) < oldest_kept:
+            out.append(name)
+    return sorted(out)
+
+
+async def run_once(today: Optional[date] = None) -> dict:
+    today = today or date.today()
+    start_month = settings.academic_year_start_month
+    created = 0
+    detached = []
+    for table in TABLES:
+        async with engine.begin() as conn:
+            created += (await conn.execute(
+                text("select attendance_ensure_partitions(:t, :f, :to, :m)"),
+                {'t': table, 'f': today, 'to': today + timedelta(days=366), 'm': start_month},
+            )).scalar() or 0
+            names = [r[0] for r in (await conn.execute(_LIST_PARTITIONS, {'table': table})).all()]
+        for name in expired(names, today, settings.attendance_keep_closed_years, start_month):
+            # One transaction per partition: a lock timeout only delays that year.
+            async with engine.begin() as conn:
+                await conn.execute(text(f'ALTER TABLE public.{table} DETACH PARTITION public."{name}"'))
+                await conn.execute(text(f'ALTER TABLE public."{name}" SET SCHEMA {ARCHIVE_SCHEMA}'))
+            ATTENDANCE_PARTITIONS_DETACHED.inc()
+            detached.append(name)
+            log.info("Archived attendance partition %s", name)
+    async with engine.begin() as conn:
+        pruned = 0
+        if (await conn.execute(text("select to_regclass('attendance_sync')"))).scalar() is not None:
+            pruned = (await conn.execute(
+                text("delete from attendance_sync where date < :cutoff"),
+                {'cutoff': today - timedelta(days=settings.attendance_sync_days)},
+            )).rowcount
+    return {'created': created, 'detached': detached, 'sync_pruned': pruned}
+
+
+async def run_forever():
+    log.info("Attendance partition worker started")
+    while True:
+        try:
+            result = await run_once()
+            log.info("Attendance partition run: %s", result)
+            await asyncio.sleep(RUN_INTERVAL)
+        except Exception:
+            log.exception("Attendance partition error")
+            await asyncio.sleep(300)
+
+
+if __name__ == '__main__':
+    asyncio.run(run_forever())
@@ -0,0 +1,104 @@
+"""Audit log partition maintenance.
+
+Run daily (``python -m app.workers.audit_retention``):
+  * creates monthly partitions of core.audit_log for the next few months
+  * detaches partitions whose whole month is older than AUDIT_RETENTION_DAYS and
+    moves them to the ``audit_archive`` schema (cheap metadata change, no row copy)
+  * optionally drops archived partitions once AUDIT_ARCHIVE_DROP_DAYS have passed
+"""
+import asyncio
+import logging
+import re
+from datetime import date, timedelta
+from typing import Iterable, Optional
+from prometheus_client import Counter
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.db import engine
+
+log = logging.getLogger(__name__)
+
+RUN_INTERVAL = 24 * 3600
+MONTHS_AHEAD = 3
+ARCHIVE_SCHEMA = 'audit_archive'
+PARTITION_RE = re.compile(r'^audit_log_y(\d{4})m(\d{2})$')
+
+AUDIT_PARTITIONS_DETACHED = Counter('audit_partitions_detached_total', 'Audit partitions moved to the archive schema')
+AUDIT_PARTITIONS_DROPPED = Counter('audit_partitions_dropped_total', 'Archived audit partitions dropped')
+
+_LIST_PARTITIONS = text("""
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    join pg_class p on p.oid = i.inhparent
+    join pg_namespace n on n.oid = p.relnamespace
+    where n.nspname = 'core' and p.relname = 'audit_log'
+""")
+_LIST_ARCHIVED = text("""
+    select table_name from information_schema.tables
+    where table_schema = :schema and table_name like 'audit_log_y%'
+""")
+
+
+def partition_end(name: str) -> Optional[date]:
+    """Exclusive upper bound of a monthly partition, from its name."""
+    m = PARTITION_RE.match(name)
+    if not m:
+        return None
+    year, month = int(m.group(1)), int(m.group(2))
+    return date(year + month // 12, month % 12 + 1, 1)
+
+
+def expired(names: Iterable[str], today: date, keep_days: int) -> list[str]:
+    cutoff = today - timedelta(days=keep_days)
+    out = []
+    for name in names:
+        end = partition_end(name)
+        if end is not None and end <= cutoff:
+            out.append(name)
+    return sorted(out)
+
+
+async def run_once(today: Optional[date] = None) -> dict:
+    today = today or date.today()
+    async with engine.begin() as conn:
+        created = (await conn.execute(
+            text("select core.audit_log_ensure_partitions(:f, :t)"),
+            {'f': today, 't': today + timedelta(days=31 * MONTHS_AHEAD)},
+        )).scalar()
+        names = [r[0] for r in (await conn.execute(_LIST_PARTITIONS)).all()]
+    detached = []
+    for name in expired(names, today, settings.audit_retention_days):
+        # One transaction per partition: a lock timeout only delays that month.
+        async with engine.begin() as conn:
+            await conn.execute(text(f'ALTER TABLE core.audit_log DETACH PARTITION core."{name}"'))
+            await conn.execute(text(f'ALTER TABLE core."{name}" SET SCHEMA {ARCHIVE_SCHEMA}'))
+        AUDIT_PARTITIONS_DETACHED.inc()
+        detached.append(name)
+        log.info("Archived audit partition %s", name)
+    dropped = []
+    if settings.audit_archive_drop_days > 0:
+        async with engine.begin() as conn:
+            archived = [r[0] for r in (await conn.execute(_LIST_ARCHIVED, {'schema': ARCHIVE_SCHEMA})).all()]
+            for name in expired(archived, today, settings.audit_retention_days + settings.audit_archive_drop_days):
+                await conn.execute(text(f'DROP TABLE {ARCHIVE_SCHEMA}."{name}"'))
+                AUDIT_PARTITIONS_DROPPED.inc()
+                dropped.append(name)
+                log.info("Dropped archived audit partition %s", name)
+    return {'created': created or 0, 'detached': detached, 'dropped': dropped}
+
+
+async def run_forever():
+    log.info("Audit retention worker started")
+    while True:
+        try:
+            result = await run_once()
+            log.info("Audit retention run: %s", result)
+            await asyncio.sleep(RUN_INTERVAL)
+        except Exception:
+            log.exception("Audit retention error")
+            await asyncio.sleep(300)
+
+
+if __name__ == '__main__':
+    asyncio.run(run_forever())
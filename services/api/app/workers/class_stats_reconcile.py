@@ -0,0 +1,47 @@
+"""Nightly reconciliation of the class_daily_stats rollup.
+
+Run daily (``python -m app.workers.class_stats_reconcile``): recomputes present /
+absent / late for the last CLASS_STATS_RECONCILE_DAYS and today's enrolment and
+fee state from the base tables. Triggers keep the rollup current between runs;
+the number of rows this job has to correct is exported as a drift signal.
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import Optional
+from prometheus_client import Counter
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.modules.classes.rollup import reconcile
+
+log = logging.getLogger(__name__)
+
+RUN_INTERVAL = 24 * 3600
+
+CLASS_STATS_CORRECTED = Counter('class_stats_reconcile_rows_total', 'class_daily_stats rows corrected by reconciliation')
+
+
+async def run_once(today: Optional[date] = None, days: Optional[int] = None) -> dict:
+    today = today or date.today()
+    start = today - timedelta(days=days if days is not None else settings.class_stats_reconcile_days)
+    async with SessionLocal() as session:
+        changed = await reconcile(session, start, today)
+        await session.commit()
+    CLASS_STATS_CORRECTED.inc(changed)
+    return {'from': start.isoformat(), 'to': today.isoformat(), 'changed': changed}
+
+
+async def run_forever():
+    log.info("Class stats reconcile worker started")
+    while True:
+        try:
+            result = await run_once()
+            log.info("Class stats reconcile run: %s", result)
+            await asyncio.sleep(RUN_INTERVAL)
+        except Exception:
+            log.exception("Class stats reconcile error")
+            await asyncio.sleep(300)
+
+
+if __name__ == '__main__':
+    asyncio.run(run_forever())
@@ -0,0 +1,63 @@
+"""Attendance summary benchmark (needs the migrated database from DATABASE_URL).
+
+Runs the school-wide per-student percentage query for a window two ways:
+
+  before  masks folded on the fly from attendance_events / attendance_student
+          (one row per student per day)
+  after   ``attendance_month`` bitmaps (one row per student per month)
+
+Both return identical counts; the script checks that before printing timings.
+
+Run (example):
+  python -m scripts.bench_attendance_summary --start 2025-04-01 --end 2026-03-31 --repeat 5
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+from datetime import date
+
+from sqlalchemy import select
+
+from app.core import db
+from app.modules.attendance.bitmap import month_source, windowed_counts
+
+
+def _stmt(use_table: bool, start: date, end: date):
+    src = month_source(use_table, start, end)
+    return select(src.c.student_id, *windowed_counts(src, start, end)).group_by(src.c.student_id).order_by(src.c.student_id)
+
+
+async def _timed(use_table: bool, start: date, end: date, repeat: int) -> tuple[float, list]:
+    best, rows = float('inf'), []
+    async with db.SessionLocal() as s:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            rows = (await s.execute(_stmt(use_table, start, end))).all()
+            best = min(best, time.perf_counter() - t0)
+    return best, [tuple(r) for r in rows]
+
+
+async def run(start: date, end: date, repeat: int) -> None:
+    try:
+        t_b, before = await _timed(False, start, end, repeat)
+        t_a, after = await _timed(True, start, end, repeat)
+        if before != after:
+            raise SystemExit("bitmap counts differ from the daily tables; run attendance_month_rebuild first")
+        print(f"{len(after):6d} students {start}..{end}  before {t_b * 1000:9.1f} ms  "
+              f"after {t_a * 1000:7.1f} ms  speedup x{t_b / t_a:.1f}")
+    finally:
+        await db.engine.dispose()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--start', type=date.fromisoformat, default=date(date.today().year - 1, 4, 1))
+    ap.add_argument('--end', type=date.fromisoformat, default=date.today())
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+    asyncio.run(run(args.start, args.end, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Attendance write benchmark (needs the database from DATABASE_URL).
+
+Writes one day of marks for a 40-student class and a 3,000-student school two
+ways, each run once as first marks (inserts) and once as corrections (updates):
+
+  before  per-mark SELECT + ORM add / attribute update, one commit
+          (the previous /attendance/bulk shape)
+  after   ``attendance.service.upsert_marks`` (one unnest upsert per 10k marks)
+
+Seeds throwaway ``students`` rows (first_name 'AttBench ...') and deletes them
+afterwards; attendance rows go with them via ON DELETE CASCADE.
+
+Run (example):
+  python -m scripts.bench_attendance_writes --sizes 40 3000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event, select, text
+
+from app.core import db
+from app.modules.attendance.models import AttendanceStudent
+from app.modules.attendance.service import upsert_marks
+
+
+async def _seed(n: int) -> list[int]:
+    async with db.SessionLocal() as s:
+        res = await s.execute(text(
+            "INSERT INTO students (first_name, class, section) "
+            "SELECT 'AttBench ' || i, '9', 'Z' FROM generate_series(1, :n) i RETURNING id"
+        ), {'n': n})
+        ids = [r[0] for r in res.all()]
+        await s.commit()
+        return ids
+
+
+async def _cleanup() -> None:
+    async with db.SessionLocal() as s:
+        await s.execute(text("DELETE FROM students WHERE first_name LIKE 'AttBench %'"))
+        await s.commit()
+
+
+async def _before(marks) -> None:
+    async with db.SessionLocal() as s:
+        for sid, day, status in marks:
+            existing = (await s.execute(select(AttendanceStudent).where(AttendanceStudent.student_id == sid, AttendanceStudent.date == day))).scalars().first()
+            if existing:
+                existing.status = status
+            else:
+                s.add(AttendanceStudent(student_id=sid, date=day, status=status))
+        await s.commit()
+
+
+async def _after(marks) -> None:
+    async with db.SessionLocal() as s:
+        await upsert_marks(s, marks)
+        await s.commit()
+
+
+async def _timed(fn, marks) -> tuple[float, int]:
+    statements = 0
+
+    def _count(*_args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(db.engine.sync_engine, 'before_cursor_execute', _count)
+    try:
+        start = time.perf_counter()
+        await fn(marks)
+        return time.perf_counter() - start, statements
+    finally:
+        event.remove(db.engine.sync_engine, 'before_cursor_execute', _count)
+
+
+async def run(sizes: list[int]) -> None:
+    await _cleanup()
+    try:
+        for n in sizes:
+            ids = await _seed(n)
+            # separate days so both paths start from the same state
+            days = {'before': date(2001, 1, 1) + timedelta(days=n % 100), 'after': date(2001, 6, 1) + timedelta(days=n % 100)}
+            for phase, status in (('insert', 'present'), ('update', 'absent')):
+                rows = []
+                for label, fn in (('before', _before), ('after', _after)):
+                    marks = [(sid, days[label], status) for sid in ids]
+                    rows.append(await _timed(fn, marks))
+                (t_b, q_b), (t_a, q_a) = rows
+                print(f"{n:6d} marks {phase:6s}  before {t_b * 1000:9.1f} ms ({q_b:5d} stmts)  "
+                      f"after {t_a * 1000:7.1f} ms ({q_a:2d} stmts)  speedup x{t_b / t_a:.1f}")
+            await _cleanup()
+    finally:
+        await _cleanup()
+        await db.engine.dispose()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--sizes', type=int, nargs='+', default=[40, 3000])
+    args = ap.parse_args()
+    asyncio.run(run(args.sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""List serialisation benchmark (no DB).
+
+Renders 5,000-row ``/staff`` and ``/classes-admin`` style responses two ways:
+
+  before  validated model constructors + ``response_model`` re-validation +
+          default JSONResponse (the previous handler shape)
+  after   models built once + ``model_list_response`` (one pydantic-core
+          dump), under ORJSONResponse as default class
+
+Rows are synthetic objects shaped like the ORM rows, so the numbers isolate
+serialisation cost from query time.
+
+Run (example):
+  python -m scripts.bench_serialization --rows 5000 --iterations 20
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import time
+from datetime import date
+from types import SimpleNamespace
+from typing import List
+
+import httpx
+from fastapi import FastAPI
+
+from app.core.responses import ORJSONResponse, model_list_response
+from app.modules.classes.router_wings import ClassOut
+from app.modules.staff.router import StaffOut
+
+
+def _staff_rows(n: int):
+    return [SimpleNamespace(
+        id=i, staff_code=f"S{i:05d}", name=f"Staff {i}", role='Teacher', department='Science', grade='T2',
+        email=f"s{i}@school.test", phone='9999999999', date_of_joining=date(2020, 6, 1), birthday=date(1990, 1, 1),
+        reports_to=None, status='Active', attendance_30=28, leaves_taken_ytd=3, leave_balance=9,
+        last_appraisal=date(2024, 4, 1), next_appraisal=date(2025, 4, 1), resignation_date=None, resignation_reason=None,
+    ) for i in range(n)]
+
+
+def _class_fields(n: int):
+    return [dict(
+        id=i, academic_year='2025-26', wing_id=1 + i % 4, grade=str(1 + i % 12), section='ABCD'[i % 4],
+        teacher_name=f"Teacher {i}", target_ratio=30, teacher_staff_id=i, assistant_teacher_id=None,
+        support_staff_ids=[1, 2], total_students=32, male=16, female=16, attendance_pct=91, fee_due_pct=12, results_avg=74,
+    ) for i in range(n)]
+
+
+def _staff_validated(s) -> StaffOut:
+    iso = lambda d: d.isoformat() if d else None
+    return StaffOut(
+        id=s.id, staff_code=s.staff_code, name=s.name, role=s.role, department=s.department, grade=s.grade,
+        email=s.email, phone=s.phone, date_of_joining=iso(s.date_of_joining), birthday=iso(s.birthday),
+        reports_to=s.reports_to, status=s.status, attendance_30=s.attendance_30, leaves_taken_ytd=s.leaves_taken_ytd,
+        leave_balance=s.leave_balance, last_appraisal=iso(s.last_appraisal), next_appraisal=iso(s.next_appraisal),
+        resignation_date=iso(s.resignation_date), resignation_reason=s.resignation_reason,
+    )
+
+
+def build_before(staff, classes) -> FastAPI:
+    app = FastAPI()
+
+    @app.get('/staff', response_model=List[StaffOut])
+    async def _staff():
+        return [_staff_validated(s) for s in staff]
+
+    @app.get('/classes-admin', response_model=List[ClassOut])
+    async def _classes():
+        return [ClassOut(**c) for c in classes]
+    return app
+
+
+def build_after(staff, classes) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+
+    @app.get('/staff', response_model=List[StaffOut])
+    async def _staff():
+        return model_list_response(StaffOut, (StaffOut.from_model(s) for s in staff))
+
+    @app.get('/classes-admin', response_model=List[ClassOut])
+    async def _classes():
+        return model_list_response(ClassOut, (ClassOut(**c) for c in classes))
+    return app
+
+
+async def _time(app: FastAPI, path: str, iterations: int) -> tuple[float, bytes]:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench') as client:
+        body = (await client.get(path)).content  # warm-up
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await client.get(path)
+        return (time.perf_counter() - start) / iterations, body
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=5000)
+    ap.add_argument('--iterations', type=int, default=20)
+    args = ap.parse_args()
+    staff, classes = _staff_rows(args.rows), _class_fields(args.rows)
+    before, after = build_before(staff, classes), build_after(staff, classes)
+    for path in ('/staff', '/classes-admin'):
+        t_before, b_before = asyncio.run(_time(before, path, args.iterations))
+        t_after, b_after = asyncio.run(_time(after, path, args.iterations))
+        assert json.loads(b_before) == json.loads(b_after), f"payload mismatch on {path}"
+        print(f"{path:16s} rows={args.rows}  before {t_before * 1000:8.1f} ms  after {t_after * 1000:8.1f} ms  speedup x{t_before / t_after:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -43,6 +43,9 @@ async def setup_db():
         temp schema overrides public while still allowing access to existing multi‑schema objects.
     """
     cloned_mode = os.getenv('USE_CLONED_DB','').lower() in ('1','true','yes')
+    # Cached reads are keyed by ids that repeat across per-test schemas
+    from app.core.cache import cache
+    cache.clear_local()
     desired_dsn = _current_async_dsn()
     if str(base_engine.url) != desired_dsn:
         test_engine = create_async_engine(desired_dsn, echo=False, pool_pre_ping=True)
@@ -139,6 +142,11 @@ async def client(setup_db):
     async with AsyncClient(transport=transport, base_url="http://test", headers=headers) as c:
         yield c
 
+@pytest.fixture
+async def async_client(client):
+    """Alias used by the staff tests."""
+    yield client
+
 @pytest.fixture
 async def seeded_permissions(session: AsyncSession):
     """Seed minimal permission + role mapping rows for settings tests when RBAC enforced.
@@ -0,0 +1,51 @@
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.modules.attendance import bitmap
+
+
+def _mask(*days):
+    return sum(1 << (d - 1) for d in days)
+
+
+def test_window_mask_trims_edge_months_only():
+    start, end = date(2025, 9, 10), date(2025, 11, 2)
+    assert bitmap.window_mask(date(2025, 9, 1), start, end) == _mask(*range(10, 32))
+    assert bitmap.window_mask(date(2025, 10, 1), start, end) == (1 << 31) - 1
+    assert bitmap.window_mask(date(2025, 11, 1), start, end) == _mask(1, 2)
+    assert bitmap.window_mask(date(2025, 12, 1), start, end) == 0
+    assert bitmap.window_mask(date(2025, 9, 1), date(2025, 9, 3), date(2025, 9, 4)) == _mask(3, 4)
+
+
+def test_streaks_skip_neutral_days():
+    # attended 1,2,3 | missed 4 | attended 5,7,8 (6 excused) | missed 9 | attended 10,11
+    attended, missed = _mask(1, 2, 3, 5, 7, 8, 10, 11), _mask(4, 9)
+    assert bitmap.streaks(attended, missed) == (2, 3)
+    assert bitmap.streaks(_mask(1, 2), 0) == (2, 2)
+    assert bitmap.streaks(0, _mask(3)) == (0, 0)
+
+
+def test_summarize_spans_months_and_respects_window():
+    rows = [
+        (date(2025, 10, 1), _mask(1, 2), _mask(30), _mask(3), _mask(6)),
+        (date(2025, 9, 1), _mask(1, 29, 30), _mask(2), 0, 0),
+    ]
+    s = bitmap.summarize(rows, date(2025, 9, 15), date(2025, 10, 31))
+    assert (s['present'], s['absent'], s['late'], s['excused']) == (4, 1, 1, 1)
+    assert s['marked'] == 6 and s['attendance_pct'] == 83.3
+    # Sep 29, 30, Oct 1, 2, 3 attended; Oct 30 absent
+    assert (s['current_streak'], s['longest_streak']) == (0, 5)
+    assert [m['month'] for m in s['months']] == ['2025-09', '2025-10']
+
+
+def test_school_counts_read_month_rows_not_daily_rows():
+    start, end = date(2025, 4, 1), date(2026, 3, 31)
+    src = bitmap.month_source(True, start, end)
+    sql = str(select(src.c.student_id, *bitmap.windowed_counts(src, start, end)).group_by(src.c.student_id)
+              .compile(dialect=postgresql.dialect()))
+    assert 'bit_count(CAST(am.present &' in sql and 'AS BIT(32))' in sql
+    assert 'attendance_events' not in sql and 'attendance_student' not in sql
+    fallback = str(bitmap.month_source(False, start, end).compile(dialect=postgresql.dialect()))
+    assert 'bit_or(' in fallback and 'FULL OUTER JOIN' in fallback
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app.modules.attendance import board as board_mod
+
+
+def _row(cid, enrolled, marked):
+    return board_mod.board_row(SimpleNamespace(class_section_id=cid, grade_label='8', section_label='A',
+                                               enrolled=enrolled, marked=marked))
+
+
+@pytest.fixture
+def board(monkeypatch):
+    b = board_mod.AttendanceBoard()
+    state = {'rows': [_row(1, 30, 0), _row(2, 25, 25)]}
+
+    async def _load(day):
+        return list(state['rows'])
+
+    monkeypatch.setattr(b, '_load', _load)
+    monkeypatch.setattr(b, '_ensure_started', lambda: None)
+    b.state = state
+    return b
+
+
+def _parse(chunk):
+    event, data = chunk.strip().split('\n')
+    return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+
+@pytest.mark.asyncio
+async def test_subscribers_get_snapshot_then_only_changed_classes(board):
+    day = date.today()
+    stream = board.events()  # cold board: the first subscriber triggers the load
+    event, data = _parse(await stream.__anext__())
+    assert event == 'snapshot' and [c['class_section_id'] for c in data['classes']] == [1, 2]
+    assert data['classes'][1]['complete'] is True
+    (q,) = board._subscribers
+    assert q.empty()  # the initial snapshot is not delivered twice
+
+    board.state['rows'] = [_row(1, 30, 12), _row(2, 25, 25)]
+    await board.refresh(day)
+    event, data = _parse(await stream.__anext__())
+    assert event == 'update' and data['classes'] == [_row(1, 30, 12)] and data['removed'] == []
+    assert data['classes'][0]['percent_marked'] == 40.0
+
+    board.state['rows'] = [_row(1, 30, 12)]
+    await board.refresh(day)
+    assert _parse(await stream.__anext__())[1]['removed'] == [2]
+    await stream.aclose()
+    assert not board._subscribers
+
+
+@pytest.mark.asyncio
+async def test_overflowing_subscriber_is_resynced_with_a_snapshot(board, monkeypatch):
+    monkeypatch.setattr(board_mod, 'SUBSCRIBER_QUEUE', 2)
+    await board.refresh(date.today())
+    q = asyncio.Queue(maxsize=2)
+    board._subscribers.add(q)
+    for marked in (1, 2, 3):
+        board.state['rows'] = [_row(1, 30, marked), _row(2, 25, 25)]
+        await board.refresh(date.today())
+    assert q.qsize() == 1
+    event, data = q.get_nowait()
+    assert event == 'snapshot' and data['classes'][0]['marked'] == 3
+
+
+@pytest.mark.asyncio
+async def test_background_task_stops_with_last_subscriber(board):
+    task = asyncio.create_task(asyncio.sleep(3600))
+    board._task = task
+    stream = board.events()
+    await stream.__anext__()
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert board._task is None and task.cancelled()
@@ -0,0 +1,14 @@
+from datetime import date
+
+from app.workers.attendance_partitions import academic_year, expired
+
+
+def test_academic_year_and_expiry():
+    assert academic_year(date(2025, 3, 31), 4) == 2024
+    assert academic_year(date(2025, 4, 1), 4) == 2025
+    names = ['attendance_student_ay2022', 'attendance_student_ay2023', 'attendance_student_ay2024',
+             'attendance_student_ay2025', 'attendance_student_default']
+    # 2025-26 is current; keeping one closed year leaves 2024-25 attached
+    assert expired(names, date(2025, 10, 18), 1, 4) == ['attendance_student_ay2022', 'attendance_student_ay2023']
+    assert expired(names, date(2025, 3, 1), 1, 4) == ['attendance_student_ay2022']
+    assert expired(names, date(2025, 10, 18), 0, 4) == []
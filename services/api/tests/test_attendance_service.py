@@ -0,0 +1,38 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app.modules.attendance import service
+
+
+class _FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, stmt, params=None):
+        self.calls.append((str(stmt), params))
+        n = len(params['student_ids'])
+        return SimpleNamespace(one=lambda: SimpleNamespace(inserted=n, updated=0, skipped=0, skipped_ids=[]))
+
+
+@pytest.mark.asyncio
+async def test_marks_are_deduplicated_last_wins_in_one_statement():
+    s = _FakeSession()
+    d = date(2025, 9, 1)
+    result = await service.upsert_marks(s, [(1, d, 'present'), (2, d, 'absent'), (1, d, 'late')])
+    assert len(s.calls) == 1
+    sql, params = s.calls[0]
+    assert 'unnest(' in sql and 'ON CONFLICT (student_id, date)' in sql
+    assert sorted(zip(params['student_ids'], params['statuses'], strict=True)) == [(1, 'late'), (2, 'absent')]
+    assert (result.processed, result.inserted, result.unchanged) == (2, 2, 0)
+
+
+@pytest.mark.asyncio
+async def test_large_batches_are_chunked(monkeypatch):
+    monkeypatch.setattr(service, 'MAX_BATCH', 2)
+    s = _FakeSession()
+    marks = [(i, date(2025, 9, 1), 'present') for i in range(5)]
+    result = await service.upsert_marks(s, marks)
+    assert [len(p['student_ids']) for _, p in s.calls] == [2, 2, 1]
+    assert result.inserted == 5
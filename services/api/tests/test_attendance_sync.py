@@ -0,0 +1,49 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app.modules.attendance import sync
+
+
+class _FakeSession:
+    def __init__(self, last_seq, rows):
+        self.last_seq, self.rows, self.calls = last_seq, rows, []
+
+    async def execute(self, stmt, params=None):
+        self.calls.append((str(stmt), params))
+        if 'last_seq' in str(stmt):
+            return SimpleNamespace(scalar=lambda: self.last_seq)
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+_ROW = SimpleNamespace(student_id=7, date=date(2025, 10, 17), status='late', seq=12)
+
+
+def test_tokens_are_scoped_to_their_class():
+    assert sync.format_token(5, 12) == '5.12'
+    assert sync.parse_token('5.12', 5) == 12
+    assert sync.parse_token('6.12', 5) is None
+    assert sync.parse_token('5.x', 5) is None
+    assert sync.parse_token(None, 5) is None
+
+
+@pytest.mark.asyncio
+async def test_changes_are_bounded_by_the_token_read_first():
+    s = _FakeSession(14, [_ROW])
+    r = await sync.changes_since(s, 5, 10, date(2025, 10, 12))
+    assert (r.token, r.reset) == ('5.14', False)
+    sql, params = s.calls[1]
+    assert 'seq > :since AND seq <= :upto' in sql and (params['since'], params['upto']) == (10, 14)
+    assert r.changes == [{'student_id': 7, 'date': '2025-10-17', 'status': 'late', 'seq': 12}]
+
+
+@pytest.mark.asyncio
+async def test_missing_or_future_token_resets_to_window():
+    for since in (None, 99):
+        s = _FakeSession(14, [_ROW])
+        r = await sync.changes_since(s, 5, since, date(2025, 10, 12))
+        assert r.reset and r.token == '5.14' and 'attendance_student' in s.calls[1][0]
+    s = _FakeSession(None, [_ROW])
+    r = await sync.changes_since(s, 5, None, date(2025, 10, 12), tracked=False)
+    assert r.reset and r.token is None and len(s.calls) == 1
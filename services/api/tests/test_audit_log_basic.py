@@ -16,3 +16,13 @@ async def test_audit_log_presence(client: AsyncClient, session: AsyncSession):
     assert r.status_code == 200
     data = r.json()
     assert any(entry['action'] == 'manual_test' for entry in data)
+
+
+def test_audit_cursor_roundtrip():
+    from datetime import datetime, timezone
+    from fastapi import HTTPException
+    from app.main import audit_cursor, parse_audit_cursor
+    at = datetime(2025, 10, 18, 9, 30, 15, 123456, tzinfo=timezone.utc)
+    assert parse_audit_cursor(audit_cursor(at, 42)) == (at, 42)
+    with pytest.raises(HTTPException):
+        parse_audit_cursor('not-a-cursor')
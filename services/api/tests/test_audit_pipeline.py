@@ -0,0 +1,69 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import Boolean, Integer, String, create_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+from app.core.audit import audit_writer, stop_tracking, track_changes
+from app.core.db import get_session
+from app.core.tenant import TenantContext, audit, get_tenant_context
+
+
+class _Base(DeclarativeBase):
+    pass
+
+
+class _Image(_Base):
+    __tablename__ = 'audit_test_image'
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String)
+    is_deleted: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+def test_snapshots_from_orm_history():
+    engine = create_engine('sqlite://')
+    _Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        changes = track_changes(session)
+        img = _Image(name='a.png', is_deleted=False)
+        session.add(img)
+        session.flush()
+        img.is_deleted = True
+        session.flush()
+        session.delete(img)
+        session.flush()
+        stop_tracking(session)
+    create, update, delete = changes
+    assert create['verb'] == 'CREATE' and create['after']['name'] == 'a.png' and create['object_id'] == '1'
+    assert update == {'object_type': 'audit_test_image', 'object_id': '1', 'verb': 'UPDATE',
+                      'before': {'is_deleted': False}, 'after': {'is_deleted': True}}
+    assert delete['verb'] == 'DELETE' and delete['before']['is_deleted'] is True
+
+
+@pytest.mark.asyncio
+async def test_decorator_keeps_handler_signature_and_enqueues():
+    app = FastAPI()
+
+    class _FakeSession:
+        def __init__(self):
+            self.sync_session = Session()
+
+    @app.post('/things/{thing_id}')
+    @audit('thing_touch', object_type='thing')
+    async def touch(thing_id: int, session=Depends(get_session)):
+        return {'id': thing_id}
+
+    fake = _FakeSession()
+
+    async def _session():
+        yield fake
+
+    app.dependency_overrides[get_session] = _session
+    app.dependency_overrides[get_tenant_context] = lambda: TenantContext(school_id=1, user_id=7, roles=[])
+    before = audit_writer.queue.qsize()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://t') as client:
+        r = await client.post('/things/5')
+    assert r.status_code == 200 and r.json() == {'id': 5}
+    assert audit_writer.queue.qsize() == before + 1
+    rec = audit_writer.queue.get_nowait()
+    assert (rec['action'], rec['object_type'], rec['user_id']) == ('thing_touch', 'thing', 7)
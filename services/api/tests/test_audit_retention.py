@@ -0,0 +1,13 @@
+from datetime import date
+
+from app.workers.audit_retention import expired, partition_end
+
+
+def test_partition_end_and_expiry():
+    assert partition_end('audit_log_y2024m12') == date(2025, 1, 1)
+    assert partition_end('audit_log_y2025m02') == date(2025, 3, 1)
+    assert partition_end('audit_log_default') is None
+    names = ['audit_log_y2024m09', 'audit_log_y2024m10', 'audit_log_y2024m11', 'audit_log_default']
+    # 365d before 2025-10-18 is 2024-10-18: only September 2024 is entirely older
+    assert expired(names, date(2025, 10, 18), 365) == ['audit_log_y2024m09']
+    assert expired(names, date(2025, 11, 1), 365) == ['audit_log_y2024m09', 'audit_log_y2024m10']
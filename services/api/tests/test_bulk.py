@@ -0,0 +1,62 @@
+import pytest
+
+from app.core import bulk
+
+
+class _Result:
+    def __init__(self, rows=(), rowcount=0):
+        self._rows = list(rows)
+        self.rowcount = rowcount
+
+    def all(self):
+        return self._rows
+
+
+class _FakeSession:
+    def __init__(self, result=None):
+        self.calls = []
+        self.result = result or _Result(rowcount=1)
+
+    async def execute(self, stmt, params=None):
+        self.calls.append((str(stmt), params))
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_upsert_is_one_statement_with_column_arrays():
+    s = _FakeSession(_Result(rowcount=3))
+    rows = [{'grade': g, 'section': 'A', 'result_status': 'Published'} for g in (1, 2, 3)]
+    n = await bulk.upsert_rows(s, 'class_status', rows, types={'grade': 'int', 'section': 'text', 'result_status': 'text'},
+                               conflict=('grade', 'section'), update=('result_status',), set_now=('updated_at',))
+    assert n == 3 and len(s.calls) == 1
+    sql, params = s.calls[0]
+    assert 'unnest(CAST(:a_grade AS int[]), CAST(:a_section AS text[]), CAST(:a_result_status AS text[]))' in sql
+    assert 'ON CONFLICT (grade, section) DO UPDATE SET result_status = EXCLUDED.result_status, updated_at = now()' in sql
+    assert params['a_grade'] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_update_rows_keeps_nulls_and_returns_changed_keys():
+    s = _FakeSession(_Result(rows=[(7,)]))
+    ids = await bulk.update_rows(s, 'school_classes', 'id', [{'id': 7, 'meet_link': 'x'}, {'id': 8}],
+                                 types={'id': 'int', 'meet_link': 'text', 'target_ratio': 'int'})
+    sql, params = s.calls[0]
+    assert ids == [7]
+    assert 'meet_link = coalesce(v.meet_link, t.meet_link)' in sql
+    assert 'AS v(id, meet_link, target_ratio)' in sql and 'RETURNING t.id' in sql
+    assert params['a_meet_link'] == ['x', None] and params['a_target_ratio'] == [None, None]
+
+
+@pytest.mark.asyncio
+async def test_set_difference_insert_and_delete():
+    s = _FakeSession()
+    types = {'class_id': 'int', 'student_id': 'int'}
+    await bulk.insert_missing(s, 'class_students', {'class_id': 4}, 'student_id', [3, 1, 3], types)
+    await bulk.delete_except(s, 'class_students', {'class_id': 4}, 'student_id', {1, 3}, types)
+    ins, dele = s.calls
+    assert 'EXCEPT SELECT student_id FROM class_students WHERE class_id = CAST(:f_class_id AS int)' in ins[0]
+    assert ins[1]['vals'] == [3, 1]
+    assert 'NOT (student_id = ANY(CAST(:keep AS int[])))' in dele[0]
+    assert await bulk.insert_missing(s, 'class_students', {'class_id': 4}, 'student_id', [], types) == 0
+    with pytest.raises(ValueError):
+        await bulk.upsert_rows(s, 'x; drop table y', [{'a': 1}], types={'a': 'int'}, conflict=('a',), update=())
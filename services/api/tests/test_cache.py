@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.core.cache import TieredCache, cache_key
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def _no_redis(monkeypatch):
+    monkeypatch.setattr(settings, 'redis_url', '')
+
+
+def test_cache_key_is_parameter_order_independent():
+    assert cache_key('classes_admin', a=1, b='x') == cache_key('classes_admin', b='x', a=1)
+    assert cache_key('classes_admin', a=1) != cache_key('classes_admin', a=2)
+    assert cache_key('classes_admin', a=1).startswith('classes_admin:')
+
+
+@pytest.mark.asyncio
+async def test_get_or_load_and_tag_invalidation():
+    c = TieredCache(max_entries=10)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return [{'id': 7}]
+
+    k_2025 = cache_key('t', year='2025-26')
+    k_2024 = cache_key('t', year='2024-25')
+    assert (await c.get_or_load(k_2025, load, ttl=30, tags=lambda rows: ['ay:2025-26'] + [f"class:{r['id']}" for r in rows]))[1] == 'MISS'
+    assert (await c.get_or_load(k_2024, load, ttl=30, tags=['ay:2024-25']))[1] == 'MISS'
+    assert (await c.get_or_load(k_2025, load, ttl=30))[1] == 'HIT'
+    await c.invalidate('class:7')
+    assert (await c.get(k_2025))[0] is None
+    assert (await c.get(k_2024))[0] == 'fresh'  # other entries survive
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_bound_and_overlapping_invalidation_not_stored():
+    c = TieredCache(max_entries=2)
+    for i in range(3):
+        await c.set(f"t:{i}", i, ttl=30, tags=[f"x:{i}"])
+    assert (await c.get('t:0'))[0] is None and (await c.get('t:2'))[0] == 'fresh'
+
+    async def slow_load():
+        await c.invalidate('anything')  # a write lands while we compute
+        return 'stale'
+
+    value, status = await c.get_or_load('t:slow', slow_load, ttl=30)
+    assert (value, status) == ('stale', 'MISS')
+    assert (await c.get('t:slow'))[0] is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    c = TieredCache(max_entries=10)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'v'
+
+    results = await asyncio.gather(*(c.get_or_load('t:hot', load, ttl=30) for _ in range(20)))
+    assert calls == [1]
+    assert {r for r in results} == {('v', 'MISS')}
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate():
+    c = TieredCache(max_entries=10)
+    versions = iter(['v1', 'v2'])
+
+    async def load():
+        return next(versions)
+
+    assert await c.get_or_load('t:swr', load, ttl=0.01, stale_ttl=30, refresh=load) == ('v1', 'MISS')
+    await asyncio.sleep(0.02)
+    # Expired: old value served at once, one refresh in the background.
+    assert await c.get_or_load('t:swr', load, ttl=0.01, stale_ttl=30, refresh=load) == ('v1', 'STALE')
+    await asyncio.sleep(0.005)
+    assert (await c.get('t:swr'))[1] == 'v2'
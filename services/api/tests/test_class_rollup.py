@@ -0,0 +1,120 @@
+import importlib.util
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.core.schema_registry import schema_registry
+from app.modules.classes import rollup
+from app.modules.classes.rollup import ROLLUP_TABLE, class_rows_query
+
+MIGRATION = Path(__file__).resolve().parents[1] / 'alembic_clean' / 'versions' / '20251018_0300_class_daily_stats.py'
+
+
+def test_rollup_query_reads_latest_state_and_bounded_window():
+    q = class_rows_query('8', 'A', 30, 50, 0, today=date(2025, 10, 18))
+    sql = str(q.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    assert 'DISTINCT ON (class_daily_stats.grade, class_daily_stats.section)' in sql
+    assert "class_daily_stats.day > '2025-09-18'" in sql
+    assert "class_daily_stats.day <= '2025-10-18'" in sql
+    assert 'latest.enrolled > 0' in sql
+    assert 'attendance_events' not in sql and 'students' not in sql
+
+
+def _migration():
+    spec = importlib.util.spec_from_file_location('class_daily_stats_migration', MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def _script(session, sql: str) -> None:
+    """Multi-statement DDL goes straight to asyncpg (SQLAlchemy prepares one statement at a time)."""
+    conn = await session.connection()
+    await (await conn.get_raw_connection()).driver_connection.execute(sql)
+
+
+async def _install_rollup(session) -> None:
+    """What the migration's upgrade() does, minus the backfill, inside the per-test schema."""
+    m = _migration()
+    for sql in (m.TABLE, m.BUMP_FN, m.RECONCILE_FN):
+        await _script(session, sql)
+    for table in m.SOURCES:
+        await _script(session, m.trigger_function_sql(table))
+        await _script(session, m.trigger_ddl(table))
+    await session.commit()
+
+
+async def _classes(client, monkeypatch, use_rollup: bool):
+    has_table = schema_registry.has_table
+    with monkeypatch.context() as mp:
+        mp.setattr(schema_registry, 'has_table', lambda name: use_rollup if name == ROLLUP_TABLE else has_table(name))
+        resp = await client.get('/classes')
+    assert resp.status_code == 200
+    return resp.json()
+
+
+async def _student(session, name, grade, section, gender) -> int:
+    return (await session.execute(text(
+        "INSERT INTO students (first_name, class, section, gender) VALUES (:n, :g, :s, :x) RETURNING id"
+    ), {'n': name, 'g': grade, 's': section, 'x': gender})).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_trigger_maintained_rollup_matches_legacy_aggregation(session, client, monkeypatch):
+    await _install_rollup(session)
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+
+    # Yesterday: enrolment and invoices (state lands on the current day's row) ...
+    a1 = await _student(session, 'A1', '5', 'A', 'F')
+    a2 = await _student(session, 'A2', '5', 'A', 'M')
+    a3 = await _student(session, 'A3', '5', 'A', 'M')
+    b1 = await _student(session, 'B1', '6', 'B', 'F')
+    mover = await _student(session, 'M1', '7', 'C', 'M')
+    await session.execute(text(
+        "INSERT INTO fee_invoices (student_id, amount, paid_amount) VALUES "
+        "(:a1, 5000, 0), (:a2, 5000, 2500), (:b1, 4000, 4000), (:m, 3000, 0), (:m, 1000, 0)"
+    ), {'a1': a1, 'a2': a2, 'b1': b1, 'm': mover})
+    await session.commit()
+    # ... then the day rolls over: today's rows must start from yesterday's state (carry forward).
+    await session.execute(text("UPDATE class_daily_stats SET day = day - 1"))
+    await session.commit()
+
+    # Today: fee payments/settlement, an extra invoice added and removed, a class move, a withdrawal.
+    await session.execute(text("UPDATE fee_invoices SET paid_amount = 5000 WHERE student_id = :a2"), {'a2': a2})
+    await session.execute(text(
+        "UPDATE fee_invoices SET settled_at = now() WHERE student_id = :m AND amount = 3000"), {'m': mover})
+    await session.execute(text("INSERT INTO fee_invoices (student_id, amount, paid_amount) VALUES (:a1, 700, 0)"), {'a1': a1})
+    await session.execute(text("DELETE FROM fee_invoices WHERE student_id = :a1 AND amount = 700"), {'a1': a1})
+    await session.execute(text("UPDATE students SET last_name = 'Renamed' WHERE id = :a1"), {'a1': a1})
+    await session.execute(text("UPDATE students SET class = '6', section = 'B' WHERE id = :m"), {'m': mover})
+    await session.execute(text("DELETE FROM students WHERE id = :a3"), {'a3': a3})
+
+    # Attendance across both days, including a correction and a removed mark.
+    await session.execute(text(
+        "INSERT INTO attendance_events (student_id, date, present) VALUES "
+        "(:a1, :y, 1), (:a2, :y, 0), (:b1, :y, 1), (:a1, :t, 1), (:a2, :t, 1), (:b1, :t, 0), (:m, :t, 1)"
+    ), {'a1': a1, 'a2': a2, 'b1': b1, 'm': mover, 'y': yesterday, 't': today})
+    await session.execute(text(
+        "UPDATE attendance_events SET present = 0 WHERE student_id = :a2 AND date = :t"), {'a2': a2, 't': today})
+    await session.execute(text(
+        "DELETE FROM attendance_events WHERE student_id = :b1 AND date = :y"), {'b1': b1, 'y': yesterday})
+    await session.execute(text(
+        "INSERT INTO attendance_student (student_id, date, status) VALUES (:a1, :t, 'late')"), {'a1': a1, 't': today})
+    await session.commit()
+
+    legacy = await _classes(client, monkeypatch, use_rollup=False)
+    rolled = await _classes(client, monkeypatch, use_rollup=True)
+    assert [c['id'] for c in legacy] == ['5A', '6B']
+    by_id = {c['id']: c for c in legacy}
+    assert (by_id['5A']['total'], by_id['5A']['fee_due_count'], by_id['5A']['fee_due_amount']) == (2, 1, 5000)
+    assert (by_id['6B']['total'], by_id['6B']['fee_due_count'], by_id['6B']['fee_due_amount']) == (2, 1, 1000)
+    assert rolled == legacy
+
+    # Nothing for the nightly reconcile to repair, and the result is unchanged after it runs.
+    assert await rollup.reconcile(session, today - timedelta(days=30), today) == 0
+    await session.commit()
+    assert await _classes(client, monkeypatch, use_rollup=True) == legacy
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from app.modules.classes.roster import class_detail_stmt, roster_payload, roster_tags
+
+
+def _row(**kw):
+    base = dict(student_id=None, first_name=None, last_name=None, guardian_phone=None, roll=None,
+                gender=None, tags=None, due=None, due_n=None)
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+def test_detail_is_one_statement_with_lateral_tags_and_fees():
+    sql = str(class_detail_stmt(8, 'A').compile(dialect=postgresql.dialect()))
+    assert sql.count('LATERAL') == 2
+    assert 'array_agg(student_tags.tag)' in sql
+    assert 'LEFT OUTER JOIN' in sql and 'class_teachers' in sql and 'class_status' in sql
+
+
+def test_roster_payload_and_tags():
+    rows = [
+        _row(student_id=1, first_name='Asha', gender='f', tags=['bus'], due=5000, due_n=1),
+        _row(student_id=2, first_name='Rohan', last_name='K', gender='M', due=-10, due_n=0),
+    ]
+    payload = roster_payload(rows)
+    assert payload['male'] == 1 and payload['female'] == 1
+    assert payload['fee_due_count'] == 1 and payload['fee_due_amount'] == 4990
+    assert payload['students'][1]['name'] == 'Rohan K'
+    assert roster_tags(8, 'A', payload) == ['roster:8-A', 'student:1', 'student:2']
+    # empty class: header-only row
+    assert roster_payload([_row()])['students'] == []
@@ -0,0 +1,82 @@
+"""Regression budget for /classes-admin aggregation on a school-sized dataset.
+
+The ``large_school`` fixture seeds classes, students, a window of attendance
+and fee invoices with set-based SQL. The test then fails if the uncached list
+call starts issuing per-class/per-student queries, holds far more Python
+memory than the response itself, or blows the latency budget.
+Scale with CLASSES_ADMIN_BENCH_STUDENTS (default 1200).
+"""
+import os
+import re
+import time
+import tracemalloc
+
+import pytest
+from sqlalchemy import text as sql_text
+
+STUDENTS = int(os.getenv('CLASSES_ADMIN_BENCH_STUDENTS', '1200'))
+DAYS = 60
+CLASSES = 40
+MAX_QUERIES = 6
+MAX_SECONDS = 5.0
+MAX_PEAK_BYTES = 16 * 1024 * 1024
+
+
+@pytest.fixture
+async def large_school(session, client):
+    rw = await client.post('/wings', json={'academic_year': '2031-32', 'name': 'Bench', 'grade_start': 1, 'grade_end': 10})
+    wing_id = rw.json()['id']
+    await session.execute(sql_text("""
+        INSERT INTO school_classes (academic_year, wing_id, grade, section)
+        SELECT '2031-32', :w, (1 + g % 10)::text, chr(65 + g / 10) FROM generate_series(0, :n - 1) g
+    """), {'w': wing_id, 'n': CLASSES})
+    await session.execute(sql_text("""
+        INSERT INTO students (first_name, class, section, gender)
+        SELECT 'Bench ' || i, (1 + i % 10)::text, chr(65 + (i % :c) / 10), CASE WHEN i % 2 = 0 THEN 'M' ELSE 'F' END
+        FROM generate_series(0, :n - 1) i
+    """), {'n': STUDENTS, 'c': CLASSES})
+    await session.execute(sql_text("""
+        INSERT INTO class_students (class_id, student_id)
+        SELECT c.id, s.id FROM students s
+        JOIN school_classes c ON c.academic_year = '2031-32' AND c.grade = s.class AND c.section = s.section
+        WHERE s.first_name LIKE 'Bench %'
+    """))
+    await session.execute(sql_text("""
+        INSERT INTO attendance_events (student_id, date, present)
+        SELECT s.id, CURRENT_DATE - d, CASE WHEN (s.id + d) % 10 = 0 THEN 0 ELSE 1 END
+        FROM students s CROSS JOIN generate_series(0, :days - 1) d
+        WHERE s.first_name LIKE 'Bench %'
+    """), {'days': DAYS})
+    await session.execute(sql_text("""
+        INSERT INTO fee_invoices (student_id, amount, paid_amount)
+        SELECT s.id, 1000, CASE WHEN s.id % 4 = 0 THEN 0 ELSE 1000 END
+        FROM students s WHERE s.first_name LIKE 'Bench %'
+    """))
+    await session.commit()
+    yield
+
+
+def _query_count(response) -> int:
+    m = re.search(r'desc="(\d+) queries"', response.headers.get('server-timing', ''))
+    return int(m.group(1)) if m else 0
+
+
+@pytest.mark.asyncio
+async def test_classes_admin_aggregation_budget(large_school, client):
+    tracemalloc.start()
+    started = time.perf_counter()
+    r = await client.get(f'/classes-admin?academic_year=2031-32&attendance_days={DAYS}')
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert r.status_code == 200
+    assert r.headers.get('x-cache') == 'MISS'
+    rows = r.json()
+    assert len(rows) == CLASSES
+    assert sum(c['total_students'] for c in rows) == STUDENTS
+    # 1 in 10 marks is absent; 1 in 4 students owes fees
+    assert all(85 <= c['attendance_pct'] <= 95 for c in rows if c['total_students'])
+    assert all(c['fee_due_pct'] <= 50 for c in rows)
+    assert _query_count(r) <= MAX_QUERIES, r.headers.get('server-timing')
+    assert peak < MAX_PEAK_BYTES, f"peak python memory {peak / 1e6:.1f} MB"
+    assert elapsed < MAX_SECONDS, f"{elapsed:.2f}s"
@@ -0,0 +1,13 @@
+from prometheus_client import generate_latest
+
+
+def test_pool_gauges_exported_and_sessions_unified():
+    from app.core.db import engine, get_session
+    from app.core.db_metrics import InstrumentedAsyncQueuePool
+    from app.core.dependencies import get_db
+    assert isinstance(engine.sync_engine.pool, InstrumentedAsyncQueuePool)
+    # Same callable -> FastAPI dependency cache yields one session per request
+    assert get_db is get_session
+    out = generate_latest().decode()
+    assert 'db_pool_checked_out{pool="primary"} 0.0' in out
+    assert 'db_pool_size{pool="primary"}' in out
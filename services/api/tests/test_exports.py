@@ -0,0 +1,81 @@
+import json
+from datetime import date
+
+import pytest
+import sqlalchemy as sa
+from fastapi import HTTPException
+
+from app.core import exports
+from app.modules.classes.router_wings import CLASS_EXPORT, CSV_HEADER
+
+
+def _stmt(cols=CSV_HEADER):
+    return exports.export_select(CLASS_EXPORT, cols)
+
+
+@pytest.fixture
+def fake_rows(monkeypatch):
+    batches = [
+        [('2025-26', 'Alpha', '7', 'C', 'Mr "C"', 30)],
+        [('2025-26', None, '8', 'A', None, None)],
+    ]
+
+    async def _batches(stmt, batch_rows):
+        for b in batches:
+            yield b
+
+    monkeypatch.setattr(exports, '_batches', _batches)
+
+
+async def _body(response) -> bytes:
+    return b''.join([chunk async for chunk in response.body_iterator])
+
+
+def test_pick_columns_keeps_order_and_rejects_unknown():
+    assert exports.pick_columns(CLASS_EXPORT, None) == list(CLASS_EXPORT)
+    assert exports.pick_columns(CLASS_EXPORT, 'section, grade,section') == ['section', 'grade']
+    with pytest.raises(HTTPException) as e:
+        exports.pick_columns(CLASS_EXPORT, 'grade,secret')
+    assert e.value.status_code == 400 and 'secret' in e.value.detail
+
+
+@pytest.mark.asyncio
+async def test_csv_export_streams_one_chunk_per_batch(fake_rows):
+    r = exports.export_response(_stmt(), exports.ExportFormat.csv, 'classes-2025-26')
+    assert r.media_type.startswith('text/csv')
+    assert 'classes-2025-26.csv' in r.headers['content-disposition']
+    chunks = [c async for c in r.body_iterator]
+    assert len(chunks) == 2
+    text = b''.join(chunks).decode()
+    assert text.splitlines() == [
+        ','.join(CSV_HEADER),
+        '2025-26,Alpha,7,C,"Mr ""C""",30',
+        '2025-26,,8,A,,',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_legacy_json_wrapper_is_valid_json(fake_rows):
+    body = await _body(exports.csv_json_response(_stmt()))
+    payload = json.loads(body)
+    assert payload['csv'].startswith('academic_year,wing,grade') and 'Mr ""C""' in payload['csv']
+
+
+def test_optional_formats_need_their_package():
+    stmt = _stmt()
+    if exports.pa is None:
+        with pytest.raises(HTTPException) as e:
+            exports.export_response(stmt, exports.ExportFormat.parquet, 'x')
+        assert e.value.status_code == 406
+    if exports.openpyxl is None:
+        with pytest.raises(HTTPException) as e:
+            exports.export_response(stmt, exports.ExportFormat.xlsx, 'x')
+        assert e.value.status_code == 406
+
+
+def test_arrow_types_follow_sql_types():
+    if exports.pa is None:
+        pytest.skip('pyarrow not installed')
+    assert exports._arrow_type(sa.Integer()) == exports.pa.int64()
+    assert exports._arrow_type(sa.Date()) == exports.pa.date32()
+    assert exports._arrow_value(date(2025, 1, 2), exports.pa.date32()) == date(2025, 1, 2)
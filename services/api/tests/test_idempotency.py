@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import idempotency
+from app.core.config import settings
+from app.core.idempotency import Idempotency, request_hash
+
+
+@pytest.fixture(autouse=True)
+def _local_store(monkeypatch):
+    # No Redis, no idempotency_keys table: exercise the in-process backend.
+    monkeypatch.setattr(settings, 'redis_url', '')
+    monkeypatch.setattr(idempotency, 'store', idempotency.IdempotencyStore())
+    idempotency.store.use_db = False
+
+
+def test_request_hash_ignores_key_order():
+    assert request_hash({'a': 1, 'b': [1, 2]}) == request_hash({'b': [1, 2], 'a': 1})
+    assert request_hash({'a': 1}) != request_hash({'a': 2})
+
+
+@pytest.mark.asyncio
+async def test_concurrent_retry_waits_for_first_result():
+    calls = []
+
+    async def handler(delay):
+        idem = Idempotency('test.scope', 'k1')
+        try:
+            cached = await idem.begin({'x': 1})
+            if cached is not None:
+                return cached
+            calls.append(1)
+            await asyncio.sleep(delay)
+            return await idem.complete({'n': len(calls)})
+        finally:
+            await idem.release()
+
+    first, second = await asyncio.gather(handler(0.2), handler(0))
+    assert first == second == {'n': 1}
+    assert calls == [1]
+
+
+@pytest.mark.asyncio
+async def test_mismatch_and_failed_attempts():
+    idem = Idempotency('test.scope', 'k2')
+    assert await idem.begin({'x': 1}) is None
+    await idem.release()  # handler failed -> retry must run again
+    retry = Idempotency('test.scope', 'k2')
+    assert await retry.begin({'x': 1}) is None
+    await retry.complete({'ok': True})
+    with pytest.raises(HTTPException) as exc:
+        await Idempotency('test.scope', 'k2').begin({'x': 2})
+    assert exc.value.status_code == 422
+    assert await Idempotency('other.scope', 'k2').begin({'x': 2}) is None
+
+
+@pytest.mark.asyncio
+async def test_without_key_is_pass_through():
+    idem = Idempotency('test.scope', None)
+    assert await idem.begin({'x': 1}) is None
+    assert await idem.complete({'y': 1}) == {'y': 1}
+
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped_per_user():
+    first = Idempotency('test.scope', 'k9', owner='1')
+    assert await first.begin({'x': 1}) is None
+    await first.complete({'user': 1})
+    assert await Idempotency('test.scope', 'k9', owner='1').begin({'x': 1}) == {'user': 1}
+    other = Idempotency('test.scope', 'k9', owner='2')
+    assert await other.begin({'x': 1}) is None
+    await other.release()
@@ -0,0 +1,48 @@
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core import importer
+from app.modules.staff.router import STAFF_IMPORT
+
+
+def _upload(text: str, name: str = 'staff.csv') -> UploadFile:
+    return UploadFile(io.BytesIO(text.encode('utf-8')), filename=name)
+
+
+def test_reader_chunks_types_and_row_numbers():
+    csv_text = (
+        '\ufeffemployee_id,name,attendance_30,birthday\n'
+        'E1,Alpha,5,1990-01-02\n'
+        '\n'
+        'E2,"Beta, Jr",x,\n'
+        'E3, Gamma ,,1990-13-01\n'
+    )
+    reader = importer._Reader(STAFF_IMPORT, _upload(csv_text))
+    first = reader.take(2)
+    rest = reader.take(2)
+    assert reader.take(2) == []
+    reader.close()
+    cols = ['row_no', *STAFF_IMPORT.columns, 'error']
+    rows = [dict(zip(cols, r, strict=True)) for r in first + rest]
+    assert [r['row_no'] for r in rows] == [2, 4, 5]  # blank line 3 skipped, numbering kept
+    assert rows[0]['attendance_30'] == '5' and rows[0]['birthday'] == '1990-01-02' and rows[0]['error'] is None
+    assert rows[0]['staff_code'] is None  # column absent from the file
+    assert rows[1]['name'] == 'Beta, Jr' and rows[1]['attendance_30'] is None
+    assert rows[1]['error'] == 'attendance_30 must be a whole number'
+    assert rows[2]['name'] == 'Gamma' and rows[2]['error'].startswith('birthday must be a date')
+
+
+def test_reader_rejects_unknown_or_missing_header_columns():
+    reader = importer._Reader(STAFF_IMPORT, _upload('employee_id,nickname\nE1,A\n'))
+    with pytest.raises(HTTPException) as e:
+        reader.take(10)
+    reader.close()
+    assert e.value.status_code == 400 and 'nickname' in e.value.detail and 'name' in e.value.detail
+
+
+def test_unique_check_references_staging_table():
+    check = importer.unique_check(['employee_id'], 'employee_id')
+    sql = importer._staged(check.predicate, 'import_staff')
+    assert 'FROM import_staff p' in sql and 'p.row_no < s.row_no' in sql
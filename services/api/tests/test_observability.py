@@ -0,0 +1,24 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.core.observability import ObservabilityMiddleware
+
+
+@pytest.mark.asyncio
+async def test_single_request_id_and_route_template_labels():
+    app = FastAPI()
+
+    @app.get('/obs/messages/{message_id}')
+    async def _msg(message_id: str):
+        return {'id': message_id}
+
+    app.add_middleware(ObservabilityMiddleware)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://t') as client:
+        r1 = await client.get('/obs/messages/0b5c3f1e-8a7e-4f2b-9a55-3d1f0f6f0c11', headers={'X-Request-ID': 'rid-1'})
+        r2 = await client.get('/obs/messages/another-id')
+    assert r1.headers['x-request-id'] == 'rid-1'
+    assert r2.headers['x-request-id'] and r2.headers['x-request-id'] != 'rid-1'
+    count = REGISTRY.get_sample_value('api_requests_total', {'method': 'GET', 'path': '/obs/messages/{message_id}', 'status': '200'})
+    assert count == 2
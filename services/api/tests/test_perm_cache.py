@@ -0,0 +1,40 @@
+from app.core.perm_cache import CompiledPermissions
+
+
+def test_compiled_role_bitsets_roundtrip():
+    rows = [('ADMIN', 'ops:audit_read'), ('admin', 'settings:config_read'), ('teacher', 'attendance:mark')]
+    compiled = CompiledPermissions.from_rows(3, rows)
+    mask = compiled.mask_for_roles(['Admin'])
+    assert compiled.decode(mask) == {'ops:audit_read', 'settings:config_read'}
+    assert mask & compiled.bit('settings:config_read')
+    assert not mask & compiled.bit('attendance:mark')
+    assert compiled.bit('unknown:code') == 0
+
+    restored = CompiledPermissions.from_json(compiled.to_json())
+    assert restored.version == 3
+    assert restored.role_permissions() == compiled.role_permissions()
+    assert restored.mask_for_roles(['teacher', 'admin']) == compiled.mask_for_roles(['teacher', 'admin'])
+
+
+def test_permission_context_bit_checks_and_extra_grants():
+    from app.core.security import PermissionContext
+    compiled = CompiledPermissions.from_rows(1, [('teacher', 'attendance:mark'), ('admin', 'ops:audit_read')])
+    mask = compiled.mask_for_roles(['teacher']) | compiled.bit('ops:audit_read')
+    ctx = PermissionContext(7, mask, frozenset({'beta:feature'}), compiled)
+    assert ctx.has('attendance:mark')
+    assert ctx.has('ops:audit_read')
+    assert ctx.has('beta:feature')
+    assert not ctx.has('settings:config_write')
+    assert ctx.codes() == {'attendance:mark', 'ops:audit_read', 'beta:feature'}
+
+
+def test_snapshot_tracks_db_version():
+    from app.core.perm_cache import PermissionCache
+    compiled = CompiledPermissions.from_rows(3, [('admin', 'ops:manage')], db_version=9)
+    restored = CompiledPermissions.from_json(compiled.to_json())
+    assert restored.db_version == 9
+    assert PermissionCache._matches(restored, 3, 9)
+    assert PermissionCache._matches(restored, 3, None)  # no rbac_version table: Redis version only
+    assert not PermissionCache._matches(restored, 3, 10)  # direct table edit
+    assert not PermissionCache._matches(restored, 4, 9)
+    assert not PermissionCache._matches(None, 3, 9)
@@ -0,0 +1,67 @@
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+
+from app.core.config import settings
+from app.core.ratelimit import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def _no_redis(monkeypatch):
+    monkeypatch.setattr(settings, 'redis_url', '')
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_headers_and_429():
+    limiter = RateLimiter('test.search', limit=3, window=60)
+    app = FastAPI()
+
+    @app.get('/search')
+    async def search(response: Response, who: str = 'a'):
+        await limiter.check(f"user:{who}", response)
+        return {'ok': True}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://t') as client:
+        seen = [await client.get('/search') for _ in range(4)]
+        other = await client.get('/search', params={'who': 'b'})
+    assert [r.status_code for r in seen] == [200, 200, 200, 429]
+    assert [r.headers['RateLimit-Remaining'] for r in seen[:3]] == ['2', '1', '0']
+    assert seen[0].headers['RateLimit-Limit'] == '3' and seen[0].headers['RateLimit-Policy'] == '3;w=60'
+    assert int(seen[3].headers['Retry-After']) == 20  # one token refills every 60/3 s
+    assert other.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_policy_override_from_settings(monkeypatch):
+    limiter = RateLimiter('test.override', limit=100, window=60)
+    monkeypatch.setattr(settings, 'rate_limits', 'test.override=1/10, bogus')
+    assert limiter.policy == (1, 10)
+    assert (await limiter.hit('x')).allowed
+    assert not (await limiter.hit('x')).allowed
+
+
+@pytest.mark.asyncio
+async def test_buckets_are_per_authenticated_user():
+    import jwt
+    from fastapi import Depends, Request
+    from app.core.ratelimit import caller_identity
+    from app.core.security import get_optional_user
+
+    limiter = RateLimiter('test.per_user', limit=1, window=60)
+    app = FastAPI()
+
+    @app.get('/search')
+    async def search(request: Request, response: Response, caller=Depends(get_optional_user)):
+        await limiter.check(caller_identity(request, caller), response)
+        return {'ok': True}
+
+    def auth(uid: int) -> dict:
+        return {'Authorization': f"Bearer {jwt.encode({'sub': str(uid)}, settings.jwt_secret, algorithm='HS256')}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://t') as client:
+        first = [await client.get('/search', headers=auth(1)) for _ in range(2)]
+        second = await client.get('/search', headers=auth(2))
+        anonymous = [await client.get('/search') for _ in range(2)]  # falls back to the client IP
+    assert [r.status_code for r in first] == [200, 429]
+    assert second.status_code == 200
+    assert [r.status_code for r in anonymous] == [200, 429]
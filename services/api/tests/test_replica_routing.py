@@ -0,0 +1,39 @@
+import time
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core import db, replica
+
+
+def _request(method='GET', cookie=None, headers=()):
+    raw = [(k.encode(), v.encode()) for k, v in headers]
+    if cookie:
+        raw.append((b'cookie', cookie.encode()))
+    return Request({'type': 'http', 'method': method, 'headers': raw, 'path': '/'})
+
+
+@pytest.mark.asyncio
+async def test_read_session_falls_back_to_primary_without_replica():
+    primary = object()
+    gen = replica.get_read_session(_request(), primary=primary)
+    assert await gen.__anext__() is primary
+
+
+def test_sticky_cookie_and_header():
+    assert not replica._sticky(_request())
+    assert replica._sticky(_request(cookie=f'{replica.STICKY_COOKIE}={time.time() + 30:.0f}'))
+    assert not replica._sticky(_request(cookie=f'{replica.STICKY_COOKIE}={time.time() - 30:.0f}'))
+    assert replica._sticky(_request(headers=[('x-read-primary', '1')]))
+
+
+def test_write_sets_sticky_cookie_only_with_replica(monkeypatch):
+    resp = Response()
+    replica.mark_recent_write(_request('POST'), resp)
+    assert 'set-cookie' not in resp.headers
+    monkeypatch.setattr(db, 'read_engine', object())
+    replica.mark_recent_write(_request('GET'), resp)
+    assert 'set-cookie' not in resp.headers
+    replica.mark_recent_write(_request('POST'), resp)
+    assert resp.headers['set-cookie'].startswith(replica.STICKY_COOKIE + '=')
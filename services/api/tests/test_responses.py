@@ -0,0 +1,39 @@
+import json
+from datetime import datetime
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from app.core.responses import model_list_response, stream_json_array
+
+
+class _Row(BaseModel):
+    id: int
+    name: str
+    at: Optional[datetime] = None
+
+
+def test_model_list_response_matches_pydantic_dump():
+    rows = [_Row(id=1, name='a', at=datetime(2025, 1, 2, 3, 4)), _Row(id=2, name='b')]
+    resp = model_list_response(_Row, rows, headers={'X-Total-Count': '2'})
+    assert resp.headers['x-total-count'] == '2'
+    assert json.loads(resp.body) == [r.model_dump(mode='json') for r in rows]
+
+
+@pytest.mark.asyncio
+async def test_stream_json_array_chunks_valid_json():
+    async def rows():
+        for i in range(3):
+            yield {'id': i}
+
+    resp = stream_json_array(rows())
+    body = b''.join([chunk async for chunk in resp.body_iterator])
+    assert json.loads(body) == [{'id': 0}, {'id': 1}, {'id': 2}]
+
+    async def empty():
+        return
+        yield
+
+    body = b''.join([chunk async for chunk in stream_json_array(empty()).body_iterator])
+    assert body == b'[]'
@@ -0,0 +1,67 @@
+import pytest
+from app.core.schema_registry import SchemaRegistry
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class _FakeConn:
+    """Answers the two registry queries without a database."""
+    def __init__(self, columns, search_path):
+        self.columns = columns
+        self.search_path = search_path
+        self.calls = 0
+
+    async def execute(self, stmt):
+        self.calls += 1
+        if 'current_schemas' in str(stmt):
+            return _Result([(s,) for s in self.search_path])
+        return _Result(self.columns)
+
+
+@pytest.mark.asyncio
+async def test_registry_resolves_through_search_path():
+    conn = _FakeConn([
+        ('public', 'school_classes', 'id'),
+        ('public', 'school_classes', 'teacher_staff_id'),
+        ('core', 'audit_log', 'id'),
+    ], ['public', 'core'])
+    reg = SchemaRegistry()
+    await reg.ensure_loaded(conn)
+    await reg.ensure_loaded(conn)  # second call is served from memory
+    assert conn.calls == 2
+    assert reg.has_table('audit_log') and reg.has_table('core.audit_log')
+    assert reg.has_columns('school_classes', 'teacher_staff_id')
+    assert not reg.has_columns('school_classes', 'teacher_staff_id', 'support_staff_ids')
+    assert not reg.has_table('class_tasks')
+    reg.note_table('class_tasks', ['id', 'text'])
+    assert reg.has_columns('class_tasks', 'text')
+
+
+@pytest.mark.asyncio
+async def test_refresh_all_reloads_locally_and_broadcasts(monkeypatch):
+    from app.core import schema_registry as mod
+    reg = SchemaRegistry()
+    published = []
+
+    class _Redis:
+        async def publish(self, channel, message):
+            published.append((channel, message))
+            return 3
+
+    async def _reload():
+        await reg.load(_FakeConn([('public', 'brand_settings', 'id')], ['public']))
+
+    async def _get_redis():
+        return _Redis()
+
+    monkeypatch.setattr(reg, 'reload', _reload)
+    monkeypatch.setattr(mod, 'get_redis', _get_redis)
+    assert await reg.refresh_all() == 3
+    assert reg.has_table('brand_settings')
+    assert published == [(mod.SCHEMA_CHANNEL, reg._origin)]
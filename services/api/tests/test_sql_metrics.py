@@ -0,0 +1,31 @@
+from app.core import sql_metrics
+from app.core.sql_metrics import QueryStats, fingerprint, normalize_statement
+
+
+def test_normalize_folds_literals_and_in_lists():
+    a = "SELECT * FROM students WHERE id IN ($1, $2, $3) AND name = 'x'"
+    b = "SELECT * FROM students\n  WHERE id IN ($1, $2) AND name = 'it''s'"
+    assert normalize_statement(a) == "SELECT * FROM students WHERE id IN (...) AND name = ?"
+    assert fingerprint(a) == fingerprint(b)
+
+
+def test_repeated_shapes_detected(monkeypatch):
+    monkeypatch.setattr(sql_metrics.settings, 'sql_nplus1_debug', True)
+    monkeypatch.setattr(sql_metrics.settings, 'sql_nplus1_threshold', 3)
+    token = sql_metrics.start_request()
+    stats = sql_metrics.current_stats()
+    for i in range(4):
+        stats.record(f"select name from staff where id = {i}", 0.001)
+    stats.record("select 1", 0.01)
+    assert stats.repeated(3) == [("select name from staff where id = ?", 4)]
+    timing = sql_metrics.server_timing(stats)
+    assert sql_metrics.finish_request(token, '/api/test') is stats
+    assert timing[0].startswith('db;dur=') and '5 queries' in timing[0]
+    assert timing[1] == f'db-slow;dur=10.00;desc="{fingerprint("select 1")}"'
+    assert sql_metrics.current_stats() is None
+
+
+def test_no_queries_no_header():
+    token = sql_metrics.start_request()
+    assert sql_metrics.server_timing(sql_metrics.finish_request(token, '/api/healthz')) == []
+    assert QueryStats().shapes is None
@@ -0,0 +1,29 @@
+from alembic_clean import trigger_sql
+
+
+def test_changes_names_only_the_transition_tables_of_the_event():
+    assert trigger_sql.changes('INSERT', 'student_id, date') == "SELECT student_id, date FROM new_rows"
+    assert trigger_sql.changes('DELETE', 'student_id, date') == "SELECT student_id, date FROM old_rows"
+    assert trigger_sql.changes('UPDATE', 'id', signed=True) == (
+        "SELECT id, 1 AS sign FROM new_rows UNION ALL SELECT id, -1 AS sign FROM old_rows"
+    )
+
+
+def test_function_sql_branches_on_tg_op_in_order():
+    sql = trigger_sql.function_sql('f', {op: f"        -- {op}\n" for op in trigger_sql.OPS})
+    assert sql.startswith("CREATE OR REPLACE FUNCTION f() RETURNS trigger LANGUAGE plpgsql AS $$\nBEGIN\n")
+    assert sql.index("    IF TG_OP = 'INSERT' THEN\n        -- INSERT\n") < sql.index(
+        "    ELSIF TG_OP = 'UPDATE' THEN\n        -- UPDATE\n") < sql.index("    ELSIF TG_OP = 'DELETE' THEN")
+    assert sql.endswith("    END IF;\n    RETURN NULL;\nEND $$;")
+
+
+def test_trigger_ddl_and_drop_use_the_same_names():
+    ddl = trigger_sql.trigger_ddl('attendance_student', 'f', 'am').splitlines()
+    assert ddl[1] == (
+        "CREATE TRIGGER trg_attendance_student_am_insert AFTER INSERT ON attendance_student "
+        "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION f();"
+    )
+    assert "REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows" in ddl[3]
+    assert [s for s in ddl if s.startswith('DROP')] == [
+        s + ';' for s in trigger_sql.drop_triggers_sql('attendance_student', 'am')
+    ]